@@ -10,16 +10,21 @@ app instances with different configurations.
 from flask import Flask
 from flask_wtf.csrf import CSRFProtect
 from flask_login import LoginManager
+from flask_limiter import Limiter
+from flask_compress import Compress
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
 import os
 
 # Import configuration
 from config import config
+from app.utils import rate_limit_key
 
 # Initialize extensions (will be bound to app in create_app)
 csrf = CSRFProtect()
 login_manager = LoginManager()
+limiter = Limiter(key_func=rate_limit_key)
+compress = Compress()
 
 
 def create_app(config_name: str = 'default') -> Flask:
@@ -47,12 +52,17 @@ def create_app(config_name: str = 'default') -> Flask:
     # Initialize extensions with app
     csrf.init_app(app)
     login_manager.init_app(app)
+    limiter.init_app(app)
+    compress.init_app(app)
     
     # Configure Flask-Login
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'נא להתחבר כדי לגשת לדף זה.'
     login_manager.login_message_category = 'info'
     
+    # Keep session contents server-side; the cookie only carries an ID
+    _configure_session_store(app)
+    
     # Configure templates to search both legacy and new directories
     _configure_templates(app)
     
@@ -68,15 +78,49 @@ def create_app(config_name: str = 'default') -> Flask:
     # Register error handlers
     _register_error_handlers(app)
     
+    # Per-stage Server-Timing header and timing log record
+    _configure_request_timing(app)
+    
+    # Prometheus metrics (request latency, caches, upstream calls)
+    _configure_metrics(app)
+    
+    # Cache commands (evict/prewarm) shared by all workers
+    _configure_cache_control(app)
+    
+    # On-demand request profiling (admin API)
+    _configure_profiling(app)
+    
     # Register backward compatibility routes
     _register_compatibility_routes(app)
     
+    # Register CLI commands
+    _register_cli_commands(app)
+    
+    # Start background jobs
+    _start_background_jobs(app)
+    
     # Log application startup
     app.logger.info(f'Data Analyzer application startup - Config: {config_name}')
     
     return app
 
 
+def _configure_session_store(app: Flask) -> None:
+    """
+    Replace the signed-cookie session with the SQLite-backed server-side store.
+    
+    Args:
+        app (Flask): Flask application instance
+    """
+    from app.session_store import SqliteSessionInterface
+    
+    app.session_interface = SqliteSessionInterface(
+        app.config['SESSION_STORE_PATH'],
+        cleanup_interval=app.config.get('SESSION_CLEANUP_INTERVAL', 600),
+        touch_interval=app.config.get('SESSION_TOUCH_INTERVAL', 60)
+    )
+
+
 def _configure_templates(app: Flask) -> None:
     """
     Configure Jinja2 template loader to search multiple directories.
@@ -106,11 +150,15 @@ def _configure_templates(app: Flask) -> None:
 
 def _configure_logging(app: Flask) -> None:
     """
-    Configure application logging with rotating file handler.
+    Configure application logging through a queue to the host's single log writer.
+    
+    Request threads only enqueue records; formatting and the rotating file
+    are handled on a listener thread (see app/logging_queue.py).
     
     Args:
         app (Flask): Flask application instance
     """
+    from app.logging_queue import configure_queue_logging, stop_queue_logging
     
     # Create logs directory if it doesn't exist
     if not os.path.exists(app.config['LOG_DIRECTORY']):
@@ -120,30 +168,26 @@ def _configure_logging(app: Flask) -> None:
         except OSError as e:
             print(f"Error creating logs directory: {e}")
     
-    # Set up file handler with rotation
-    file_handler = RotatingFileHandler(
-        app.config['LOG_FILE'],
-        maxBytes=app.config['LOG_MAX_BYTES'],
-        backupCount=app.config['LOG_BACKUP_COUNT']
-    )
-    
-    # Configure log format
-    file_handler.setFormatter(logging.Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-    ))
-    
     # Set log level based on debug mode
+    level = logging.DEBUG if app.debug else logging.INFO
+    app.logger.setLevel(level)
+    configure_queue_logging(app, level)
+    atexit.register(stop_queue_logging, app)
+    
+    # Requests over SLOW_REQUEST_THRESHOLD_MS go to their own file (see modules/timing.py)
+    if app.config.get('SLOW_REQUEST_LOG_FILE'):
+        from modules.timing import SLOW_REQUEST_LOGGER
+        slow_logger = logging.getLogger(SLOW_REQUEST_LOGGER)
+        slow_logger.setLevel(logging.INFO)
+        slow_logger.propagate = False
+        configure_queue_logging(app, logging.INFO, logger=slow_logger,
+                                log_file=app.config['SLOW_REQUEST_LOG_FILE'], listener_key='slow_log_listener')
+        atexit.register(stop_queue_logging, app, 'slow_log_listener')
+    
     if app.debug:
-        app.logger.setLevel(logging.DEBUG)
-        file_handler.setLevel(logging.DEBUG)
         app.logger.info('Application startup - Running in DEBUG mode.')
     else:
-        app.logger.setLevel(logging.INFO)
-        file_handler.setLevel(logging.INFO)
         app.logger.info('Application startup - Logging to file initialized.')
-    
-    # Add handler to app logger
-    app.logger.addHandler(file_handler)
 
 
 def _initialize_user_manager(app: Flask) -> None:
@@ -197,6 +241,57 @@ def _register_blueprints(app: Flask) -> None:
     app.logger.debug('All blueprints registered successfully')
 
 
+def _configure_request_timing(app: Flask) -> None:
+    """
+    Report per-stage request timings (see modules/timing.py).
+    
+    Args:
+        app (Flask): Flask application instance
+    """
+    from modules.timing import init_server_timing
+    
+    init_server_timing(app)
+
+
+def _configure_metrics(app: Flask) -> None:
+    """
+    Record request latency and write this worker's metrics for /metrics (see modules/metrics.py).
+    
+    Args:
+        app (Flask): Flask application instance
+    """
+    from modules.metrics import init_metrics
+    
+    init_metrics(app)
+
+
+def _configure_cache_control(app: Flask) -> None:
+    """
+    Size the price cache and apply cache evictions and prewarms broadcast by
+    other workers (see modules/cache_control.py).
+    
+    Args:
+        app (Flask): Flask application instance
+    """
+    from modules.cache_control import init_cache_control
+    from modules.price_history import configure_price_cache
+    
+    configure_price_cache(app)
+    init_cache_control(app)
+
+
+def _configure_profiling(app: Flask) -> None:
+    """
+    Profile requests selected by admin profiling sessions (see app/profiling.py).
+    
+    Args:
+        app (Flask): Flask application instance
+    """
+    from app.profiling import init_profiling
+    
+    init_profiling(app)
+
+
 def _register_error_handlers(app: Flask) -> None:
     """
     Register custom error handlers for the application.
@@ -220,6 +315,24 @@ def _register_error_handlers(app: Flask) -> None:
         app.logger.error(f'500 error: {error}')
         return render_template('500.html'), 500
     
+    @app.errorhandler(429)
+    def rate_limited_error(error):
+        """Handle per-user/global rate limit breaches (Retry-After is added by Flask-Limiter)."""
+        app.logger.warning(f'429 rate limit exceeded: {error.description}')
+        return render_template('overloaded.html', status_code=429,
+                               message='שלחת יותר מדי בקשות. אנא המתן מעט ונסה שוב.'), 429
+    
+    @app.errorhandler(503)
+    def service_unavailable_error(error):
+        """Handle load shedding - too many analyses in flight."""
+        app.logger.warning(f'503 load shed: {error.description}')
+        response = app.make_response((render_template('overloaded.html', status_code=503,
+                                                       message='המערכת עמוסה כרגע. אנא נסה שוב בעוד מספר שניות.'), 503))
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after is not None:
+            response.headers['Retry-After'] = str(int(retry_after))
+        return response
+    
     @app.errorhandler(CSRFError)
     def handle_csrf_error(error):
         """Handle CSRF token errors."""
@@ -259,5 +372,76 @@ def _register_compatibility_routes(app: Flask) -> None:
     app.logger.debug('Backward compatibility routes registered')
 
 
+def _register_cli_commands(app: Flask) -> None:
+    """
+    Register custom Flask CLI commands.
+    
+    Args:
+        app (Flask): Flask application instance
+    """
+    import click
+    
+    @app.cli.command('refresh-multiples')
+    @click.argument('tickers', nargs=-1)
+    def refresh_multiples_command(tickers):
+        """Rebuild the relative valuation multiples snapshot."""
+        from modules.multiples import refresh_multiples_snapshot
+        # ממתינים לרענון שרץ בתהליך אחר במקום לצאת באמצע - הפקודה מסתיימת רק כשהתמונה נשמרה
+        table = refresh_multiples_snapshot(tickers or None, wait=True)
+        click.echo(f'Multiples snapshot refreshed: {len(table)} tickers.')
+    
+    @app.cli.command('import-users')
+    @click.argument('users_file', required=False)
+    def import_users_command(users_file):
+        """Import users from a users.json file into the SQLite user store."""
+        from app.models import get_user_manager, SqliteUserStore
+        store = get_user_manager().store
+        if not isinstance(store, SqliteUserStore):
+            raise click.ClickException('USER_STORE_BACKEND is not sqlite.')
+        imported = store.import_json(users_file or app.config['USERS_FILE'])
+        click.echo(f'Imported {imported} users (existing IDs and usernames skipped).')
+    
+    app.logger.debug('CLI commands registered')
+
+
+def _is_serving_process() -> bool:
+    """
+    False when the app was created for a Flask CLI command other than `flask run`.
+    
+    The flask command sets FLASK_RUN_FROM_CLI for every command; `flask run`
+    loads the app inside its own click context, other commands in the group's.
+    """
+    if os.environ.get('FLASK_RUN_FROM_CLI') != 'true':
+        return True  # gunicorn, run.py
+    import click
+    ctx = click.get_current_context(silent=True)
+    return ctx is not None and ctx.info_name == 'run'
+
+
+def _start_background_jobs(app: Flask) -> None:
+    """
+    Start periodic background jobs (disabled when their interval is 0).
+    
+    Jobs run only in serving processes: a CLI command such as
+    `flask refresh-multiples` would otherwise race its own refresher thread
+    for the refresh lock and exit with that thread mid-refresh.
+    
+    Args:
+        app (Flask): Flask application instance
+    """
+    from modules.multiples import start_multiples_refresher
+    from modules.price_history import start_price_prewarm
+    
+    if not _is_serving_process():
+        app.logger.debug('Background jobs skipped (Flask CLI command)')
+        return
+    
+    start_multiples_refresher(app)
+    
+    if app.config.get('PREWARM_UNIVERSE_ON_STARTUP'):
+        start_price_prewarm(app, app.config['VALUATION_UNIVERSE'])
+        app.logger.info('Price history prewarm started for the valuation universe')
+
+
 # Import models to ensure they're available when using the app
 from app import models
\ No newline at end of file
@@ -0,0 +1,94 @@
+# app/admin/performance.py
+"""
+Data for the admin performance panel.
+
+Everything comes from in-process state: cache objects and their locks,
+the metrics registry (hit/miss and upstream counters summed across workers)
+and the recent slow requests kept by modules/timing.py. Occupancy, memory
+and slow requests describe the worker that served the page.
+"""
+
+import os
+from typing import Dict, List
+
+from modules import metrics
+from modules.cache_control import value_size_bytes
+from modules.timing import get_slow_requests
+
+
+def _instrumented_caches() -> List:
+    """(cache, lock) pairs shown on the panel."""
+    from modules import price_history, payload_cache
+    return [
+        (price_history.price_data_cache, price_history.price_data_cache_lock),
+        (price_history.company_name_cache, price_history.company_name_cache_lock),
+        (price_history.company_info_cache, price_history.company_info_cache_lock),
+        (price_history.fundamentals_cache, price_history.fundamentals_cache_lock),
+        (payload_cache.payload_cache, payload_cache.payload_cache_lock),
+    ]
+
+
+def cache_stats(counters: Dict) -> List[Dict]:
+    """Occupancy, memory and hit rate per cache."""
+    rows = []
+    for cache, lock in _instrumented_caches():
+        with lock:
+            entries = len(cache)
+            values = cache.peek_values()
+        hits = counters.get(('cache_requests_total', (('cache', cache.name), ('result', 'hit'))), 0)
+        misses = counters.get(('cache_requests_total', (('cache', cache.name), ('result', 'miss'))), 0)
+        evictions = sum(value for (name, labels), value in counters.items()
+                        if name == 'cache_evictions_total' and ('cache', cache.name) in labels)
+        rows.append({
+            'name': cache.name,
+            'entries': entries,
+            'maxsize': cache.maxsize,
+            'occupancy': entries / cache.maxsize if cache.maxsize else 0.0,
+            'memory_bytes': sum(value_size_bytes(value) for value in values),
+            'hits': int(hits),
+            'misses': int(misses),
+            'hit_rate': hits / (hits + misses) if hits + misses else None,
+            'evictions': int(evictions),
+        })
+    return rows
+
+
+def upstream_stats(counters: Dict, histograms: Dict) -> List[Dict]:
+    """Call counts, error rate and mean latency per upstream."""
+    upstreams: Dict[str, Dict] = {}
+    for (name, labels), value in counters.items():
+        if name != 'upstream_requests_total':
+            continue
+        label_map = dict(labels)
+        entry = upstreams.setdefault(label_map['upstream'], {'ok': 0, 'error': 0})
+        entry[label_map['outcome']] = entry.get(label_map['outcome'], 0) + int(value)
+
+    rows = []
+    for upstream, entry in sorted(upstreams.items()):
+        calls = entry['ok'] + entry['error']
+        histogram = histograms.get(('upstream_request_duration_seconds', (('upstream', upstream),)))
+        rows.append({
+            'name': upstream,
+            'calls': calls,
+            'errors': entry['error'],
+            'error_rate': entry['error'] / calls if calls else 0.0,
+            'avg_latency_ms': histogram[-1] / calls * 1000 if histogram and calls else None,
+        })
+    return rows
+
+
+def collect_performance_snapshot(top_n: int = 10) -> Dict:
+    """
+    Everything the performance panel shows.
+
+    Returns:
+        dict: pid, caches, upstreams, top_tickers and slow_requests
+    """
+    counters, histograms = metrics.collect()
+    return {
+        'pid': os.getpid(),
+        'caches': cache_stats(counters),
+        'upstreams': upstream_stats(counters, histograms),
+        'top_tickers': metrics.top_tickers(top_n),
+        'slow_requests': get_slow_requests()[:20],
+    }
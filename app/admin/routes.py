@@ -8,11 +8,24 @@ This module contains all admin-only routes including:
 - Admin dashboard
 """
 
-from flask import render_template, request, redirect, url_for, flash, current_app
+import math
+import os
+from flask import render_template, request, redirect, url_for, flash, current_app, jsonify
 from flask_login import login_required, current_user
 
 from app.admin import bp
+from app.admin.performance import collect_performance_snapshot
 from app.models import get_user_manager
+from app.utils import log_user_action
+
+# ערכי הסינון בדף ניהול המשתמשים -> is_approved
+USER_STATUS_FILTERS = {'all': None, 'pending': False, 'approved': True}
+
+
+def _users_page_url():
+    """manage_users URL that keeps the current filter and page (for redirects after actions)."""
+    args = {key: request.args[key] for key in ('q', 'status', 'page') if request.args.get(key)}
+    return url_for('admin.manage_users', **args)
 
 
 def admin_required(f):
@@ -45,21 +58,35 @@ def manage_users():
     """
     Display user management interface for admin.
     
-    Shows all users in the system with options to approve or delete them.
+    Shows one page of users, optionally filtered by approval status and
+    username prefix, with options to approve or delete them.
+    
+    Query Args:
+        q (str): Username prefix
+        status (str): 'pending', 'approved' or 'all' (default)
+        page (int): 1-based page number
     
     Returns:
         Response: User management template with user data
     """
     current_app.logger.info(f"Admin user '{current_user.username}' accessed user management.")
     
-    # Get all users from user manager
-    user_manager = get_user_manager()
-    all_users = user_manager.get_all_users()
+    prefix = request.args.get('q', '').strip()
+    status = request.args.get('status', 'all')
+    if status not in USER_STATUS_FILTERS:
+        status = 'all'
+    page = request.args.get('page', 1, type=int)
     
-    # Convert to list of user objects for template
-    users_list = list(all_users.values())
+    user_manager = get_user_manager()
+    result = user_manager.search_users(
+        prefix=prefix,
+        is_approved=USER_STATUS_FILTERS[status],
+        page=page,
+        per_page=current_app.config.get('ADMIN_USERS_PER_PAGE', 50)
+    )
     
-    return render_template('admin/users.html', users=users_list)
+    return render_template('admin/users.html', users=result['users'], pagination=result,
+                           counts=user_manager.get_user_counts(), q=prefix, status=status)
 
 
 @bp.route('/users/<int:user_id>/<action>')
@@ -89,7 +116,7 @@ def user_action(user_id, action):
     if not target_user:
         flash('משתמש לא נמצא.', 'danger')
         current_app.logger.warning(f"User action failed: User ID {user_id} not found.")
-        return redirect(url_for('admin.manage_users'))
+        return redirect(_users_page_url())
     
     # Handle different actions
     if action == 'approve':
@@ -100,6 +127,7 @@ def user_action(user_id, action):
             current_app.logger.info(
                 f"User '{target_user.username}' (ID: {user_id}) was approved by admin '{current_user.username}'."
             )
+            log_user_action('admin_approve_user', f"target_user_id={user_id} username={target_user.username}")
         else:
             flash('שגיאה באישור המשתמש.', 'danger')
             current_app.logger.error(f"Failed to approve user ID {user_id}")
@@ -111,7 +139,7 @@ def user_action(user_id, action):
             current_app.logger.warning(
                 f"Admin '{current_user.username}' attempted to delete admin account (ID: 1)."
             )
-            return redirect(url_for('admin.manage_users'))
+            return redirect(_users_page_url())
         
         # Delete user
         username = target_user.username
@@ -121,6 +149,7 @@ def user_action(user_id, action):
             current_app.logger.info(
                 f"User '{username}' (ID: {user_id}) was deleted by admin '{current_user.username}'."
             )
+            log_user_action('admin_delete_user', f"target_user_id={user_id} username={username}")
         else:
             flash('שגיאה במחיקת המשתמש.', 'danger')
             current_app.logger.error(f"Failed to delete user ID {user_id}")
@@ -132,7 +161,7 @@ def user_action(user_id, action):
             f"Invalid action '{action}' attempted by admin '{current_user.username}' on user ID {user_id}."
         )
     
-    return redirect(url_for('admin.manage_users'))
+    return redirect(_users_page_url())
 
 
 @bp.route('/dashboard')
@@ -147,14 +176,394 @@ def dashboard():
     """
     current_app.logger.info(f"Admin '{current_user.username}' accessed admin dashboard.")
     
-    # Get system statistics
-    user_manager = get_user_manager()
-    all_users = user_manager.get_all_users()
+    # Get system statistics (counters maintained by the user store, no scan)
+    counts = get_user_manager().get_user_counts()
     
     stats = {
-        'total_users': len(all_users),
-        'approved_users': sum(1 for user in all_users.values() if user.is_approved),
-        'pending_users': sum(1 for user in all_users.values() if not user.is_approved),
+        'total_users': counts['total'],
+        'approved_users': counts['approved'],
+        'pending_users': counts['pending'],
     }
     
-    return render_template('admin/dashboard.html', stats=stats)
\ No newline at end of file
+    return render_template('admin/dashboard.html', stats=stats, perf=collect_performance_snapshot())
+
+
+@bp.route('/api/performance')
+@login_required
+@admin_required
+def performance_stats():
+    """
+    Performance panel data: caches, upstream error rates, top tickers and slow requests.
+    
+    Returns:
+        Response: JSON snapshot (see app/admin/performance.py)
+    """
+    return jsonify(collect_performance_snapshot())
+
+
+@bp.route('/api/http-pool')
+@login_required
+@admin_required
+def http_pool_stats():
+    """
+    Connection pool statistics of the shared upstream HTTP session, per host.
+    
+    Returns:
+        Response: JSON with request, connection reuse and handshake counters
+    """
+    from modules.http_session import get_pool_stats
+    return jsonify(get_pool_stats())
+
+
+@bp.route('/api/rate-limits')
+@login_required
+@admin_required
+def rate_limit_stats():
+    """
+    Upstream token-bucket state and queue-wait metrics per priority class.
+    
+    Returns:
+        Response: JSON keyed by upstream name
+    """
+    from modules.rate_limiter import get_limiter_stats
+    return jsonify(get_limiter_stats())
+
+
+@bp.route('/api/password-hashing')
+@login_required
+@admin_required
+def password_hashing_stats():
+    """
+    Password hashing pool counters: queue depth, queue wait and hash time.
+    
+    Returns:
+        Response: JSON stats of this worker's hashing pool
+    """
+    from app.auth.hashing import get_password_hasher
+    return jsonify(get_password_hasher().stats())
+
+
+@bp.route('/api/audit')
+@login_required
+@admin_required
+def audit_events():
+    """
+    Query the audit log, newest first.
+    
+    Query Args:
+        user_id (int, optional): Only this user's events
+        action (str, optional): Only this action
+        since, until (float, optional): Unix time range [since, until)
+        before (str, optional): 'ts:id' cursor from the previous page's next_before
+        limit (int, optional): Page size (capped at AUDIT_QUERY_MAX_LIMIT)
+    
+    Returns:
+        Response: JSON with events and the cursor for the next page
+    """
+    from app.audit import get_audit_log
+    
+    try:
+        user_id = request.args.get('user_id', type=int)
+        since = request.args.get('since', type=float)
+        until = request.args.get('until', type=float)
+        limit = min(request.args.get('limit', 100, type=int), current_app.config.get('AUDIT_QUERY_MAX_LIMIT', 500))
+        before = None
+        if request.args.get('before'):
+            before_ts, before_id = request.args['before'].split(':', 1)
+            before = (float(before_ts), int(before_id))
+    except ValueError:
+        return jsonify({'error': 'Invalid before cursor'}), 400
+    
+    audit_log = get_audit_log()
+    events = audit_log.query(user_id=user_id, action=request.args.get('action') or None,
+                             since=since, until=until, before=before, limit=max(1, limit))
+    next_before = f"{events[-1]['ts']!r}:{events[-1]['id']}" if len(events) == max(1, limit) else None
+    return jsonify({'events': events, 'next_before': next_before, 'stats': audit_log.stats()})
+
+
+@bp.route('/api/cache')
+@login_required
+@admin_required
+def cache_entries():
+    """
+    Entries of the data caches in this worker, with age and size.
+    
+    Query Args:
+        cache (str, optional): Only this cache (repeatable)
+    
+    Returns:
+        Response: JSON keyed by cache name
+    """
+    from modules.cache_control import list_entries
+    
+    try:
+        return jsonify({'pid': os.getpid(), 'caches': list_entries(request.args.getlist('cache') or None)})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@bp.route('/api/cache/evict', methods=['POST'])
+@login_required
+@admin_required
+def cache_evict():
+    """
+    Evict entries by ticker or glob pattern in every worker.
+    
+    JSON Body:
+        pattern (str): Ticker or pattern, e.g. 'AAPL' or 'BRK*'
+        caches (list, optional): Cache names (default: all)
+    
+    Returns:
+        Response: JSON with the number of entries removed in this worker
+    """
+    from modules.cache_control import broadcast_eviction
+    
+    data = request.get_json(silent=True) or {}
+    pattern = str(data.get('pattern') or '').strip()
+    if not pattern:
+        return jsonify({'error': 'pattern is required'}), 400
+    if data.get('caches') is not None and not isinstance(data['caches'], list):
+        return jsonify({'error': 'caches must be a list'}), 400
+    try:
+        removed = broadcast_eviction(pattern, data.get('caches'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    current_app.logger.warning(f"Admin '{current_user.username}' evicted cache entries matching '{pattern}' ({removed} in this worker).")
+    log_user_action('admin_cache_evict', f"pattern={pattern} caches={data.get('caches') or 'all'}")
+    return jsonify({'pattern': pattern, 'removed_in_worker': removed, 'broadcast': True})
+
+
+@bp.route('/api/cache/prewarm', methods=['POST'])
+@login_required
+@admin_required
+def cache_prewarm():
+    """
+    Prefetch 10y daily price histories for a list of tickers in the background.
+    
+    JSON Body:
+        tickers (list): Ticker symbols
+        all_workers (bool, optional): Prewarm every worker, not only this one
+    
+    Returns:
+        Response: 202 with the accepted tickers
+    """
+    from modules.cache_control import broadcast_prewarm
+    from modules.price_history import start_price_prewarm
+    from app.utils import sanitize_ticker_symbol
+    
+    data = request.get_json(silent=True) or {}
+    raw_tickers = data.get('tickers') or []
+    if not isinstance(raw_tickers, list):
+        return jsonify({'error': 'tickers must be a list'}), 400
+    tickers = list(dict.fromkeys(t for t in (sanitize_ticker_symbol(str(raw)) for raw in raw_tickers) if t))
+    if not tickers:
+        return jsonify({'error': 'no valid tickers'}), 400
+    max_tickers = current_app.config.get('CACHE_PREWARM_MAX_TICKERS', 100)
+    if len(tickers) > max_tickers:
+        return jsonify({'error': f'at most {max_tickers} tickers per request'}), 400
+    
+    start_price_prewarm(current_app._get_current_object(), tickers)
+    if data.get('all_workers'):
+        broadcast_prewarm(tickers)
+    
+    current_app.logger.info(f"Admin '{current_user.username}' started prewarm for {len(tickers)} tickers.")
+    log_user_action('admin_cache_prewarm', f"tickers={','.join(tickers)}")
+    return jsonify({'tickers': tickers, 'all_workers': bool(data.get('all_workers'))}), 202
+
+
+# סוג הקובץ להורדה -> (סיומת, MIME)
+_PROFILE_FORMATS = {
+    'prof': ('prof', 'application/octet-stream'),
+    'text': ('txt', 'text/plain; charset=utf-8'),
+    'collapsed': ('collapsed.txt', 'text/plain; charset=utf-8'),
+}
+
+
+@bp.route('/api/profile', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def profile_sessions():
+    """
+    List profiling sessions, or start one.
+    
+    JSON Body (POST):
+        endpoint (str, optional): Flask endpoint, e.g. 'home_bp.analyze_ticker' (default: all)
+        requests (int): Profile the next N matching requests in each worker, or
+        sample_rate (float): Profile this fraction of matching requests
+        mode (str, optional): 'cprofile' (default) or 'sample'
+        duration (float, optional): Positive seconds until the session ends (default 600,
+                                    capped at PROFILE_MAX_DURATION)
+    
+    Returns:
+        Response: JSON list of sessions, or 201 with the new session
+    """
+    from app.profiling import list_sessions, start_session
+    
+    profile_dir = current_app.config['PROFILE_DIR']
+    if request.method == 'GET':
+        return jsonify({'sessions': list_sessions(profile_dir)})
+    
+    data = request.get_json(silent=True) or {}
+    endpoint = data.get('endpoint') or None
+    if endpoint is not None and endpoint not in current_app.view_functions:
+        return jsonify({'error': f'unknown endpoint: {endpoint}'}), 400
+    try:
+        requests_count = int(data['requests']) if data.get('requests') is not None else None
+        sample_rate = float(data['sample_rate']) if data.get('sample_rate') is not None else None
+        duration = float(data['duration']) if data.get('duration') is not None else 600.0
+        # NaN/שלילי יוצרים סשן שפג מיד
+        if not (math.isfinite(duration) and duration > 0):
+            raise ValueError('duration must be a positive number of seconds')
+        duration = min(duration, current_app.config.get('PROFILE_MAX_DURATION', 3600))
+        session = start_session(profile_dir, endpoint, mode=data.get('mode') or 'cprofile',
+                                requests=requests_count, sample_rate=sample_rate, duration=duration)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    current_app.logger.warning(f"Admin '{current_user.username}' started profiling session {session['id']} for {endpoint or 'all endpoints'}.")
+    log_user_action('admin_profile_start', f"session={session['id']} endpoint={endpoint or 'all'} mode={session['mode']}")
+    return jsonify(session), 201
+
+
+@bp.route('/api/profile/<session_id>', methods=['DELETE'])
+@login_required
+@admin_required
+def profile_stop(session_id):
+    """Stop a profiling session early; its results stay downloadable."""
+    from app.profiling import stop_session
+    
+    if not stop_session(current_app.config['PROFILE_DIR'], session_id):
+        return jsonify({'error': 'no active session with this id'}), 404
+    log_user_action('admin_profile_stop', f"session={session_id}")
+    return jsonify({'id': session_id, 'active': False})
+
+
+@bp.route('/api/profile/<session_id>/download')
+@login_required
+@admin_required
+def profile_download(session_id):
+    """
+    Download a session's results merged across workers.
+    
+    Query Args:
+        format (str): 'prof' (pstats, default), 'text' or 'collapsed' (flamegraph input)
+    
+    Returns:
+        Response: The file as an attachment, or 404 when nothing was collected
+    """
+    from app.profiling import merged_profile
+    
+    fmt = request.args.get('format', 'prof')
+    if fmt not in _PROFILE_FORMATS or not session_id.isalnum():
+        return jsonify({'error': 'invalid format or session id'}), 400
+    data = merged_profile(current_app.config['PROFILE_DIR'], session_id, fmt)
+    if data is None:
+        return jsonify({'error': 'no profile data for this session yet'}), 404
+    extension, mimetype = _PROFILE_FORMATS[fmt]
+    response = current_app.response_class(data, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=profile-{session_id}.{extension}'
+    return response
+
+
+@bp.route('/api/memory', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def memory_tracing():
+    """
+    tracemalloc state, or start/stop tracing in every worker.
+    
+    Start and stop apply here at once and in the other workers at their next
+    request (broadcast through the cache command log).
+    
+    JSON Body (POST):
+        action (str): 'start' or 'stop'
+    
+    Returns:
+        Response: JSON with this worker's tracing state and the snapshots of all workers
+    """
+    from app import memory_tracing as tracing
+    
+    store_dir = current_app.config['MEMORY_SNAPSHOT_DIR']
+    if request.method == 'POST':
+        action = (request.get_json(silent=True) or {}).get('action')
+        if action == 'start':
+            tracing.start_tracing(current_app.config.get('MEMORY_TRACE_FRAMES', 25))
+        elif action == 'stop':
+            tracing.stop_tracing(store_dir)
+        else:
+            return jsonify({'error': "action must be 'start' or 'stop'"}), 400
+        tracing.broadcast({'op': f'memory_{action}'})
+        current_app.logger.warning(f"Admin '{current_user.username}' {action}ed tracemalloc in all workers.")
+        log_user_action('admin_memory_tracing', f"action={action} pid={os.getpid()}")
+    return jsonify(tracing.status(store_dir))
+
+
+@bp.route('/api/memory/snapshots', methods=['POST'])
+@login_required
+@admin_required
+def memory_snapshot():
+    """
+    Take a tracemalloc snapshot in every worker (optional JSON 'label').
+    
+    This worker snapshots at once; the others snapshot under the same id at
+    their next request.
+    """
+    from app import memory_tracing as tracing
+    
+    store_dir = current_app.config['MEMORY_SNAPSHOT_DIR']
+    label = (request.get_json(silent=True) or {}).get('label')
+    snapshot_id = tracing.next_snapshot_id(store_dir)
+    try:
+        snapshot = tracing.take_snapshot(store_dir, snapshot_id, label, current_app.config.get('MEMORY_MAX_SNAPSHOTS', 5))
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    tracing.broadcast({'op': 'memory_snapshot', 'id': snapshot_id, 'label': label})
+    return jsonify(snapshot), 201
+
+
+@bp.route('/api/memory/snapshots/<int:snapshot_id>')
+@login_required
+@admin_required
+def memory_snapshot_top(snapshot_id):
+    """
+    Largest allocations in one worker's snapshot, by module and by file:line.
+    
+    Query Args:
+        pid (int, optional): Worker to report (default this worker, or any worker that has the snapshot)
+        limit (int, optional): Rows per grouping (default 20)
+    """
+    from app import memory_tracing as tracing
+    
+    pid = request.args.get('pid', type=int)
+    try:
+        return jsonify(tracing.top_allocations(current_app.config['MEMORY_SNAPSHOT_DIR'], snapshot_id, pid,
+                                               request.args.get('limit', 20, type=int)))
+    except KeyError:
+        return jsonify({'error': f'no snapshot {snapshot_id} for worker {pid or "any"}'}), 404
+
+
+@bp.route('/api/memory/diff')
+@login_required
+@admin_required
+def memory_diff():
+    """
+    Memory growth between two snapshots of one worker.
+    
+    Query Args:
+        from (int): Older snapshot id
+        to (int): Newer snapshot id
+        pid (int, optional): Worker to compare (default this worker, or any worker that has both)
+        limit (int, optional): Rows per grouping (default 20)
+    """
+    from app import memory_tracing as tracing
+    
+    from_id, to_id = request.args.get('from', type=int), request.args.get('to', type=int)
+    if from_id is None or to_id is None:
+        return jsonify({'error': 'from and to snapshot ids are required'}), 400
+    pid = request.args.get('pid', type=int)
+    try:
+        return jsonify(tracing.diff(current_app.config['MEMORY_SNAPSHOT_DIR'], from_id, to_id, pid,
+                                    request.args.get('limit', 20, type=int)))
+    except KeyError as e:
+        return jsonify({'error': f'no snapshot {e.args[0]} for worker {pid or "any"}'}), 404
@@ -0,0 +1,195 @@
+# app/audit.py
+"""
+Append-only audit log of user actions in a local SQLite database.
+
+Request threads only put events on an in-memory queue; a single writer
+thread per process drains it and inserts whole batches in one transaction
+(every AUDIT_FLUSH_INTERVAL seconds or once AUDIT_BATCH_SIZE events are
+waiting). Rows cannot be updated or deleted - triggers reject it - and the
+table is indexed by user, action and time so admin queries read only the
+matching range, newest first, with keyset pagination on (ts, id).
+"""
+
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS audit_events ('
+    'id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, user_id INTEGER, '
+    'action TEXT NOT NULL, details TEXT, ip TEXT)',
+    'CREATE INDEX IF NOT EXISTS audit_user_ts ON audit_events (user_id, ts)',
+    'CREATE INDEX IF NOT EXISTS audit_action_ts ON audit_events (action, ts)',
+    'CREATE INDEX IF NOT EXISTS audit_ts ON audit_events (ts)',
+    "CREATE TRIGGER IF NOT EXISTS audit_no_update BEFORE UPDATE ON audit_events "
+    "BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END",
+    "CREATE TRIGGER IF NOT EXISTS audit_no_delete BEFORE DELETE ON audit_events "
+    "BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END",
+)
+
+
+class AuditLog:
+    """
+    Buffered writer and query interface for the audit table.
+
+    Args:
+        path (str): Database file path (created if missing)
+        batch_size (int): Events written per transaction at most
+        flush_interval (float): Maximum seconds an event waits in the buffer
+        max_buffer (int): Events kept in memory before new ones are dropped
+    """
+
+    def __init__(self, path: str, batch_size: int = 200, flush_interval: float = 1.0, max_buffer: int = 10000):
+        self.path = path
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_buffer)
+        self._local = threading.local()
+        self._flush_lock = threading.Lock()
+        self._pending = threading.Event()
+        self._stats = {'recorded': 0, 'written': 0, 'dropped': 0, 'batches': 0, 'errors': 0}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+        self._writer = threading.Thread(target=self._writer_loop, name='audit-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def _connect(self) -> sqlite3.Connection:
+        # חיבור אחד לכל thread - חיבורי sqlite3 אינם משותפים בין threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def record(self, action: str, details: str = '', user_id: Optional[int] = None,
+               ip: Optional[str] = None) -> bool:
+        """
+        Queue an event for writing; never blocks the caller.
+
+        Returns:
+            bool: False if the buffer was full and the event was dropped
+        """
+        try:
+            self._queue.put_nowait((time.time(), user_id, action, details or None, ip))
+        except queue.Full:
+            self._stats['dropped'] += 1
+            return False
+        self._stats['recorded'] += 1
+        self._pending.set()
+        return True
+
+    def _drain(self, limit: int) -> List[tuple]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self) -> int:
+        """Write everything buffered so far. Returns the number of events written."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._drain(self.batch_size)
+                if not batch:
+                    return written
+                try:
+                    with self._connect() as conn:
+                        conn.executemany(
+                            'INSERT INTO audit_events (ts, user_id, action, details, ip) VALUES (?, ?, ?, ?, ?)', batch
+                        )
+                except sqlite3.Error:
+                    self._stats['errors'] += 1
+                    raise
+                written += len(batch)
+                self._stats['written'] += len(batch)
+                self._stats['batches'] += 1
+
+    def _writer_loop(self) -> None:
+        while True:
+            # מחכים לאירוע ראשון ואז נותנים לאצווה להתמלא עד flush_interval
+            self._pending.wait()
+            deadline = time.monotonic() + self.flush_interval
+            while self._queue.qsize() < self.batch_size and time.monotonic() < deadline:
+                time.sleep(min(0.05, self.flush_interval))
+            self._pending.clear()
+            try:
+                self.flush()
+            except Exception:
+                # אין כאן app context; הכשל נספר ב-stats והאירועים הבאים ייכתבו בסבב הבא
+                time.sleep(self.flush_interval)
+
+    def query(self, user_id: Optional[int] = None, action: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None,
+              before: Optional[Tuple[float, int]] = None, limit: int = 100) -> List[Dict]:
+        """
+        Events matching all given filters, newest first.
+
+        Args:
+            user_id (int, optional): Only this user's events
+            action (str, optional): Only this action
+            since (float, optional): Unix time lower bound (inclusive)
+            until (float, optional): Unix time upper bound (exclusive)
+            before (tuple, optional): (ts, id) of the last row of the previous page
+            limit (int): Maximum rows
+
+        Returns:
+            list: Event dicts with id, ts, user_id, action, details and ip
+        """
+        clauses, params = [], []
+        for clause, value in (('user_id = ?', user_id), ('action = ?', action), ('ts >= ?', since),
+                              ('ts < ?', until)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        if before is not None:
+            # keyset: ממשיכים מהשורה האחרונה של העמוד הקודם בלי OFFSET
+            clauses.append('(ts < ? OR (ts = ? AND id < ?))')
+            params.extend([before[0], before[0], before[1]])
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ''
+        rows = self._connect().execute(
+            f'SELECT id, ts, user_id, action, details, ip FROM audit_events {where}'
+            'ORDER BY ts DESC, id DESC LIMIT ?',
+            params + [int(limit)]
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self) -> Dict:
+        stats = dict(self._stats)
+        stats['buffered'] = self._queue.qsize()
+        return stats
+
+
+_audit_log: Optional[AuditLog] = None
+_audit_log_lock = threading.Lock()
+
+
+def get_audit_log() -> AuditLog:
+    """Process-wide audit log configured from AUDIT_* settings."""
+    global _audit_log
+    if _audit_log is None:
+        with _audit_log_lock:
+            if _audit_log is None:
+                from flask import current_app
+                _audit_log = AuditLog(
+                    current_app.config.get('AUDIT_DB_FILE', 'data/audit.sqlite3'),
+                    batch_size=current_app.config.get('AUDIT_BATCH_SIZE', 200),
+                    flush_interval=current_app.config.get('AUDIT_FLUSH_INTERVAL', 1.0),
+                    max_buffer=current_app.config.get('AUDIT_MAX_BUFFER', 10000),
+                )
+    return _audit_log
+
@@ -0,0 +1,168 @@
+# app/auth/hashing.py
+"""
+Password hashing on a dedicated, bounded thread pool.
+
+scrypt is deliberately expensive, so hashing and verification run on a
+small executor (PASSWORD_HASH_MAX_CONCURRENCY threads) instead of inline on
+request threads; a burst of logins then queues here rather than taking the
+CPU from chart requests. hashlib's scrypt releases the GIL, so the pool
+threads do not block the rest of the process. A caller whose job has not
+started within PASSWORD_HASH_QUEUE_TIMEOUT gets PasswordHashQueueTimeout.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+from typing import Callable, Dict, Optional, Tuple
+
+
+class PasswordHashQueueTimeout(Exception):
+    """Raised when a hashing job waited longer than the queue timeout to start."""
+
+
+def _parse_hash_method(method: str) -> Tuple:
+    """
+    Normalize a werkzeug hash method to its full parameters.
+
+    Missing parameters get werkzeug's defaults, so 'scrypt' and
+    'scrypt:32768:8:1' parse to the same tuple.
+
+    Args:
+        method (str): Method spec, or the method part of a stored hash
+
+    Returns:
+        tuple: ('scrypt', n, r, p) or ('pbkdf2', hash_name, iterations)
+
+    Raises:
+        ValueError: If the method or its parameters are not ones werkzeug accepts
+    """
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        if not args:
+            return ('scrypt', 2 ** 15, 8, 1)
+        if len(args) != 3:
+            raise ValueError("'scrypt' takes 3 arguments.")
+        return ('scrypt', *map(int, args))
+    if name == 'pbkdf2':
+        if len(args) > 2:
+            raise ValueError("'pbkdf2' takes 2 arguments.")
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) == 2 else DEFAULT_PBKDF2_ITERATIONS
+        return ('pbkdf2', hash_name, iterations)
+    raise ValueError(f"Invalid hash method '{method}'.")
+
+
+class PasswordHasher:
+    """
+    Bounded executor for password hashing with queue-wait metrics.
+
+    Args:
+        method (str): werkzeug hash method, e.g. 'scrypt:32768:8:1' or just 'scrypt'
+        max_workers (int): Hashes computed concurrently
+        queue_timeout (float): Seconds a job may wait for a free worker
+    """
+
+    def __init__(self, method: str, max_workers: int, queue_timeout: float):
+        self.method = method
+        self._params = _parse_hash_method(method)
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix='password-hash')
+        self._lock = threading.Lock()
+        self._stats = {
+            'submitted': 0, 'completed': 0, 'timeouts': 0, 'rehashes': 0,
+            'queue_wait_seconds': 0.0, 'max_queue_wait_seconds': 0.0,
+            'hash_seconds': 0.0, 'max_hash_seconds': 0.0,
+        }
+        self._queued = 0
+
+    def _run(self, fn: Callable, *args):
+        enqueued = time.perf_counter()
+        started = threading.Event()
+
+        def _job():
+            started.set()
+            begin = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                waited = begin - enqueued
+                self._stats['queue_wait_seconds'] += waited
+                self._stats['max_queue_wait_seconds'] = max(self._stats['max_queue_wait_seconds'], waited)
+            try:
+                return fn(*args)
+            finally:
+                took = time.perf_counter() - begin
+                with self._lock:
+                    self._stats['completed'] += 1
+                    self._stats['hash_seconds'] += took
+                    self._stats['max_hash_seconds'] = max(self._stats['max_hash_seconds'], took)
+
+        with self._lock:
+            self._stats['submitted'] += 1
+            self._queued += 1
+        future = self._executor.submit(_job)
+        # cancel מצליח רק אם העבודה עוד לא התחילה; אחרת ממתינים לתוצאה כרגיל
+        if not started.wait(self.queue_timeout) and future.cancel():
+            with self._lock:
+                self._queued -= 1
+                self._stats['timeouts'] += 1
+            raise PasswordHashQueueTimeout(f"Password hashing queue wait exceeded {self.queue_timeout}s")
+        return future.result()
+
+    def hash(self, password: str) -> str:
+        """Hash a password with the configured method on the pool."""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        """Check a password against a stored hash on the pool."""
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """True if the stored hash was made with different parameters than the configured method."""
+        try:
+            return _parse_hash_method(password_hash.split('$', 1)[0]) != self._params
+        except ValueError:
+            return True  # פורמט לא מוכר - מחליפים אותו ב-hash לפי ההגדרות
+
+    def rehash_in_background(self, password: str, on_done: Callable[[str], None]) -> None:
+        """
+        Compute a fresh hash on the pool without waiting for it.
+
+        Args:
+            password (str): The plaintext password (just verified)
+            on_done (callable): Called on the pool thread with the new hash
+        """
+        def _job():
+            on_done(generate_password_hash(password, self.method))
+
+        with self._lock:
+            self._stats['rehashes'] += 1
+        self._executor.submit(_job)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['queued'] = self._queued
+        stats['avg_queue_wait_seconds'] = stats['queue_wait_seconds'] / stats['completed'] if stats['completed'] else 0.0
+        stats['avg_hash_seconds'] = stats['hash_seconds'] / stats['completed'] if stats['completed'] else 0.0
+        stats['method'] = self.method
+        return stats
+
+
+_hasher: Optional[PasswordHasher] = None
+_hasher_lock = threading.Lock()
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Process-wide hasher configured from PASSWORD_HASH_* settings."""
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                from flask import current_app
+                _hasher = PasswordHasher(
+                    current_app.config.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1'),
+                    current_app.config.get('PASSWORD_HASH_MAX_CONCURRENCY', 2),
+                    current_app.config.get('PASSWORD_HASH_QUEUE_TIMEOUT', 5),
+                )
+    return _hasher
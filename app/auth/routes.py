@@ -10,11 +10,26 @@ This module contains all authentication-related routes including:
 
 from flask import render_template, request, redirect, url_for, flash, session, current_app
 from flask_login import login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.exceptions import ServiceUnavailable
 import re
 
 from app.auth import bp
+from app.auth.hashing import get_password_hasher, PasswordHashQueueTimeout
 from app.models import get_user_manager
+from app.session_store import regenerate_session
+from app.utils import log_user_action
+
+
+def _schedule_rehash(user_id: int, password: str) -> None:
+    """Replace a user's hash made with outdated parameters, off the request thread."""
+    app = current_app._get_current_object()
+    
+    def _store(new_hash: str) -> None:
+        with app.app_context():
+            get_user_manager().update_user(user_id, password_hash=new_hash)
+            app.logger.info(f"Password hash for user ID {user_id} upgraded to {get_password_hasher().method}.")
+    
+    get_password_hasher().rehash_in_background(password, _store)
 
 
 @bp.route('/login', methods=['GET', 'POST'])
@@ -42,18 +57,32 @@ def login():
         # Get user from user manager
         user_manager = get_user_manager()
         user_found = user_manager.get_user_by_username(username)
+        hasher = get_password_hasher()
         
-        # Validate credentials
-        if user_found and check_password_hash(user_found.password_hash, password):
+        # Validate credentials (scrypt runs on the bounded hashing pool)
+        try:
+            password_ok = bool(user_found and password) and hasher.verify(user_found.password_hash, password)
+        except PasswordHashQueueTimeout:
+            current_app.logger.warning(f"Login for '{username}' shed: password hashing queue is full.")
+            raise ServiceUnavailable(description='Password hashing queue is full',
+                                     retry_after=current_app.config.get('ANALYZE_RETRY_AFTER', 10))
+        
+        if password_ok:
             # Check if user is approved
             if not user_found.is_approved:
                 flash('חשבונך ממתין לאישור מנהל.', 'warning')
                 current_app.logger.warning(f"Unapproved user '{username}' attempted to login.")
+                log_user_action('login_unapproved', user_id=user_found.id)
                 return render_template('auth/login.html')
             
-            # Log in the user
+            if hasher.needs_rehash(user_found.password_hash):
+                _schedule_rehash(user_found.id, password)
+            
+            # Log in the user on a fresh session ID (no session fixation)
+            regenerate_session()
             login_user(user_found)
             current_app.logger.info(f"User '{username}' logged in successfully.")
+            log_user_action('login', user_id=user_found.id)
             
             # Set session as permanent
             session.permanent = True
@@ -68,6 +97,7 @@ def login():
         else:
             flash('שם משתמש או סיסמה שגויים.', 'danger')
             current_app.logger.warning(f"Failed login attempt for username: '{username}'")
+            log_user_action('login_failed', f"username={username}", user_id=user_found.id if user_found else None)
     
     return render_template('auth/login.html')
 
@@ -126,14 +156,19 @@ def register():
         
         try:
             # Create new user (not approved by default)
-            password_hash = generate_password_hash(password)
+            password_hash = get_password_hasher().hash(password)
             new_user = user_manager.add_user(username, password_hash, is_approved=False)
             
             flash('ההרשמה הושלמה בהצלחה! אנא המתן לאישור מנהל.', 'success')
             current_app.logger.info(f"New user registered (pending approval): '{username}' with ID {new_user.id}.")
+            log_user_action('register', f"username={username}", user_id=new_user.id)
             
             return redirect(url_for('auth.login'))
             
+        except PasswordHashQueueTimeout:
+            current_app.logger.warning(f"Registration for '{username}' shed: password hashing queue is full.")
+            raise ServiceUnavailable(description='Password hashing queue is full',
+                                     retry_after=current_app.config.get('ANALYZE_RETRY_AFTER', 10))
         except Exception as e:
             flash('שגיאה ביצירת החשבון. נסה שוב.', 'danger')
             current_app.logger.error(f"Registration error for username '{username}': {e}")
@@ -155,13 +190,15 @@ def logout():
         Response: Redirect to login page with success message
     """
     username_on_logout = current_user.username
+    log_user_action('logout', user_id=current_user.id)
     
     # Clear custom session data (if any)
     from app.utils import clear_session_data
     clear_session_data()
     
-    # Log out user
+    # Log out user; the old session ID must not stay valid
     logout_user()
+    regenerate_session()
     
     current_app.logger.info(f"User '{username_on_logout}' logged out and session data cleared.")
     flash('התנתקת בהצלחה.', 'info')
@@ -0,0 +1,237 @@
+# app/logging_queue.py
+"""
+Non-blocking application logging with one log writer per host.
+
+Request threads only put records on an in-process queue (QueueHandler); a
+QueueListener thread formats them and hands them on, so neither message
+formatting nor disk I/O happens on the request path. The first process on
+the host to take an flock on '<LOG_FILE>.writer.lock' becomes the writer: it
+owns the RotatingFileHandler and accepts records from the other workers over
+a Unix socket. Every other process forwards its records to that socket and
+tries to take over the lock if the writer goes away, so the rotating file
+only ever has one writer. Without fcntl/AF_UNIX (Windows) each process writes
+the file itself, still off the request thread.
+
+A process forked after logging was configured (gunicorn --preload) inherits
+the queue and the writer state but not the listener thread; its first
+record drops the inherited state, re-runs the writer election and starts a
+listener of its own.
+"""
+
+import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, SocketHandler
+import os
+import pickle
+import queue
+import socket
+import socketserver
+import struct
+import threading
+from typing import Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows - אין נעילת קבצים, כל תהליך כותב לקובץ בעצמו
+    fcntl = None
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread.
+
+    The stock handler merges args into the message in the calling thread;
+    here the record is queued as-is, so '%s' arguments are only rendered
+    by the listener (and never for records below the handler level).
+
+    Args:
+        log_queue (queue.SimpleQueue): Queue the listener drains
+        after_fork (callable, optional): Called once in a forked child before its first record is queued
+    """
+
+    def __init__(self, log_queue, after_fork: Optional[Callable[[], None]] = None):
+        super().__init__(log_queue)
+        self.after_fork = after_fork
+        self._pid = os.getpid()
+        self._fork_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self._pid != os.getpid() and self.after_fork is not None:
+            with self._fork_lock:
+                if self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    self.after_fork()
+        super().emit(record)
+
+
+class _RecordStreamHandler(socketserver.StreamRequestHandler):
+    """Reads length-prefixed pickled records sent by SocketHandler."""
+
+    def handle(self):
+        while True:
+            header = self.connection.recv(4, socket.MSG_WAITALL)
+            if len(header) < 4:
+                return
+            length = struct.unpack('>L', header)[0]
+            data = self.connection.recv(length, socket.MSG_WAITALL)
+            if len(data) < length:
+                return
+            record = logging.makeLogRecord(pickle.loads(data))
+            self.server.target.handle(record)
+
+
+class _RecordServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class HostLogWriter(logging.Handler):
+    """
+    Sends records to the host's single log writer, becoming the writer if there is none.
+
+    Args:
+        file_handler (logging.Handler): Handler that writes the log file (used only by the writer)
+        lock_path (str): flock file deciding which process is the writer
+        socket_path (str): Unix socket the writer listens on
+    """
+
+    def __init__(self, file_handler: logging.Handler, lock_path: str, socket_path: str):
+        super().__init__()
+        self.file_handler = file_handler
+        self.lock_path = lock_path
+        self.socket_path = socket_path
+        self._lock_file = None
+        self._server = None
+        self._forwarder = SocketHandler(socket_path, None)
+        self._forwarder.closeOnError = True
+        self._try_become_writer()
+
+    def after_fork(self) -> None:
+        """
+        Drop the writer state inherited from the parent and hold the election again.
+
+        The parent keeps its lock and its server thread; closing the child's
+        copies of their descriptors does not affect them.
+        """
+        if self._server is not None:
+            self._server.socket.close()  # בלי shutdown - ה-thread שמשרת אותו לא קיים בילד
+            self._server = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self._forwarder.close()
+        self._forwarder = SocketHandler(self.socket_path, None)
+        self._forwarder.closeOnError = True
+        self._try_become_writer()
+
+    @property
+    def is_writer(self) -> bool:
+        return self._lock_file is not None
+
+    def _try_become_writer(self) -> bool:
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        # socket שנשאר מכותב קודם שמת - מחליפים אותו
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = _RecordServer(self.socket_path, _RecordStreamHandler)
+        self._server.target = self.file_handler
+        threading.Thread(target=self._server.serve_forever, name='log-writer', daemon=True).start()
+        return True
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self.is_writer:
+            self.file_handler.handle(record)
+            return
+        self._forwarder.emit(record)
+        # SocketHandler סוגר את החיבור כשהשליחה נכשלה; אולי הכותב נפל - ננסה לתפוס את מקומו.
+        # אם הנעילה עדיין תפוסה כותבים בכל זאת ישירות - עדיף כותב נוסף לרגע מאשר רשומה אבודה
+        if self._forwarder.sock is None:
+            self._try_become_writer()
+            self.file_handler.handle(record)
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        self._forwarder.close()
+        self.file_handler.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        super().close()
+
+
+def configure_queue_logging(app, level: int, logger: Optional[logging.Logger] = None,
+                            log_file: Optional[str] = None, socket_path: Optional[str] = None,
+                            listener_key: str = 'log_listener') -> QueueListener:
+    """
+    Route a logger through a queue to the host's log writer for its file.
+
+    Args:
+        app (Flask): Flask application instance (LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT)
+        level (int): Minimum level written to the file
+        logger (logging.Logger, optional): Logger to route (default: app.logger)
+        log_file (str, optional): File to write (default: LOG_FILE)
+        socket_path (str, optional): Writer socket (default: LOG_WRITER_SOCKET for LOG_FILE, else '<log_file>.sock')
+        listener_key (str): app.extensions key the listener is stored under
+
+    Returns:
+        QueueListener: The started listener (stop() flushes and joins it)
+    """
+    logger = logger or app.logger
+    log_file = log_file or app.config['LOG_FILE']
+    if socket_path is None and log_file == app.config['LOG_FILE']:
+        socket_path = app.config.get('LOG_WRITER_SOCKET')
+    file_handler = RotatingFileHandler(
+        log_file,
+        maxBytes=app.config['LOG_MAX_BYTES'],
+        backupCount=app.config['LOG_BACKUP_COUNT']
+    )
+    file_handler.setFormatter(logging.Formatter(
+        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
+    ))
+    file_handler.setLevel(level)
+
+    target: logging.Handler = file_handler
+    if app.config.get('LOG_SINGLE_WRITER', True) and fcntl is not None and hasattr(socket, 'AF_UNIX'):
+        try:
+            target = HostLogWriter(file_handler, f"{log_file}.writer.lock", socket_path or f"{log_file}.sock")
+        except OSError as e:
+            print(f"Shared log writer unavailable, writing the log file directly: {e}")
+
+    log_queue = queue.SimpleQueue()
+
+    def _start_listener() -> QueueListener:
+        listener = QueueListener(log_queue, target, respect_handler_level=True)
+        listener.start()
+        app.extensions[listener_key] = listener
+        return listener
+
+    def _after_fork() -> None:
+        # רשומות שעדיין היו בתור של האב ייכתבו על ידו - בילד הן כפילויות
+        while not log_queue.empty():
+            log_queue.get_nowait()
+        if isinstance(target, HostLogWriter):
+            target.after_fork()
+        _start_listener()
+
+    queue_handler = LazyQueueHandler(log_queue, after_fork=_after_fork)
+    queue_handler.setLevel(level)
+    logger.addHandler(queue_handler)
+    return _start_listener()
+
+
+def stop_queue_logging(app, listener_key: str = 'log_listener') -> None:
+    """Flush queued records and stop the listener (safe to call more than once)."""
+    listener: Optional[QueueListener] = app.extensions.pop(listener_key, None)
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
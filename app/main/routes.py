@@ -38,6 +38,28 @@ def index():
     return render_template('content_home.html', **template_data)
 
 
+
+@bp.route('/metrics')
+def metrics():
+    """
+    Prometheus scrape endpoint, summed across all workers on this host.
+    
+    Open unless METRICS_TOKEN is configured, in which case the scraper must
+    send it as a bearer token.
+    
+    Returns:
+        Response: Prometheus text exposition format
+    """
+    from flask import Response, abort, request
+    from modules.metrics import render_prometheus
+    import hmac
+    
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(401)
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
 # Register existing blueprints from modules package
 def register_legacy_blueprints(app):
     """
@@ -55,12 +77,14 @@ def register_legacy_blueprints(app):
         from modules.routes.graphs import graphs_bp
         from modules.routes.valuations import valuations_bp
         from modules.routes.placeholders import placeholders_bp
+        from modules.routes.compare import compare_bp
         
         # Register with the application
         app.register_blueprint(home_bp)
         app.register_blueprint(graphs_bp)
         app.register_blueprint(valuations_bp)
         app.register_blueprint(placeholders_bp)
+        app.register_blueprint(compare_bp)
         
         app.logger.info("Legacy blueprints registered successfully")
         
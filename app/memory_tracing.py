@@ -0,0 +1,322 @@
+# app/memory_tracing.py
+"""
+tracemalloc snapshots for finding what holds a worker's memory.
+
+An admin starts tracing, takes snapshots over time and compares them. Sizes
+are attributed to the innermost frame of each allocation's traceback that
+belongs to this project (e.g. 'modules.price_history'), so a DataFrame built
+by pandas on behalf of price_history counts against price_history; an
+allocation with no project frame counts against the top-level package of
+its innermost frame ('pandas', 'plotly', ...).
+
+tracemalloc only sees the process it runs in, so start, stop and snapshot
+requests are applied in the worker that serves them and broadcast to the
+other workers through the cache command log (see modules/cache_control.py);
+each worker applies them at the start of its next request. Every worker
+dumps its snapshots to MEMORY_SNAPSHOT_DIR as <id>.<pid>.snapshot with a
+JSON summary beside it, so any worker can report or diff any worker's
+snapshots. Snapshot ids are shared: one request yields one id, taken in
+every worker.
+"""
+
+from collections import OrderedDict
+import glob
+import json
+import linecache
+import os
+import threading
+import time
+import tracemalloc
+from flask import Flask, current_app
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows - בלי נעילה; מזהי תמונות מוקצים רק מבקשות של מנהל
+    fcntl = None
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# הקצאות של tracemalloc עצמו ושל מנגנון הייבוא לא מעניינות
+_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+_lock = threading.Lock()
+# תמונות שנטענו מהדיסק (path -> (mtime, Snapshot)) - טעינה של תמונה גדולה איטית
+_loaded: 'OrderedDict[str, Tuple[float, tracemalloc.Snapshot]]' = OrderedDict()
+_MAX_LOADED = 4
+
+
+def _is_project_file(filename: str) -> bool:
+    path = os.path.abspath(filename)
+    return path.startswith(PROJECT_ROOT + os.sep) and 'site-packages' not in path
+
+
+def _module_of(filename: str) -> str:
+    """Dotted project module ('modules.price_history') or top-level package name for a source file."""
+    path = os.path.abspath(filename)
+    if _is_project_file(path):
+        relative = os.path.splitext(os.path.relpath(path, PROJECT_ROOT))[0]
+        return relative.replace(os.sep, '.').removesuffix('.__init__')
+    parts = path.split(os.sep)
+    if 'site-packages' in parts:
+        return os.path.splitext(parts[parts.index('site-packages') + 1])[0]
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _attribute(traceback: tracemalloc.Traceback, cache: Dict) -> str:
+    # Traceback מסודר מהמסגרת הישנה לחדשה - מחפשים את הפנימית ביותר בקוד שלנו
+    for frame in reversed(traceback):
+        owner = cache.get(frame.filename)
+        if owner is None:
+            owner = cache[frame.filename] = _module_of(frame.filename) if _is_project_file(frame.filename) else ''
+        if owner:
+            return owner
+    filename = traceback[-1].filename
+    key = ('external', filename)
+    if key not in cache:
+        cache[key] = _module_of(filename)
+    return cache[key]
+
+
+def _by_module(snapshot: tracemalloc.Snapshot) -> Dict[str, List[int]]:
+    """module -> [size_bytes, count]."""
+    totals: Dict[str, List[int]] = {}
+    cache: Dict = {}
+    for stat in snapshot.statistics('traceback'):
+        entry = totals.setdefault(_attribute(stat.traceback, cache), [0, 0])
+        entry[0] += stat.size
+        entry[1] += stat.count
+    return totals
+
+
+def start_tracing(frames: int = 25) -> None:
+    """Start tracemalloc in this worker with enough frames to find the project code behind library allocations."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stop_tracing(store_dir: str) -> None:
+    """Stop tracemalloc in this worker and delete its snapshots (tracing costs memory and CPU on every allocation)."""
+    tracemalloc.stop()
+    for path in glob.glob(os.path.join(store_dir, f'*.{os.getpid()}.snapshot')):
+        _remove(path)
+
+
+def _base(store_dir: str, snapshot_id: int, pid: int) -> str:
+    return os.path.join(store_dir, f'{snapshot_id}.{pid}')
+
+
+def _remove(snapshot_path: str) -> None:
+    for path in (snapshot_path, snapshot_path[:-len('.snapshot')] + '.json'):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    with _lock:
+        _loaded.pop(snapshot_path, None)
+
+
+def next_snapshot_id(store_dir: str) -> int:
+    """Allocate a snapshot id unique across the workers sharing store_dir."""
+    os.makedirs(store_dir, exist_ok=True)
+    with open(os.path.join(store_dir, 'next_id.lock'), 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        content = f.read().strip()
+        snapshot_id = int(content) if content.isdigit() else 1
+        f.seek(0)
+        f.truncate()
+        f.write(str(snapshot_id + 1))
+    return snapshot_id
+
+
+def take_snapshot(store_dir: str, snapshot_id: int, label: Optional[str] = None, max_snapshots: int = 5) -> Dict:
+    """
+    Snapshot this worker under snapshot_id, keeping at most max_snapshots of its snapshots (the oldest is dropped).
+
+    Returns:
+        dict: Snapshot summary (id, pid, label, taken_at, traced bytes)
+
+    Raises:
+        RuntimeError: If tracing has not been started in this worker
+    """
+    if not tracemalloc.is_tracing():
+        raise RuntimeError('tracemalloc is not tracing; start it first')
+    snapshot = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+    summary = {
+        'id': snapshot_id,
+        'pid': os.getpid(),
+        'label': label,
+        'taken_at': time.time(),
+        'traced_bytes': sum(stat.size for stat in snapshot.statistics('filename')),
+    }
+    os.makedirs(store_dir, exist_ok=True)
+    base = _base(store_dir, snapshot_id, os.getpid())
+    snapshot.dump(base + '.snapshot.tmp')
+    os.replace(base + '.snapshot.tmp', base + '.snapshot')
+    with open(base + '.json.tmp', 'w', encoding='utf-8') as f:
+        json.dump(summary, f)
+    os.replace(base + '.json.tmp', base + '.json')
+
+    own = sorted(glob.glob(os.path.join(store_dir, f'*.{os.getpid()}.snapshot')),
+                 key=lambda path: int(os.path.basename(path).split('.', 1)[0]))
+    for path in own[:-max_snapshots]:
+        _remove(path)
+    return summary
+
+
+def list_snapshots(store_dir: str) -> List[Dict]:
+    """Summaries of the stored snapshots of every worker, by id then pid."""
+    summaries = []
+    for path in glob.glob(os.path.join(store_dir, '*.*.json')):
+        try:
+            with open(path, encoding='utf-8') as f:
+                summaries.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # נמחקה בינתיים
+    return sorted(summaries, key=lambda s: (s['id'], s['pid']))
+
+
+def _pids_with(store_dir: str, *snapshot_ids: int) -> List[int]:
+    """Workers that have all of the given snapshots, this worker first."""
+    pids = None
+    for snapshot_id in snapshot_ids:
+        found = {int(os.path.basename(path).split('.')[1])
+                 for path in glob.glob(os.path.join(store_dir, f'{snapshot_id}.*.snapshot'))}
+        pids = found if pids is None else pids & found
+    return sorted(pids or (), key=lambda pid: (pid != os.getpid(), pid))
+
+
+def _get(store_dir: str, snapshot_id: int, pid: int) -> Tuple[Dict, tracemalloc.Snapshot]:
+    base = _base(store_dir, snapshot_id, pid)
+    try:
+        mtime = os.path.getmtime(base + '.snapshot')
+        with open(base + '.json', encoding='utf-8') as f:
+            summary = json.load(f)
+    except (OSError, ValueError):
+        raise KeyError(snapshot_id)
+    with _lock:
+        cached = _loaded.get(base + '.snapshot')
+    if cached is not None and cached[0] == mtime:
+        return summary, cached[1]
+    snapshot = tracemalloc.Snapshot.load(base + '.snapshot')
+    with _lock:
+        _loaded[base + '.snapshot'] = (mtime, snapshot)
+        while len(_loaded) > _MAX_LOADED:
+            _loaded.popitem(last=False)
+    return summary, snapshot
+
+
+def _resolve_pid(store_dir: str, pid: Optional[int], *snapshot_ids: int) -> int:
+    """The given pid, or else this worker if it has the snapshots, or else the first worker that does."""
+    if pid is not None:
+        return pid
+    pids = _pids_with(store_dir, *snapshot_ids)
+    if not pids:
+        raise KeyError(snapshot_ids[0])
+    return pids[0]
+
+
+def status(store_dir: str) -> Dict:
+    """Tracing state of this worker plus the stored snapshots of all workers."""
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        'pid': os.getpid(),
+        'tracing': tracemalloc.is_tracing(),
+        'frames': tracemalloc.get_traceback_limit(),
+        'traced_bytes': current,
+        'peak_traced_bytes': peak,
+        'tracemalloc_overhead_bytes': tracemalloc.get_tracemalloc_memory(),
+        'snapshots': list_snapshots(store_dir),
+    }
+
+
+def _site(stat) -> str:
+    frame = stat.traceback[-1]
+    return f"{os.path.relpath(frame.filename, PROJECT_ROOT) if _is_project_file(frame.filename) else frame.filename}:{frame.lineno}"
+
+
+def top_allocations(store_dir: str, snapshot_id: int, pid: Optional[int] = None, limit: int = 20) -> Dict:
+    """
+    Largest holders in one worker's snapshot, by module and by allocation site (file:line).
+
+    Args:
+        pid (int, optional): Worker whose snapshot to read; default this worker, or any that has it
+
+    Raises:
+        KeyError: If the snapshot does not exist for that worker
+    """
+    pid = _resolve_pid(store_dir, pid, snapshot_id)
+    summary, snapshot = _get(store_dir, snapshot_id, pid)
+    modules = sorted(_by_module(snapshot).items(), key=lambda item: item[1][0], reverse=True)
+    return {
+        'snapshot': summary,
+        'pid': pid,
+        'modules': [{'module': name, 'size_bytes': size, 'count': count} for name, (size, count) in modules[:limit]],
+        'sites': [{'site': _site(stat), 'size_bytes': stat.size, 'count': stat.count}
+                  for stat in snapshot.statistics('lineno')[:limit]],
+    }
+
+
+def diff(store_dir: str, from_id: int, to_id: int, pid: Optional[int] = None, limit: int = 20) -> Dict:
+    """
+    Growth between two snapshots of one worker, by module and by allocation site, largest change first.
+
+    Args:
+        pid (int, optional): Worker to compare; default this worker, or any that has both snapshots
+
+    Raises:
+        KeyError: If either snapshot does not exist for that worker
+    """
+    pid = _resolve_pid(store_dir, pid, from_id, to_id)
+    (older_summary, older), (newer_summary, newer) = _get(store_dir, from_id, pid), _get(store_dir, to_id, pid)
+    before, after = _by_module(older), _by_module(newer)
+    modules = []
+    for name in set(before) | set(after):
+        size_before, count_before = before.get(name, [0, 0])
+        size_after, count_after = after.get(name, [0, 0])
+        if size_after != size_before or count_after != count_before:
+            modules.append({'module': name, 'size_bytes': size_after, 'size_diff_bytes': size_after - size_before,
+                            'count_diff': count_after - count_before})
+    modules.sort(key=lambda row: abs(row['size_diff_bytes']), reverse=True)
+    return {
+        'from': older_summary,
+        'to': newer_summary,
+        'pid': pid,
+        'modules': modules[:limit],
+        'sites': [{'site': _site(stat), 'size_bytes': stat.size, 'size_diff_bytes': stat.size_diff,
+                   'count_diff': stat.count_diff}
+                  for stat in newer.compare_to(older, 'lineno')[:limit]],
+    }
+
+
+def broadcast(command: Dict) -> None:
+    """Append a memory command ('memory_start', 'memory_stop', 'memory_snapshot') for the other workers."""
+    log = current_app.extensions.get('cache_command_log')
+    if log is not None:
+        log.append(command)
+
+
+def apply_command(app: Flask, command: Dict) -> None:
+    """Apply a memory command broadcast by another worker (called from apply_pending_commands)."""
+    store_dir = app.config['MEMORY_SNAPSHOT_DIR']
+    op = command['op']
+    if op == 'memory_start':
+        start_tracing(app.config.get('MEMORY_TRACE_FRAMES', 25))
+    elif op == 'memory_stop':
+        stop_tracing(store_dir)
+    elif op == 'memory_snapshot':
+        try:
+            take_snapshot(store_dir, command['id'], command.get('label'), app.config.get('MEMORY_MAX_SNAPSHOTS', 5))
+        except RuntimeError:
+            # תהליך שעלה אחרי פקודת ההתחלה לא עוקב - אין לו מה לתרום
+            app.logger.info("Skipped broadcast memory snapshot %s: not tracing in this worker.", command['id'])
+            return
+    app.logger.info("Applied broadcast %s.", op)
@@ -9,9 +9,18 @@ including the User model and user management functions.
 from flask import current_app
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash
+from bisect import bisect_left, insort
+from contextlib import contextmanager
 import json
 import os
-from typing import Dict, Optional
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows - אין נעילת קבצים בין תהליכים, רק בתוך התהליך
+    fcntl = None
 
 
 class User(UserMixin):
@@ -48,62 +57,426 @@ class User(UserMixin):
         return f'<User {self.username}(id={self.id}, approved={self.is_approved})>'
 
 
+class JsonUserStore:
+    """
+    User storage in a single JSON file (the original backend).
+    
+    Users are kept in memory with a username index. Several processes may
+    share the file: every read first compares the file's signature (mtime,
+    size, inode) with the one last loaded and applies the differences when
+    it changed, and every change is a locked read-modify-write that
+    replaces the file atomically, so concurrent writers cannot clobber each
+    other.
+    
+    Args:
+        users_file (str): Path to the users JSON file
+    """
+    
+    def __init__(self, users_file: str):
+        self.users_file = users_file
+        self._users: Dict[int, User] = {}
+        self._by_username: Dict[str, User] = {}
+        self._sorted_usernames: List[str] = []
+        self._approved_count = 0
+        self._signature: Optional[tuple] = None
+        self._lock = threading.RLock()
+        self.reloads = 0
+        self._refresh()
+    
+    def _file_signature(self) -> Optional[tuple]:
+        try:
+            st = os.stat(self.users_file)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+    
+    def _refresh(self) -> None:
+        """Apply changes made by other processes since the file was last loaded."""
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        with self._lock:
+            signature = self._file_signature()
+            if signature == self._signature or signature is None:
+                return
+            try:
+                changed = self._apply(load_users_json(self.users_file))
+            except (IOError, json.JSONDecodeError, KeyError, TypeError) as e:
+                current_app.logger.error(f"Error loading users from {self.users_file}: {e}")
+                return
+            self._signature = signature
+            self.reloads += 1
+            current_app.logger.info(
+                f"Users loaded from {self.users_file}. Count: {len(self._users)}, changed: {changed}"
+            )
+    
+    def _apply(self, loaded: Dict[int, User]) -> int:
+        """Merge freshly loaded users into the cache in place; returns how many changed."""
+        changed = 0
+        for uid in set(self._users) - set(loaded):
+            del self._users[uid]
+            changed += 1
+        for uid, fresh in loaded.items():
+            user = self._users.get(uid)
+            if user is None:
+                self._users[uid] = fresh
+                changed += 1
+            elif (user.username, user.password_hash, user.is_approved) != \
+                    (fresh.username, fresh.password_hash, fresh.is_approved):
+                user.username, user.password_hash, user.is_approved = fresh.username, fresh.password_hash, fresh.is_approved
+                changed += 1
+        if changed:
+            self._rebuild_indexes()
+        return changed
+    
+    def _rebuild_indexes(self) -> None:
+        self._by_username = {user.username: user for user in self._users.values()}
+        self._sorted_usernames = sorted(self._by_username)
+        self._approved_count = sum(1 for user in self._users.values() if user.is_approved)
+    
+    @contextmanager
+    def _write_transaction(self):
+        """Exclusive (cross-process) section for read-modify-write of the file."""
+        with self._lock:
+            lock_file = None
+            if fcntl is not None:
+                lock_file = open(f"{self.users_file}.lock", 'w')
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                yield
+            finally:
+                if lock_file is not None:
+                    lock_file.close()
+    
+    def save(self) -> bool:
+        """
+        Atomically write all users to the JSON file (temp file + rename).
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        users_data = {
+            str(uid): {
+                'username': user.username,
+                'password_hash': user.password_hash,
+                'is_approved': user.is_approved
+            }
+            for uid, user in sorted(self._users.items())
+        }
+        tmp_path = f"{self.users_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(users_data, f, indent=4, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.users_file)
+        except OSError as e:
+            current_app.logger.error(f"Error saving users data to {self.users_file}: {e}")
+            return False
+        
+        self._signature = self._file_signature()
+        current_app.logger.info("Users data saved successfully.")
+        return True
+    
+    def count(self) -> int:
+        self._refresh()
+        return len(self._users)
+    
+    def get(self, user_id: int) -> Optional[User]:
+        self._refresh()
+        return self._users.get(user_id)
+    
+    def get_by_username(self, username: str) -> Optional[User]:
+        self._refresh()
+        return self._by_username.get(username)
+    
+    def add(self, username: str, password_hash: str, is_approved: bool, user_id: Optional[int] = None) -> User:
+        with self._write_transaction():
+            if username in self._by_username:
+                raise ValueError(f"Username '{username}' already exists")
+            new_id = user_id or max(self._users.keys(), default=0) + 1
+            user = User(new_id, username, password_hash, is_approved)
+            self._users[new_id] = user
+            self._by_username[username] = user
+            insort(self._sorted_usernames, username)
+            self._approved_count += int(bool(is_approved))
+            self.save()
+        return user
+    
+    def update(self, user_id: int, fields: Dict) -> bool:
+        with self._write_transaction():
+            user = self._users.get(user_id)
+            if not user:
+                return False
+            if 'username' in fields and fields['username'] != user.username:
+                if fields['username'] in self._by_username:
+                    raise ValueError(f"Username '{fields['username']}' already exists")
+                del self._by_username[user.username]
+                self._sorted_usernames.pop(bisect_left(self._sorted_usernames, user.username))
+                self._by_username[fields['username']] = user
+                insort(self._sorted_usernames, fields['username'])
+            if 'is_approved' in fields:
+                self._approved_count += int(bool(fields['is_approved'])) - int(bool(user.is_approved))
+            for attr, value in fields.items():
+                setattr(user, attr, value)
+            self.save()
+        return True
+    
+    def delete(self, user_id: int) -> bool:
+        with self._write_transaction():
+            user = self._users.pop(user_id, None)
+            if not user:
+                return False
+            self._by_username.pop(user.username, None)
+            self._sorted_usernames.pop(bisect_left(self._sorted_usernames, user.username))
+            self._approved_count -= int(bool(user.is_approved))
+            self.save()
+        return True
+    
+    def all(self) -> Dict[int, User]:
+        self._refresh()
+        return self._users.copy()
+    
+    def counts(self) -> Dict[str, int]:
+        self._refresh()
+        total = len(self._users)
+        return {'total': total, 'approved': self._approved_count, 'pending': total - self._approved_count}
+    
+    def search(self, prefix: str = '', is_approved: Optional[bool] = None,
+               offset: int = 0, limit: int = 50) -> Tuple[List[User], int]:
+        self._refresh()
+        with self._lock:
+            start = bisect_left(self._sorted_usernames, prefix)
+            matches = []
+            for username in self._sorted_usernames[start:]:
+                if not username.startswith(prefix):
+                    break
+                user = self._by_username[username]
+                if is_approved is None or bool(user.is_approved) == is_approved:
+                    matches.append(user)
+        return matches[offset:offset + limit], len(matches)
+
+
+class SqliteUserStore:
+    """
+    User storage in SQLite (WAL mode) with a unique username index.
+    
+    Lookups by ID or username are index seeks and every change touches a
+    single row inside its own transaction. Nothing is cached in the process,
+    so changes made by other workers are visible on the next read.
+    
+    Args:
+        db_file (str): Path to the SQLite database (created if missing)
+    """
+    
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self._local = threading.local()
+        directory = os.path.dirname(db_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS users ('
+                'id INTEGER PRIMARY KEY, '
+                'username TEXT NOT NULL, '
+                'password_hash TEXT NOT NULL, '
+                'is_approved INTEGER NOT NULL DEFAULT 0)'
+            )
+            conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS users_username ON users (username)')
+            conn.execute('CREATE INDEX IF NOT EXISTS users_approved_username ON users (is_approved, username)')
+            # מונים שמתעדכנים בטריגרים - הדשבורד קורא שורה אחת במקום לספור את כל הטבלה
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS user_counters ('
+                'id INTEGER PRIMARY KEY CHECK (id = 1), '
+                'total INTEGER NOT NULL, approved INTEGER NOT NULL)'
+            )
+            conn.execute(
+                'INSERT OR IGNORE INTO user_counters (id, total, approved) '
+                'SELECT 1, COUNT(*), COALESCE(SUM(is_approved), 0) FROM users'
+            )
+            conn.executescript(
+                'CREATE TRIGGER IF NOT EXISTS users_count_insert AFTER INSERT ON users BEGIN '
+                'UPDATE user_counters SET total = total + 1, approved = approved + NEW.is_approved WHERE id = 1; END; '
+                'CREATE TRIGGER IF NOT EXISTS users_count_delete AFTER DELETE ON users BEGIN '
+                'UPDATE user_counters SET total = total - 1, approved = approved - OLD.is_approved WHERE id = 1; END; '
+                'CREATE TRIGGER IF NOT EXISTS users_count_approve AFTER UPDATE OF is_approved ON users BEGIN '
+                'UPDATE user_counters SET approved = approved + NEW.is_approved - OLD.is_approved WHERE id = 1; END;'
+            )
+    
+    def _connect(self) -> sqlite3.Connection:
+        # חיבור נפרד לכל thread - חיבורי sqlite3 אינם משותפים בין threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+    
+    @staticmethod
+    def _to_user(row) -> Optional[User]:
+        if row is None:
+            return None
+        return User(row[0], row[1], row[2], bool(row[3]))
+    
+    def count(self) -> int:
+        return self._connect().execute('SELECT COUNT(*) FROM users').fetchone()[0]
+    
+    def get(self, user_id: int) -> Optional[User]:
+        return self._to_user(self._connect().execute(
+            'SELECT id, username, password_hash, is_approved FROM users WHERE id = ?', (user_id,)
+        ).fetchone())
+    
+    def get_by_username(self, username: str) -> Optional[User]:
+        return self._to_user(self._connect().execute(
+            'SELECT id, username, password_hash, is_approved FROM users WHERE username = ?', (username,)
+        ).fetchone())
+    
+    def add(self, username: str, password_hash: str, is_approved: bool, user_id: Optional[int] = None) -> User:
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute(
+                    'INSERT INTO users (id, username, password_hash, is_approved) VALUES (?, ?, ?, ?)',
+                    (user_id, username, password_hash, int(is_approved))
+                )
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Username '{username}' already exists")
+        return User(cursor.lastrowid, username, password_hash, is_approved)
+    
+    def update(self, user_id: int, fields: Dict) -> bool:
+        if not fields:
+            return self.get(user_id) is not None
+        # שמות העמודות מגיעים מרשימה סגורה (USER_FIELDS) - בטוח לשרשר
+        assignments = ', '.join(f'{column} = ?' for column in fields)
+        values = [int(v) if column == 'is_approved' else v for column, v in fields.items()]
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute(f'UPDATE users SET {assignments} WHERE id = ?', (*values, user_id))
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Username '{fields.get('username')}' already exists")
+        return cursor.rowcount > 0
+    
+    def delete(self, user_id: int) -> bool:
+        with self._connect() as conn:
+            cursor = conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
+        return cursor.rowcount > 0
+    
+    def all(self) -> Dict[int, User]:
+        rows = self._connect().execute(
+            'SELECT id, username, password_hash, is_approved FROM users ORDER BY id'
+        ).fetchall()
+        return {row[0]: self._to_user(row) for row in rows}
+    
+    def counts(self) -> Dict[str, int]:
+        total, approved = self._connect().execute(
+            'SELECT total, approved FROM user_counters WHERE id = 1'
+        ).fetchone()
+        return {'total': total, 'approved': approved, 'pending': total - approved}
+    
+    def search(self, prefix: str = '', is_approved: Optional[bool] = None,
+               offset: int = 0, limit: int = 50) -> Tuple[List[User], int]:
+        conditions, params = [], []
+        if is_approved is not None:
+            conditions.append('is_approved = ?')
+            params.append(int(is_approved))
+        if prefix:
+            # טווח על האינדקס במקום LIKE (שלא משתמש באינדקס עם collation רגיש לאותיות)
+            conditions.append('username >= ? AND username < ?')
+            params += [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        conn = self._connect()
+        total = conn.execute(f'SELECT COUNT(*) FROM users{where}', params).fetchone()[0]
+        rows = conn.execute(
+            f'SELECT id, username, password_hash, is_approved FROM users{where} '
+            'ORDER BY username LIMIT ? OFFSET ?', (*params, limit, offset)
+        ).fetchall()
+        return [self._to_user(row) for row in rows], total
+    
+    def import_json(self, users_file: str) -> int:
+        """
+        Import users from a users.json file, keeping their IDs.
+        
+        Users whose ID or username already exists are skipped.
+        
+        Args:
+            users_file (str): Path to the JSON file
+            
+        Returns:
+            int: Number of users imported
+        """
+        users = load_users_json(users_file)
+        with self._connect() as conn:
+            # total_changes סופר גם את עדכוני המונים מה-triggers, לכן סופרים שורות
+            before = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+            conn.executemany(
+                'INSERT OR IGNORE INTO users (id, username, password_hash, is_approved) VALUES (?, ?, ?, ?)',
+                [(u.id, u.username, u.password_hash, int(u.is_approved)) for u in users.values()]
+            )
+            return conn.execute('SELECT COUNT(*) FROM users').fetchone()[0] - before
+
+
+def load_users_json(users_file: str) -> Dict[int, User]:
+    """
+    Read a users.json file into User objects keyed by ID.
+    
+    Raises:
+        IOError, json.JSONDecodeError, KeyError, TypeError: On unreadable files
+    """
+    with open(users_file, 'r', encoding='utf-8') as f:
+        users_data = json.load(f)
+    return {
+        int(uid): User(
+            int(uid),
+            data['username'],
+            data['password_hash'],
+            data.get('is_approved', False)
+        )
+        for uid, data in users_data.items()
+    }
+
+
+# שדות משתמש שניתן לעדכן דרך update_user
+USER_FIELDS = ('username', 'password_hash', 'is_approved')
+
+
 class UserManager:
     """
     Manages user data persistence and operations.
     
-    This class handles loading, saving, and managing users in the JSON file-based
-    storage system. In a production environment, this could be replaced with
-    a proper database ORM.
+    Storage is delegated to a backend selected by USER_STORE_BACKEND:
+    'sqlite' (default, USERS_DB_FILE) or 'json' (USERS_FILE). A new SQLite
+    database is seeded from USERS_FILE when that file exists.
     """
     
-    def __init__(self, users_file: Optional[str] = None):
+    def __init__(self, users_file: Optional[str] = None, backend: Optional[str] = None):
         """
-        Initialize UserManager with specified users file.
+        Initialize UserManager with the configured storage backend.
         
         Args:
             users_file (str, optional): Path to users JSON file.
                                       Uses config default if not provided.
+            backend (str, optional): 'sqlite' or 'json'. Uses config default if not provided.
         """
         self.users_file = users_file or current_app.config.get('USERS_FILE', 'users.json')
-        self._users_cache: Dict[int, User] = {}
-        self._load_users()
-    
-    def _load_users(self) -> None:
-        """
-        Load users from JSON file into memory cache.
+        backend = backend or current_app.config.get('USER_STORE_BACKEND', 'sqlite')
         
-        Creates initial admin user if file doesn't exist or is corrupted.
-        """
-        if not os.path.exists(self.users_file):
-            current_app.logger.info(f"{self.users_file} not found. Creating initial admin user.")
-            self._create_initial_admin()
-            return
+        if backend == 'json':
+            self.store = JsonUserStore(self.users_file)
+        elif backend == 'sqlite':
+            self.store = SqliteUserStore(current_app.config.get('USERS_DB_FILE', 'data/users.sqlite3'))
+            if self.store.count() == 0 and os.path.exists(self.users_file):
+                try:
+                    imported = self.store.import_json(self.users_file)
+                    current_app.logger.info(f"Imported {imported} users from {self.users_file} into {self.store.db_file}.")
+                except (IOError, json.JSONDecodeError, KeyError, TypeError) as e:
+                    current_app.logger.error(f"Error importing users from {self.users_file}: {e}")
+        else:
+            raise ValueError(f"Unknown USER_STORE_BACKEND '{backend}'")
         
-        try:
-            with open(self.users_file, 'r', encoding='utf-8') as f:
-                users_data = json.load(f)
-            
-            # Convert JSON data to User objects
-            self._users_cache = {
-                int(uid): User(
-                    int(uid),
-                    data['username'],
-                    data['password_hash'],
-                    data.get('is_approved', False)
-                )
-                for uid, data in users_data.items()
-            }
-            
-            current_app.logger.info(
-                f"Users loaded successfully from {self.users_file}. Count: {len(self._users_cache)}"
-            )
-            
-        except (IOError, json.JSONDecodeError, KeyError, TypeError) as e:
-            current_app.logger.error(
-                f"Error loading users from {self.users_file}: {e}. "
-                "Falling back to initial admin user ONLY."
-            )
+        if self.store.count() == 0:
+            current_app.logger.info("No users found. Creating initial admin user.")
             self._create_initial_admin()
     
     def _create_initial_admin(self) -> None:
@@ -119,37 +492,7 @@ class UserManager:
             f"Hashed password (prefix): {hashed_password[:10]}..."
         )
         
-        admin_user = User(1, admin_username, hashed_password, True)
-        self._users_cache = {1: admin_user}
-        self.save_users()
-    
-    def save_users(self) -> bool:
-        """
-        Save current users cache to JSON file.
-        
-        Returns:
-            bool: True if successful, False otherwise
-        """
-        try:
-            # Convert User objects to JSON-serializable format
-            users_data = {
-                str(uid): {
-                    'username': user.username,
-                    'password_hash': user.password_hash,
-                    'is_approved': user.is_approved
-                }
-                for uid, user in self._users_cache.items()
-            }
-            
-            with open(self.users_file, 'w', encoding='utf-8') as f:
-                json.dump(users_data, f, indent=4, ensure_ascii=False)
-            
-            current_app.logger.info("Users data saved successfully.")
-            return True
-            
-        except IOError as e:
-            current_app.logger.error(f"Error saving users data to {self.users_file}: {e}")
-            return False
+        self.store.add(admin_username, hashed_password, True, user_id=1)
     
     def get_user(self, user_id: int) -> Optional[User]:
         """
@@ -161,13 +504,13 @@ class UserManager:
         Returns:
             User or None: User object if found, None otherwise
         """
-        user = self._users_cache.get(user_id)
+        user = self.store.get(user_id)
         if user:
             current_app.logger.debug(
                 f"User loaded by ID: {user_id} -> {user.username} (Approved: {user.is_approved})"
             )
         else:
-            current_app.logger.warning(f"User ID {user_id} not found in users cache.")
+            current_app.logger.warning(f"User ID {user_id} not found in user store.")
         return user
     
     def get_user_by_username(self, username: str) -> Optional[User]:
@@ -180,10 +523,7 @@ class UserManager:
         Returns:
             User or None: User object if found, None otherwise
         """
-        for user in self._users_cache.values():
-            if user.username == username:
-                return user
-        return None
+        return self.store.get_by_username(username)
     
     def add_user(self, username: str, password_hash: str, is_approved: bool = False) -> User:
         """
@@ -200,22 +540,10 @@ class UserManager:
         Raises:
             ValueError: If username already exists
         """
-        # Check if username already exists
-        if self.get_user_by_username(username):
-            raise ValueError(f"Username '{username}' already exists")
-        
-        # Generate new user ID
-        new_id = max(self._users_cache.keys(), default=0) + 1
-        
-        # Create and store new user
-        new_user = User(new_id, username, password_hash, is_approved)
-        self._users_cache[new_id] = new_user
-        
-        # Save to file
-        self.save_users()
+        new_user = self.store.add(username, password_hash, is_approved)
         
         current_app.logger.info(
-            f"New user created: '{username}' with ID {new_id} (Approved: {is_approved})"
+            f"New user created: '{username}' with ID {new_user.id} (Approved: {is_approved})"
         )
         
         return new_user
@@ -226,22 +554,18 @@ class UserManager:
         
         Args:
             user_id (int): ID of user to update
-            **kwargs: Attributes to update
+            **kwargs: Attributes to update (username, password_hash, is_approved)
             
         Returns:
             bool: True if user was updated, False if not found
         """
-        user = self.get_user(user_id)
-        if not user:
+        fields = {attr: value for attr, value in kwargs.items() if attr in USER_FIELDS}
+        if not self.store.update(user_id, fields):
+            current_app.logger.warning(f"User ID {user_id} not found in user store.")
             return False
         
-        # Update allowed attributes
-        for attr, value in kwargs.items():
-            if hasattr(user, attr):
-                setattr(user, attr, value)
-                current_app.logger.info(f"Updated user {user_id} {attr} to {value}")
-        
-        self.save_users()
+        for attr, value in fields.items():
+            current_app.logger.info(f"Updated user {user_id} {attr} to {value if attr != 'password_hash' else '***'}")
         return True
     
     def delete_user(self, user_id: int) -> bool:
@@ -254,14 +578,11 @@ class UserManager:
         Returns:
             bool: True if user was deleted, False if not found
         """
-        if user_id not in self._users_cache:
+        user = self.store.get(user_id)
+        if not user or not self.store.delete(user_id):
             return False
         
-        username = self._users_cache[user_id].username
-        del self._users_cache[user_id]
-        self.save_users()
-        
-        current_app.logger.info(f"User deleted: '{username}' (ID: {user_id})")
+        current_app.logger.info(f"User deleted: '{user.username}' (ID: {user_id})")
         return True
     
     def get_all_users(self) -> Dict[int, User]:
@@ -271,7 +592,39 @@ class UserManager:
         Returns:
             Dict[int, User]: Dictionary mapping user IDs to User objects
         """
-        return self._users_cache.copy()
+        return self.store.all()
+    
+    def search_users(self, prefix: str = '', is_approved: Optional[bool] = None,
+                     page: int = 1, per_page: int = 50) -> Dict:
+        """
+        One page of users ordered by username.
+        
+        Args:
+            prefix (str): Only usernames starting with this (index range scan)
+            is_approved (bool, optional): Filter by approval status
+            page (int): 1-based page number (clamped to the last page)
+            per_page (int): Page size
+            
+        Returns:
+            dict: 'users', 'total', 'page', 'pages' and 'per_page'
+        """
+        per_page = max(1, per_page)
+        page = max(1, page)
+        users, total = self.store.search(prefix, is_approved, (page - 1) * per_page, per_page)
+        pages = max(1, -(-total // per_page))
+        if page > pages:
+            page = pages
+            users, total = self.store.search(prefix, is_approved, (page - 1) * per_page, per_page)
+        return {'users': users, 'total': total, 'page': page, 'pages': pages, 'per_page': per_page}
+    
+    def get_user_counts(self) -> Dict[str, int]:
+        """
+        Total, approved and pending user counts, maintained incrementally by the store.
+        
+        Returns:
+            dict: 'total', 'approved' and 'pending'
+        """
+        return self.store.counts()
     
     def username_exists(self, username: str) -> bool:
         """
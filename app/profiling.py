@@ -0,0 +1,341 @@
+# app/profiling.py
+"""
+On-demand profiling of live requests, started from the admin API.
+
+An admin opens a profiling session for an endpoint (or all endpoints) that
+covers either the next N matching requests or a random fraction of them,
+until the session expires. Sessions are kept in PROFILE_DIR/active.json, so
+every worker picks them up; each worker re-reads that file at most every
+PROFILE_POLL_INTERVAL seconds, and with no active session the request hook
+costs a clock read and a dict check.
+
+Two modes:
+- 'cprofile': deterministic cProfile of the request, aggregated into a
+  pstats file (open with snakeviz / pstats).
+- 'sample': a sampling thread records the request thread's stack every
+  PROFILE_SAMPLE_INTERVAL seconds, aggregated in collapsed-stack format
+  (flamegraph.pl, speedscope). Lower overhead than cProfile.
+
+Each worker writes its aggregate to PROFILE_DIR/<session>.<pid>.prof or
+.collapsed after every profiled request; downloads merge all workers.
+"""
+
+from collections import Counter
+import cProfile
+import glob
+import io
+import json
+import os
+import pstats
+import random
+import secrets
+import sys
+import threading
+import time
+from flask import Flask, g, request
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows - בלי נעילה; עדכון הסשנים נדיר ומגיע מהמנהל בלבד
+    fcntl = None
+
+PROFILE_MODES = ('cprofile', 'sample')
+
+_state_lock = threading.Lock()
+_sessions: Dict[str, Dict] = {}
+_sessions_mtime: Optional[float] = None
+_last_check = 0.0
+_poll_interval = 1.0
+_taken: Counter = Counter()  # session -> requests profiled in this worker
+_aggregates: Dict[str, object] = {}  # session -> pstats.Stats or Counter
+# cProfile אחד בכל פעם בתהליך (ב-3.12+ שני פרופיילרים פעילים במקביל נכשלים)
+_profile_slot = threading.Lock()
+
+
+def _active_path(profile_dir: str) -> str:
+    return os.path.join(profile_dir, 'active.json')
+
+
+def _read_active(profile_dir: str) -> Dict[str, Dict]:
+    try:
+        with open(_active_path(profile_dir), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _update_active(profile_dir: str, update) -> Dict[str, Dict]:
+    """Read-modify-write active.json under an exclusive lock."""
+    os.makedirs(profile_dir, exist_ok=True)
+    with open(_active_path(profile_dir) + '.lock', 'w') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        sessions = _read_active(profile_dir)
+        update(sessions)
+        now = time.time()
+        sessions = {sid: s for sid, s in sessions.items() if s['expires_at'] > now}
+        tmp_path = f"{_active_path(profile_dir)}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(sessions, f)
+        os.replace(tmp_path, _active_path(profile_dir))
+    return sessions
+
+
+def start_session(profile_dir: str, endpoint: Optional[str], mode: str = 'cprofile',
+                  requests: Optional[int] = None, sample_rate: Optional[float] = None,
+                  duration: float = 600) -> Dict:
+    """
+    Open a profiling session.
+
+    Args:
+        profile_dir (str): PROFILE_DIR
+        endpoint (str, optional): Flask endpoint to profile (e.g. 'home_bp.analyze_ticker'); None for all
+        mode (str): 'cprofile' or 'sample'
+        requests (int, optional): Profile the next N matching requests (per worker)
+        sample_rate (float, optional): Profile this fraction (0-1] of matching requests
+        duration (float): Seconds until the session expires
+
+    Returns:
+        dict: The session, including its 'id'
+
+    Raises:
+        ValueError: On an unknown mode or when neither/both of requests and sample_rate are given
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"mode must be one of {', '.join(PROFILE_MODES)}")
+    if (requests is None) == (sample_rate is None):
+        raise ValueError('give exactly one of requests or sample_rate')
+    if requests is not None and requests < 1:
+        raise ValueError('requests must be at least 1')
+    if sample_rate is not None and not 0 < sample_rate <= 1:
+        raise ValueError('sample_rate must be in (0, 1]')
+
+    session = {
+        'id': secrets.token_hex(6), 'endpoint': endpoint, 'mode': mode, 'requests': requests,
+        'sample_rate': sample_rate, 'started_at': time.time(), 'expires_at': time.time() + duration,
+    }
+    _update_active(profile_dir, lambda sessions: sessions.__setitem__(session['id'], session))
+    _reload(profile_dir, force=True)
+    return session
+
+
+def stop_session(profile_dir: str, session_id: str) -> bool:
+    """End a session early (its collected results stay downloadable). Returns False if not active."""
+    found = []
+    _update_active(profile_dir, lambda sessions: found.append(sessions.pop(session_id, None)))
+    _reload(profile_dir, force=True)
+    return found[0] is not None
+
+
+def list_sessions(profile_dir: str) -> List[Dict]:
+    """Active sessions plus sessions that only have result files left."""
+    sessions = _read_active(profile_dir)
+    result = []
+    for sid, session in sessions.items():
+        result.append(dict(session, active=True, workers=len(_result_files(profile_dir, sid))))
+    for path in glob.glob(os.path.join(profile_dir, '*.*.prof')) + glob.glob(os.path.join(profile_dir, '*.*.collapsed')):
+        sid = os.path.basename(path).split('.', 1)[0]
+        if sid not in sessions and not any(r['id'] == sid for r in result):
+            result.append({'id': sid, 'active': False, 'workers': len(_result_files(profile_dir, sid)),
+                           'mode': 'cprofile' if path.endswith('.prof') else 'sample'})
+    return result
+
+
+def _reload(profile_dir: str, force: bool = False) -> None:
+    global _sessions, _sessions_mtime, _last_check
+    now = time.monotonic()
+    if not force and now - _last_check < _poll_interval:
+        return
+    _last_check = now
+    try:
+        mtime = os.path.getmtime(_active_path(profile_dir))
+    except OSError:
+        mtime = None
+    if force or mtime != _sessions_mtime:
+        sessions = _read_active(profile_dir) if mtime is not None else {}
+        with _state_lock:
+            _sessions, _sessions_mtime = sessions, mtime
+    _prune()
+
+
+def _prune() -> None:
+    """Forget the counters and aggregates of sessions that were stopped or expired (their files stay)."""
+    now = time.time()
+    with _state_lock:
+        live = {sid for sid, session in _sessions.items() if session['expires_at'] > now}
+        for sid in [sid for sid in set(_taken) | set(_aggregates) if sid not in live]:
+            _taken.pop(sid, None)
+            _aggregates.pop(sid, None)
+
+
+def _pick_session() -> Optional[Dict]:
+    """
+    The first active session that wants the current request, counting it as taken.
+
+    Call only while holding _profile_slot, so that only requests that are
+    actually profiled count against a session's request budget.
+    """
+    now = time.time()
+    with _state_lock:
+        for sid, session in _sessions.items():
+            if session['expires_at'] <= now:
+                continue
+            if session['endpoint'] and session['endpoint'] != request.endpoint:
+                continue
+            if session['requests'] is not None:
+                if _taken[sid] >= session['requests']:
+                    continue
+            elif random.random() >= session['sample_rate']:
+                continue
+            _taken[sid] += 1
+            return session
+    return None
+
+
+def _stack_key(frame) -> str:
+    """Collapsed-stack line (outermost first) for a frame."""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(parts))
+
+
+class _StackSampler:
+    """Samples one thread's stack at a fixed interval until stopped."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[_stack_key(frame)] += 1
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+
+def _result_files(profile_dir: str, session_id: str) -> List[str]:
+    return (glob.glob(os.path.join(profile_dir, f'{session_id}.*.prof'))
+            + glob.glob(os.path.join(profile_dir, f'{session_id}.*.collapsed')))
+
+
+def _save(profile_dir: str, session: Dict, result) -> None:
+    sid = session['id']
+    base = os.path.join(profile_dir, f"{sid}.{os.getpid()}")
+    with _state_lock:
+        if sid not in _taken:
+            # הסשן הסתיים או פג בזמן הבקשה - האגרגט נמחק, ושמירה הייתה דורסת את הקובץ בבקשה בודדת
+            return
+        if session['mode'] == 'cprofile':
+            stats = _aggregates.get(sid)
+            if stats is None:
+                stats = _aggregates[sid] = pstats.Stats(result)
+            else:
+                stats.add(result)
+            stats.dump_stats(base + '.prof')
+        else:
+            counts = _aggregates.setdefault(sid, Counter())
+            counts.update(result)
+            tmp_path = base + '.collapsed.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in counts.items())
+            os.replace(tmp_path, base + '.collapsed')
+
+
+def merged_profile(profile_dir: str, session_id: str, fmt: str) -> Optional[bytes]:
+    """
+    Results of a session from every worker.
+
+    Args:
+        fmt (str): 'prof' (pstats binary), 'text' (top functions by cumulative time)
+                   or 'collapsed' (flamegraph input, sample mode only)
+
+    Returns:
+        bytes or None: None if the session has no results in that format
+    """
+    if fmt in ('prof', 'text'):
+        files = sorted(glob.glob(os.path.join(profile_dir, f'{session_id}.*.prof')))
+        if not files:
+            return None
+        stats = pstats.Stats(*files, stream=io.StringIO())
+        if fmt == 'text':
+            stats.stream = io.StringIO()
+            stats.sort_stats('cumulative').print_stats(60)
+            return stats.stream.getvalue().encode('utf-8')
+        buffer_path = os.path.join(profile_dir, f'.{session_id}.{os.getpid()}.merged')
+        stats.dump_stats(buffer_path)
+        try:
+            with open(buffer_path, 'rb') as f:
+                return f.read()
+        finally:
+            os.remove(buffer_path)
+
+    files = sorted(glob.glob(os.path.join(profile_dir, f'{session_id}.*.collapsed')))
+    if not files:
+        return None
+    counts: Counter = Counter()
+    for path in files:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack and count.isdigit():
+                    counts[stack] += int(count)
+    return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common()).encode('utf-8')
+
+
+def init_profiling(app: Flask) -> None:
+    """Register the request hooks that start and finish profiling for sampled requests."""
+    global _poll_interval
+    if not app.config.get('PROFILE_DIR'):
+        return
+    _poll_interval = app.config.get('PROFILE_POLL_INTERVAL', 1.0)
+    sample_interval = app.config.get('PROFILE_SAMPLE_INTERVAL', 0.005)
+
+    @app.before_request
+    def _maybe_start_profiling():
+        _reload(app.config['PROFILE_DIR'])
+        if not _sessions:
+            return
+        # קודם המקום, אחר כך הספירה - בקשה שלא קיבלה מקום לא נספרת במכסת הסשן
+        if not _profile_slot.acquire(blocking=False):
+            return
+        session = _pick_session()
+        if session is None:
+            _profile_slot.release()
+            return
+        g._profile_session = session
+        if session['mode'] == 'cprofile':
+            profiler = cProfile.Profile()
+            g._profiler = profiler
+            profiler.enable()
+        else:
+            g._profiler = _StackSampler(threading.get_ident(), sample_interval)
+
+    @app.teardown_request
+    def _finish_profiling(_error=None):
+        session = g.pop('_profile_session', None)
+        if session is None:
+            return
+        profiler = g.pop('_profiler')
+        try:
+            if session['mode'] == 'cprofile':
+                profiler.disable()
+                _save(app.config['PROFILE_DIR'], session, profiler)
+            else:
+                _save(app.config['PROFILE_DIR'], session, profiler.stop())
+        except Exception as e:
+            app.logger.error(f"Saving profile for session {session['id']} failed: {str(e)}")
+        finally:
+            _profile_slot.release()
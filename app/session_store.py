@@ -0,0 +1,176 @@
+# app/session_store.py
+"""
+Server-side session storage in a local SQLite database.
+
+The session cookie carries only a random session ID; the session contents
+(selected ticker, company name and info, Flask-Login state) live in SQLite
+and are serialized with Flask's own tagged JSON serializer. Rows are only
+rewritten when the session was modified, and expired rows are purged
+periodically. regenerate_session() moves the session to a fresh ID on
+login and logout, so an ID planted or seen before cannot be reused.
+"""
+
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from flask import current_app, session as flask_session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from typing import Optional
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """
+    Session dict that tracks modification and remembers its session ID.
+
+    Args:
+        initial (dict, optional): Stored session contents
+        sid (str): Session ID sent in the cookie
+        new (bool): True if the session was just created
+    """
+
+    def __init__(self, initial: Optional[dict] = None, sid: str = '', new: bool = False):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.stored_expires: Optional[float] = None  # expiry of the stored row when loaded
+
+
+class SqliteSessionInterface(SessionInterface):
+    """
+    Flask session interface storing sessions in SQLite.
+
+    Args:
+        path (str): Database file path (created if missing)
+        cleanup_interval (int): Minimum seconds between purges of expired rows
+        touch_interval (int): Minimum seconds between expiry refreshes of an unmodified session
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, path: str, cleanup_interval: int = 600, touch_interval: int = 60):
+        self.path = path
+        self.cleanup_interval = cleanup_interval
+        self.touch_interval = touch_interval
+        self._local = threading.local()
+        self._last_cleanup = 0.0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                'id TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)')
+
+    def _connect(self) -> sqlite3.Connection:
+        # חיבור אחד לכל thread - חיבורי sqlite3 אינם משותפים בין threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _generate_sid() -> str:
+        return secrets.token_urlsafe(32)
+
+    def regenerate(self, session: ServerSideSession) -> None:
+        """
+        Move a session to a new session ID, keeping its contents.
+
+        The old row is deleted right away; the new ID is stored and sent in
+        the cookie when the response is saved.
+        """
+        with self._connect() as conn:
+            conn.execute('DELETE FROM sessions WHERE id = ?', (session.sid,))
+        session.sid = self._generate_sid()
+        session.modified = True
+
+    def open_session(self, app, request) -> ServerSideSession:
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            row = self._connect().execute(
+                'SELECT data, expires FROM sessions WHERE id = ? AND expires > ?', (sid, time.time())
+            ).fetchone()
+            if row is not None:
+                try:
+                    session = ServerSideSession(self.serializer.loads(row[0]), sid=sid)
+                except ValueError:
+                    app.logger.warning('Discarding unreadable server-side session.')
+                else:
+                    session.stored_expires = row[1]
+                    return session
+        return ServerSideSession(sid=self._generate_sid(), new=True)
+
+    def save_session(self, app, session: ServerSideSession, response) -> None:
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified:
+                with self._connect() as conn:
+                    conn.execute('DELETE FROM sessions WHERE id = ?', (session.sid,))
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not self.should_set_cookie(app, session):
+            return
+
+        expires_at = time.time() + app.permanent_session_lifetime.total_seconds()
+        if session.modified or session.stored_expires is None:
+            with self._connect() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO sessions (id, data, expires) VALUES (?, ?, ?)',
+                    (session.sid, self.serializer.dumps(dict(session)), expires_at),
+                )
+            self._maybe_cleanup()
+        elif expires_at - session.stored_expires >= self.touch_interval:
+            # SESSION_REFRESH_EACH_REQUEST - רק מאריכים את התוקף, בלי לכתוב שוב את כל התוכן
+            with self._connect() as conn:
+                conn.execute('UPDATE sessions SET expires = ? WHERE id = ?', (expires_at, session.sid))
+
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def _maybe_cleanup(self) -> None:
+        now = time.time()
+        if now - self._last_cleanup < self.cleanup_interval:
+            return
+        self._last_cleanup = now
+        with self._connect() as conn:
+            conn.execute('DELETE FROM sessions WHERE expires <= ?', (now,))
+
+    def count(self) -> int:
+        """Number of stored (unexpired) sessions."""
+        return self._connect().execute(
+            'SELECT COUNT(*) FROM sessions WHERE expires > ?', (time.time(),)
+        ).fetchone()[0]
+
+
+def regenerate_session() -> None:
+    """Give the current request's session a new ID (no-op for cookie-based sessions)."""
+    regenerate = getattr(current_app.session_interface, 'regenerate', None)
+    if regenerate is not None:
+        regenerate(flask_session._get_current_object())
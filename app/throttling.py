@@ -0,0 +1,128 @@
+# app/throttling.py
+"""
+Throttling and load shedding for the expensive endpoints.
+
+Rate limits come from Flask-Limiter: every throttled endpoint gets a
+per-user limit plus a share of one global limit, both read from config on
+each request. Separately, cold analyses (tickers whose price history is not
+cached and must come from yfinance) are capped per process; when the cap is
+reached the request waits briefly and is then answered with a 503 and
+Retry-After instead of queuing indefinitely. Requests that time out waiting
+for the upstream rate limiter are shed the same way.
+"""
+
+from contextlib import contextmanager, nullcontext
+import threading
+from flask import Response, current_app
+from werkzeug.exceptions import ServiceUnavailable
+from typing import Callable, Optional
+
+from app import limiter
+
+
+def _config_limit(key: str):
+    """Limit value callable so limits can be changed in config without re-registering routes."""
+    return lambda: current_app.config[key]
+
+
+def _global_key() -> str:
+    return 'global'
+
+
+def throttled(user_limit_key: str, deduct_when: Optional[Callable[[Response], bool]] = None):
+    """
+    Apply the per-user limit named by user_limit_key and the shared global limit.
+
+    Args:
+        user_limit_key (str): Config key holding the per-user limit string
+        deduct_when (callable, optional): Only count responses for which this returns True
+                                          (e.g. to let 304 revalidations through for free)
+    """
+    def decorator(view):
+        view = limiter.limit(_config_limit(user_limit_key), deduct_when=deduct_when)(view)
+        return limiter.shared_limit(_config_limit('HEAVY_GLOBAL_RATE_LIMIT'), scope='heavy-global',
+                                    key_func=_global_key, deduct_when=deduct_when)(view)
+    return decorator
+
+
+class ConcurrencyGate:
+    """
+    Cap on concurrent executions of an expensive section, with counters.
+
+    Args:
+        limit (int): Maximum executions in flight
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, int(limit))
+        self._semaphore = threading.BoundedSemaphore(self.limit)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    @contextmanager
+    def slot(self, wait: float = 0.0, retry_after: int = 10):
+        """
+        Hold a slot for the duration of the block.
+
+        Raises:
+            ServiceUnavailable: If no slot became free within wait seconds
+        """
+        acquired = self._semaphore.acquire(timeout=wait) if wait > 0 else self._semaphore.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                self.rejected += 1
+            raise ServiceUnavailable(description=f"{self.limit} analyses already in flight", retry_after=retry_after)
+        with self._lock:
+            self.in_flight += 1
+            self.admitted += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'limit': self.limit, 'in_flight': self.in_flight,
+                    'admitted': self.admitted, 'rejected': self.rejected}
+
+
+_cold_analysis_gate: Optional[ConcurrencyGate] = None
+_gate_lock = threading.Lock()
+
+
+def get_cold_analysis_gate() -> ConcurrencyGate:
+    """Process-wide gate for cold analyses, sized by ANALYZE_MAX_COLD_INFLIGHT."""
+    global _cold_analysis_gate
+    if _cold_analysis_gate is None:
+        with _gate_lock:
+            if _cold_analysis_gate is None:
+                _cold_analysis_gate = ConcurrencyGate(current_app.config.get('ANALYZE_MAX_COLD_INFLIGHT', 4))
+    return _cold_analysis_gate
+
+
+def cold_analysis_slot(is_cold: bool):
+    """
+    Context manager that takes a cold-analysis slot, or does nothing for cached tickers.
+
+    Raises:
+        ServiceUnavailable: When the process is already running its maximum of cold analyses
+    """
+    if not is_cold:
+        return nullcontext()
+    return get_cold_analysis_gate().slot(wait=current_app.config.get('ANALYZE_COLD_WAIT', 2),
+                                         retry_after=current_app.config.get('ANALYZE_RETRY_AFTER', 10))
+
+
+def shed_upstream_throttling(error: Exception) -> ServiceUnavailable:
+    """
+    503 with Retry-After for a request whose upstream call timed out in the rate limiter queue.
+
+    Args:
+        error (Exception): The UpstreamRateLimitExceeded that was raised
+    """
+    return ServiceUnavailable(description=f"upstream throttled: {error}",
+                              retry_after=current_app.config.get('ANALYZE_RETRY_AFTER', 10))
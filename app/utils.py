@@ -129,22 +129,29 @@ def truncate_text(text: str, max_length: int = 100, suffix: str = "...") -> str:
 
 def log_user_action(action: str, details: str = "", user_id: Optional[int] = None) -> None:
     """
-    Log user actions with consistent formatting.
+    Record a user action in the audit log.
+    
+    The event is queued and written in a batch by the audit writer thread,
+    so this never waits on disk. Inside a request the client IP is stored
+    with it, and the acting user defaults to the logged-in user.
     
     Args:
         action (str): Action performed (e.g., "login", "analyze_stock")
         details (str): Additional details about the action
         user_id (int, optional): User ID performing the action
     """
-    log_message = f"USER_ACTION: {action}"
-    
-    if user_id:
-        log_message += f" (User ID: {user_id})"
+    from app.audit import get_audit_log
+    from flask import has_request_context
     
-    if details:
-        log_message += f" - {details}"
+    ip = None
+    if has_request_context():
+        from flask_login import current_user
+        ip = get_client_ip()
+        if user_id is None and current_user and current_user.is_authenticated:
+            user_id = current_user.id
     
-    current_app.logger.info(log_message)
+    if not get_audit_log().record(action, details, user_id=user_id, ip=ip):
+        current_app.logger.warning(f"Audit buffer full, dropped USER_ACTION: {action} (User ID: {user_id})")
 
 
 def safe_get_nested_dict(data: dict, keys: list, default=None):
@@ -210,6 +217,20 @@ def get_client_ip() -> str:
         return request.remote_addr or 'Unknown'
 
 
+def rate_limit_key() -> str:
+    """
+    Key for per-user rate limits: the logged-in user, or the client IP for anonymous requests.
+    
+    Returns:
+        str: 'user:<id>' or 'ip:<address>'
+    """
+    from flask_login import current_user
+    
+    if current_user and current_user.is_authenticated:
+        return f"user:{current_user.id}"
+    return f"ip:{get_client_ip()}"
+
+
 def is_market_hours() -> bool:
     """
     Check if current time is during market hours (US Eastern Time).
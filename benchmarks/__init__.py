@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+"""Offline benchmarks for the data and chart hot paths (run: python -m benchmarks.run)."""
@@ -0,0 +1,71 @@
+# benchmarks/fixtures.py
+"""
+Synthetic OHLCV price histories shaped like yfinance output.
+
+Prices follow a seeded geometric random walk, so every run (and every
+commit) benchmarks exactly the same data. Daily bars are on business days;
+intraday bars cover the regular session (09:30-16:00 New York) only.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, Tuple
+
+# name -> (interval, years)
+DATASETS: Dict[str, Tuple[str, int]] = {
+    '1d_1y': ('1d', 1),
+    '1d_5y': ('1d', 5),
+    '1d_10y': ('1d', 10),
+    '1d_30y': ('1d', 30),
+    '1h_1y': ('1h', 1),
+    '5m_1y': ('5m', 1),
+}
+
+QUICK_DATASETS = ('1d_1y', '1d_10y', '1h_1y')
+
+_INTRADAY_FREQ = {'1h': '60min', '5m': '5min'}
+_END = pd.Timestamp('2025-01-02')  # קבוע - אותם נתונים בכל הרצה
+
+
+def _index(interval: str, years: int) -> pd.DatetimeIndex:
+    days = pd.bdate_range(end=_END - pd.Timedelta(days=1), periods=252 * years)
+    if interval != '1d':
+        bars = pd.timedelta_range('9h30min', '15h59min', freq=_INTRADAY_FREQ[interval])
+        days = pd.DatetimeIndex((days.values[:, None] + bars.values[None, :]).ravel())
+    return days.tz_localize('America/New_York')
+
+
+def make_ohlcv(interval: str = '1d', years: int = 10, seed: int = 42, start_price: float = 100.0) -> pd.DataFrame:
+    """
+    Build a price history with Open/High/Low/Close/Volume/Dividends/Stock Splits columns.
+
+    Args:
+        interval (str): '1d', '1h' or '5m'
+        years (int): Length of the history in trading years (252 days each)
+        seed (int): Random seed
+        start_price (float): First open
+
+    Returns:
+        pd.DataFrame: OHLCV frame on a tz-aware DatetimeIndex
+    """
+    index = _index(interval, years)
+    rng = np.random.default_rng(seed)
+    n = len(index)
+    volatility = 0.02 if interval == '1d' else 0.02 / np.sqrt(len(index) / (252 * years))
+    close = start_price * np.exp(np.cumsum(rng.normal(0.0003, volatility, n)))
+    open_ = np.concatenate(([start_price], close[:-1])) * (1 + rng.normal(0, volatility / 4, n))
+    spread = np.abs(rng.normal(0, volatility, n)) * close
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) + spread,
+        'Low': np.minimum(open_, close) - spread,
+        'Close': close,
+        'Volume': rng.integers(100_000, 10_000_000, n),
+        'Dividends': 0.0,
+        'Stock Splits': 0.0,
+    }, index=index)
+
+
+def load_dataset(name: str) -> pd.DataFrame:
+    interval, years = DATASETS[name]
+    return make_ohlcv(interval, years)
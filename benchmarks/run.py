@@ -0,0 +1,216 @@
+# benchmarks/run.py
+"""
+Benchmark runner for the data and chart hot paths.
+
+Times resample_ohlc, create_candlestick_chart, create_all_candlestick_charts,
+calculate_moving_average and the /analyze route end to end (page plus chart
+bundle, cold and warm payload cache) on the synthetic histories in
+benchmarks/fixtures.py. Upstream calls are replaced by a fake provider that
+serves those histories, so the numbers measure our code only.
+
+Usage:
+    python -m benchmarks.run                          # all benchmarks -> benchmarks/results/<commit>.json
+    python -m benchmarks.run --quick -k resample      # fewer datasets and runs, only matching names
+    python -m benchmarks.run --compare benchmarks/results/<old>.json
+
+Each result records per-call min/median/mean/stdev over --repeat runs; the
+loop count of a run is picked (as timeit does) so a run lasts at least
+--min-time seconds. Compare medians across commits on the same machine.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from unittest.mock import patch
+
+from benchmarks.fixtures import DATASETS, QUICK_DATASETS, load_dataset
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+ANALYZE_DATASETS = ('1d_10y', '1d_30y')
+MA_WINDOW = 50
+
+# (name, params, callable)
+Case = Tuple[str, Dict, Callable[[], object]]
+
+
+@contextmanager
+def fake_provider(datasets: Dict[str, object]) -> Iterator[None]:
+    """Serve price histories and company metadata for tickers named after datasets (see _ticker)."""
+    by_ticker = {_ticker(name): df for name, df in datasets.items()}
+    with patch('modules.routes.home.is_price_data_cached', return_value=True), \
+         patch('modules.routes.home.get_price_history', side_effect=lambda ticker, **_: by_ticker[ticker]), \
+         patch('modules.routes.home.get_company_name', side_effect=lambda ticker: f'{ticker} Corp'), \
+         patch('modules.routes.home.get_company_info', return_value={'description': 'Synthetic benchmark company.'}):
+        yield
+
+
+def _ticker(dataset: str) -> str:
+    return dataset.replace('_', '-').upper()  # '1d_10y' -> '1D-10Y' (קו תחתון אינו חוקי בטיקר)
+
+
+def _build_cases(app, frames: Dict[str, object]) -> List[Case]:
+    from app.utils import calculate_moving_average
+    from modules.chart_creator import create_all_candlestick_charts, create_candlestick_chart, resample_ohlc
+    from modules import payload_cache
+
+    cases: List[Case] = []
+    for name, df in frames.items():
+        params = {'dataset': name, 'rows': len(df)}
+        for rule in ('W-FRI', 'ME'):
+            cases.append(('resample_ohlc', dict(params, rule=rule), lambda df=df, rule=rule: resample_ohlc(df, rule)))
+        cases.append(('create_candlestick_chart', dict(params, add_ma=True, display_years=2),
+                      lambda df=df: create_candlestick_chart(df, 'Benchmark', add_ma=True, display_years=2)))
+        closes = df['Close'].tolist()
+        cases.append(('calculate_moving_average', dict(params, window=MA_WINDOW),
+                      lambda closes=closes: calculate_moving_average(closes, MA_WINDOW)))
+        if DATASETS[name][0] == '1d':
+            cases.append(('create_all_candlestick_charts', params,
+                          lambda df=df: create_all_candlestick_charts(df, 'BENCH', 'Benchmark Corp')))
+
+    client = app.test_client()
+
+    def analyze(ticker: str, cold: bool):
+        if cold:
+            payload_cache.payload_cache.clear()
+        page = client.get(f'/analyze/{ticker}')
+        charts = client.get(f'/analyze/{ticker}/charts.json', headers={'Accept-Encoding': 'gzip'})
+        assert page.status_code == 200 and charts.status_code == 200, (page.status_code, charts.status_code)
+
+    for name in frames:
+        if name in ANALYZE_DATASETS:
+            for cold in (True, False):
+                cases.append(('analyze_route', {'dataset': name, 'rows': len(frames[name]),
+                                                'payload_cache': 'cold' if cold else 'warm'},
+                              lambda ticker=_ticker(name), cold=cold: analyze(ticker, cold)))
+    return cases
+
+
+def time_case(func: Callable[[], object], repeat: int, min_time: float) -> Dict:
+    """Per-call timings of func in seconds over repeat runs of an auto-ranged loop count."""
+    timer = timeit.Timer(func)
+    func()  # חימום: ייבוא עצלן, קאשים של pandas/plotly
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    per_call = [total / number for total in timer.repeat(repeat=repeat, number=number)]
+    return {
+        'runs': repeat,
+        'loops': number,
+        'min_s': min(per_call),
+        'median_s': statistics.median(per_call),
+        'mean_s': statistics.fmean(per_call),
+        'stdev_s': statistics.stdev(per_call) if len(per_call) > 1 else 0.0,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(RESULTS_DIR)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _environment() -> Dict:
+    import numpy
+    import pandas
+    import plotly
+    return {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pandas': pandas.__version__,
+        'numpy': numpy.__version__,
+        'plotly': plotly.__version__,
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def _make_app():
+    from flask.logging import default_handler
+    from app import create_app
+    app = create_app('testing')
+    app.config.update(LOGIN_DISABLED=True, ANALYZE_RATE_LIMIT='1000000 per minute')
+    # רק הלוג דרך התור, כמו ב-production - הדפסה ל-stderr הייתה נמדדת ומציפה את הפלט
+    app.logger.removeHandler(default_handler)
+    return app
+
+
+def run(names: List[str], pattern: Optional[str] = None, repeat: int = 5, min_time: float = 0.2) -> Dict:
+    """
+    Run the benchmarks on the given datasets.
+
+    Returns:
+        dict: {'environment': {...}, 'results': [{'name', 'params', 'runs', 'loops', 'min_s', ...}]}
+    """
+    app = _make_app()
+    results = []
+    frames = {name: load_dataset(name) for name in names}
+    with fake_provider(frames):
+        for name, params, func in _build_cases(app, frames):
+            if pattern and pattern not in name:
+                continue
+            # פונקציות הגרפים צריכות current_app; בקשות דרך test_client פותחות הקשר משלהן
+            with app.app_context() if name != 'analyze_route' else nullcontext():
+                timings = time_case(func, repeat, min_time)
+            results.append(dict({'name': name, 'params': params}, **timings))
+            print(f"{name:<30} {json.dumps(params, sort_keys=True):<70} {timings['median_s'] * 1000:10.3f} ms",
+                  file=sys.stderr)
+    return {'environment': dict(_environment(), repeat=repeat, min_time=min_time, datasets=names), 'results': results}
+
+
+def _key(result: Dict) -> str:
+    return f"{result['name']} {json.dumps(result['params'], sort_keys=True)}"
+
+
+def compare(baseline: Dict, current: Dict) -> List[Dict]:
+    """Median ratio (current / baseline) for every benchmark present in both runs."""
+    old = {_key(result): result for result in baseline['results']}
+    rows = []
+    for result in current['results']:
+        before = old.get(_key(result))
+        if before is None:
+            continue
+        rows.append({'benchmark': _key(result), 'baseline_median_s': before['median_s'],
+                     'median_s': result['median_s'], 'ratio': result['median_s'] / before['median_s']})
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--quick', action='store_true', help=f"only {', '.join(QUICK_DATASETS)}, 3 runs")
+    parser.add_argument('-k', dest='pattern', help='only benchmarks whose name contains this')
+    parser.add_argument('--dataset', action='append', choices=sorted(DATASETS), help='dataset(s) to use')
+    parser.add_argument('--repeat', type=int, help='runs per benchmark (default 5, 3 with --quick)')
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimum seconds per run')
+    parser.add_argument('--output', help='result JSON path (default benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', help='earlier result JSON to compare medians with')
+    args = parser.parse_args(argv)
+
+    names = args.dataset or list(QUICK_DATASETS if args.quick else DATASETS)
+    report = run(names, args.pattern, args.repeat or (3 if args.quick else 5), args.min_time)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            report['comparison'] = {'baseline': f.name, 'rows': compare(json.load(f), report)}
+        for row in report['comparison']['rows']:
+            print(f"{row['benchmark']:<100} x{row['ratio']:.2f}", file=sys.stderr)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['environment']['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
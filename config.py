@@ -28,22 +28,124 @@ class Config:
     SESSION_COOKIE_SAMESITE = 'Lax'
     PERMANENT_SESSION_LIFETIME = 3600  # 1 hour
     
+    # Server-side session store (the cookie holds only the session ID)
+    SESSION_STORE_PATH = os.environ.get('SESSION_STORE_PATH', 'data/sessions.sqlite3')
+    SESSION_CLEANUP_INTERVAL = 600  # seconds between purges of expired sessions
+    SESSION_TOUCH_INTERVAL = 60  # unmodified sessions get their expiry refreshed at most this often
+    
     # CSRF protection
     WTF_CSRF_ENABLED = True
     
     # File paths
-    USERS_FILE = 'users.json'
+    USERS_FILE = 'users.json'  # JSON backend, and the seed for a new SQLite user database
+    USER_STORE_BACKEND = 'sqlite'  # 'sqlite' or 'json'
+    USERS_DB_FILE = os.environ.get('USERS_DB_FILE', 'data/users.sqlite3')
+    ADMIN_USERS_PER_PAGE = 50
     LOG_DIRECTORY = 'logs'
     LOG_FILE = 'logs/data_analyzer.log'
     
     # Logging configuration
     LOG_MAX_BYTES = 10240000  # 10MB
     LOG_BACKUP_COUNT = 10
+    LOG_SINGLE_WRITER = True  # one process per host owns the log file; others send records over a Unix socket
+    LOG_WRITER_SOCKET = os.environ.get('LOG_WRITER_SOCKET')  # default: '<LOG_FILE>.sock'
+    SERVER_TIMING_ENABLED = True  # Server-Timing header + REQUEST_TIMING log line per request
+    SLOW_REQUEST_THRESHOLD_MS = 1000  # requests above this are listed on the admin panel and the slow log
+    SLOW_REQUEST_LOG_FILE = os.environ.get('SLOW_REQUEST_LOG_FILE', 'logs/slow_requests.log')
+    SLOW_REQUEST_STACK_INTERVAL_MS = 250  # watchdog stack sampling period for requests over the threshold
+    SLOW_REQUEST_MAX_STACKS = 5  # stack samples kept per slow request
+    
+    # Prometheus /metrics: every worker writes its counters to METRICS_DIR, the endpoint sums them
+    METRICS_DIR = os.environ.get('METRICS_DIR', 'data/metrics')
+    METRICS_FLUSH_INTERVAL = 10  # seconds
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # when set, /metrics requires 'Authorization: Bearer <token>'
+    
+    # Audit log of user actions (append-only SQLite, written in batches off the request path)
+    AUDIT_DB_FILE = os.environ.get('AUDIT_DB_FILE', 'data/audit.sqlite3')
+    AUDIT_BATCH_SIZE = 200
+    AUDIT_FLUSH_INTERVAL = 1.0  # seconds an event may wait in the buffer
+    AUDIT_MAX_BUFFER = 10000  # events held in memory before new ones are dropped
+    AUDIT_QUERY_MAX_LIMIT = 500
+    
+    # On-demand request profiling started from the admin API (results under PROFILE_DIR)
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', 'data/profiles')
+    PROFILE_POLL_INTERVAL = 1.0  # seconds between checks for new profiling sessions
+    PROFILE_SAMPLE_INTERVAL = 0.005  # stack sampling period in 'sample' mode
+    PROFILE_MAX_DURATION = 3600  # longest session an admin can open, in seconds
+    MEMORY_TRACE_FRAMES = 25  # tracemalloc traceback depth (enough to reach our code from pandas/plotly)
+    MEMORY_MAX_SNAPSHOTS = 5  # snapshots kept per worker; the oldest is dropped
+    MEMORY_SNAPSHOT_DIR = os.environ.get('MEMORY_SNAPSHOT_DIR', 'data/memory_snapshots')  # every worker's snapshots
     
     # Cache settings (TTL in seconds)
     PRICE_DATA_CACHE_TTL = 43000  # 12 hours
+    PRICE_DATA_CACHE_MAXSIZE = 300  # entries per worker; room for the prewarm list (universe + CACHE_PREWARM_MAX_TICKERS) and live traffic
     COMPANY_INFO_CACHE_TTL = 3600  # 1 hour
     CACHE_MAX_SIZE = 200
+    CACHE_COMMAND_LOG = os.environ.get('CACHE_COMMAND_LOG', 'data/cache_commands.jsonl')  # admin evictions shared by workers
+    CACHE_COMMAND_POLL_INTERVAL = 1.0  # seconds between checks for new cache commands
+    CACHE_PREWARM_MAX_TICKERS = 100
+    
+    # Response compression (Flask-Compress). Cached payloads are stored pre-compressed
+    # and skip this step (see modules/payload_cache.py)
+    COMPRESS_ALGORITHM = ['br', 'gzip']
+    COMPRESS_MIMETYPES = ['text/html', 'text/css', 'text/javascript', 'application/javascript', 'application/json']
+    COMPRESS_LEVEL = 6  # gzip
+    COMPRESS_BR_LEVEL = 4
+    COMPRESS_MIN_SIZE = 500
+    
+    # Shared upstream HTTP session (yfinance, translator)
+    HTTP_POOL_MAXCONNECTS = 20  # cached connections per curl handle (one handle per thread)
+    HTTP_TIMEOUT = 15  # seconds
+    HTTP_KEEPALIVE_IDLE = 60  # seconds before TCP keep-alive probes start
+    HTTP_KEEPALIVE_INTERVAL = 30
+    
+    # Upstream rate limiting: name -> (sustained calls per second, burst)
+    UPSTREAM_RATE_LIMITS = {
+        'yfinance': (5.0, 20),
+        'translator': (1.0, 3),
+    }
+    UPSTREAM_QUEUE_TIMEOUT = 30  # seconds a caller may wait for an upstream slot
+    
+    # Request throttling (Flask-Limiter); limits use the limits-library syntax
+    RATELIMIT_STORAGE_URI = os.environ.get('RATELIMIT_STORAGE_URI', 'memory://')  # redis://... to share across workers
+    RATELIMIT_HEADERS_ENABLED = True
+    ANALYZE_RATE_LIMIT = '20 per minute;200 per hour'  # per user
+    CHART_RATE_LIMIT = '30 per minute'  # per user: compare, correlation and DCF pages
+    HEAVY_GLOBAL_RATE_LIMIT = '300 per minute'  # all users together, across the endpoints above
+    
+    # Analysis page HTTP caching
+    ANALYZE_PAGE_MAX_AGE = 60  # seconds browsers may reuse an analysis page before revalidating
+    
+    # Load shedding for cold (uncached) analyses, per process
+    ANALYZE_MAX_COLD_INFLIGHT = 4
+    ANALYZE_COLD_WAIT = 2  # seconds to wait for a free slot before answering 503
+    ANALYZE_RETRY_AFTER = 10  # Retry-After sent with the 503
+    
+    # Password hashing pool (per process). The method is the full werkzeug spec;
+    # stored hashes made with other parameters are upgraded on the next login
+    PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+    PASSWORD_HASH_MAX_CONCURRENCY = 2
+    PASSWORD_HASH_QUEUE_TIMEOUT = 5  # seconds a login may wait for a hashing slot
+    
+    # Batch price prefetching
+    PREFETCH_GROUP_SIZE = 50
+    PREFETCH_MAX_WORKERS = 8
+    PREWARM_UNIVERSE_ON_STARTUP = False  # prefetch VALUATION_UNIVERSE price history at startup
+    
+    # Multi-ticker comparison
+    COMPARE_MAX_TICKERS = 10
+    COMPARE_MAX_WORKERS = 8
+    CORRELATION_MAX_TICKERS = 100
+    CORRELATION_DEFAULT_BENCHMARK = '^GSPC'
+    
+    # Relative valuation (multiples) snapshot
+    VALUATION_UNIVERSE = [
+        'AAPL', 'MSFT', 'GOOGL', 'AMZN', 'META', 'NVDA', 'TSLA', 'JPM', 'BAC', 'WFC',
+        'JNJ', 'PFE', 'MRK', 'UNH', 'XOM', 'CVX', 'KO', 'PEP', 'WMT', 'HD',
+    ]
+    MULTIPLES_SNAPSHOT_FILE = 'data/multiples_snapshot.pkl'
+    MULTIPLES_REFRESH_INTERVAL = 6 * 3600  # seconds; 0 disables the background refresher
+    MULTIPLES_RETRY_BACKOFF = 60  # seconds before retrying a refresh that skipped throttled tickers
     
     # Admin credentials (should be overridden in environment-specific configs)
     ADMIN_USERNAME = 'admin'
@@ -117,8 +219,30 @@ class TestingConfig(Config):
     
     # Use in-memory or temporary files for testing
     USERS_FILE = 'test_users.json'
+    USERS_DB_FILE = 'test_data/users.sqlite3'
     LOG_DIRECTORY = 'test_logs'
     LOG_FILE = 'test_logs/data_analyzer.log'
+    SLOW_REQUEST_LOG_FILE = 'test_logs/slow_requests.log'
+    SLOW_REQUEST_STACK_INTERVAL_MS = 50
+    MULTIPLES_SNAPSHOT_FILE = 'test_data/multiples_snapshot.pkl'
+    SESSION_STORE_PATH = 'test_data/sessions.sqlite3'
+    AUDIT_DB_FILE = 'test_data/audit.sqlite3'
+    METRICS_DIR = 'test_data/metrics'
+    CACHE_COMMAND_LOG = 'test_data/cache_commands.jsonl'
+    PROFILE_DIR = 'test_data/profiles'
+    MEMORY_SNAPSHOT_DIR = 'test_data/memory_snapshots'
+    
+    # No background jobs during tests
+    MULTIPLES_REFRESH_INTERVAL = 0
+    
+    # Upstream calls are mocked - don't throttle them
+    ANALYZE_RATE_LIMIT = '1000 per minute'
+    CHART_RATE_LIMIT = '1000 per minute'
+    HEAVY_GLOBAL_RATE_LIMIT = '10000 per minute'
+    UPSTREAM_RATE_LIMITS = {
+        'yfinance': (1000.0, 1000),
+        'translator': (1000.0, 1000),
+    }
     
     @classmethod
     def init_app(cls, app):
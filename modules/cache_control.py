@@ -0,0 +1,224 @@
+# modules/cache_control.py
+"""
+Inspect, evict and prewarm the in-process caches from the admin API.
+
+Every worker has its own copies of the caches, so evictions are broadcast
+through an append-only command log (CACHE_COMMAND_LOG, one JSON command per
+line, appended under an flock). Each worker applies commands it has not seen
+yet at the start of its next request, checking the file at most every
+CACHE_COMMAND_POLL_INTERVAL seconds; a worker starting up skips the existing
+log because its caches are still empty. The same log carries the memory
+tracing commands of app/memory_tracing.py.
+"""
+
+from fnmatch import fnmatchcase
+import json
+import os
+import threading
+import time
+from flask import Flask, current_app
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows - בלי flock; כתיבה של שורה אחת עדיין כמעט תמיד אטומית
+    fcntl = None
+
+
+def _registry() -> Dict[str, Tuple[object, object, Callable]]:
+    """cache name -> (cache, lock, key -> ticker)."""
+    from modules import price_history, payload_cache
+    first = lambda key: str(key[0]).upper()
+    return {
+        'price_data_cache': (price_history.price_data_cache, price_history.price_data_cache_lock, first),
+        'company_name_cache': (price_history.company_name_cache, price_history.company_name_cache_lock, first),
+        'company_info_cache': (price_history.company_info_cache, price_history.company_info_cache_lock, first),
+        'fundamentals_cache': (price_history.fundamentals_cache, price_history.fundamentals_cache_lock, first),
+        # מפתח ('charts', ticker) - גרפים שנבנו מנתונים פגומים נמחקים יחד איתם
+        'payload_cache': (payload_cache.payload_cache, payload_cache.payload_cache_lock, lambda key: str(key[1]).upper()),
+    }
+
+
+def value_size_bytes(value) -> int:
+    """Approximate memory held by a cached value (DataFrames and compressed payloads)."""
+    if hasattr(value, 'memory_usage'):
+        return int(value.memory_usage(deep=True).sum())
+    bodies = getattr(value, 'bodies', None)
+    if bodies is not None:
+        return sum(len(body) for body in bodies.values())
+    return 0
+
+
+def _selected(caches: Optional[Iterable[str]]) -> Dict[str, Tuple]:
+    registry = _registry()
+    if not caches:
+        return registry
+    unknown = [name for name in caches if name not in registry]
+    if unknown:
+        raise ValueError(f"Unknown cache(s): {', '.join(unknown)}")
+    return {name: registry[name] for name in caches}
+
+
+def list_entries(caches: Optional[Iterable[str]] = None) -> Dict[str, List[Dict]]:
+    """
+    Entries of each cache in this worker with age, remaining TTL and size.
+
+    Raises:
+        ValueError: If a cache name is unknown
+    """
+    result = {}
+    for name, (cache, lock, ticker_of) in _selected(caches).items():
+        rows = []
+        with lock:
+            now = cache.timer()
+            for key in list(cache.keys()):
+                inserted = cache.inserted_at(key)
+                try:
+                    value = cache.peek(key)
+                except KeyError:
+                    continue
+                rows.append({
+                    'key': [str(part) for part in key],
+                    'ticker': ticker_of(key),
+                    'age_seconds': round(now - inserted, 1) if inserted is not None else None,
+                    'ttl_remaining_seconds': round(cache.ttl - (now - inserted), 1) if inserted is not None else None,
+                    'size_bytes': value_size_bytes(value),
+                })
+        result[name] = sorted(rows, key=lambda row: row['ticker'])
+    return result
+
+
+def evict_local(pattern: str, caches: Optional[Iterable[str]] = None) -> int:
+    """
+    Remove entries whose ticker matches a glob pattern (e.g. 'AAPL', 'BRK*') from this worker.
+
+    Returns:
+        int: Number of entries removed
+    """
+    pattern = pattern.strip().upper()
+    removed = 0
+    for cache, lock, ticker_of in _selected(caches).values():
+        with lock:
+            for key in [k for k in list(cache.keys()) if fnmatchcase(ticker_of(k), pattern)]:
+                cache.pop(key, None)
+                removed += 1
+    return removed
+
+
+class CacheCommandLog:
+    """
+    Append-only log of cache commands shared by the workers on a host.
+
+    Args:
+        path (str): Log file (JSON lines)
+        poll_interval (float): Minimum seconds between checks for new commands
+    """
+
+    def __init__(self, path: str, poll_interval: float = 1.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._last_poll = 0.0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # תהליך חדש מתחיל עם קאש ריק - פקודות ישנות לא רלוונטיות לו
+        self._offset = os.path.getsize(path) if os.path.exists(path) else 0
+
+    def append(self, command: Dict) -> None:
+        line = json.dumps(dict(command, pid=os.getpid(), at=time.time())) + '\n'
+        with open(self.path, 'a', encoding='utf-8') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            f.write(line)
+            f.flush()
+
+    def read_new(self, force: bool = False) -> List[Dict]:
+        """Commands appended since the last read (rate-limited by poll_interval unless force)."""
+        now = time.monotonic()
+        if not force and now - self._last_poll < self.poll_interval:
+            return []
+        with self._lock:
+            self._last_poll = now
+            try:
+                if os.path.getsize(self.path) <= self._offset:
+                    return []
+                with open(self.path, 'rb') as f:
+                    f.seek(self._offset)
+                    data = f.read()
+            except OSError:
+                return []
+            # שורה שעדיין נכתבת (בלי \n) תיקרא בסבב הבא
+            complete = data[:data.rfind(b'\n') + 1]
+            self._offset += len(complete)
+        commands = []
+        for line in complete.splitlines():
+            try:
+                commands.append(json.loads(line))
+            except ValueError:
+                continue
+        return commands
+
+
+def _command_log() -> Optional[CacheCommandLog]:
+    return current_app.extensions.get('cache_command_log')
+
+
+def broadcast_eviction(pattern: str, caches: Optional[Iterable[str]] = None) -> int:
+    """
+    Evict matching entries here and tell every other worker to do the same.
+
+    Returns:
+        int: Entries removed in this worker
+    """
+    caches = list(caches) if caches else None
+    removed = evict_local(pattern, caches)
+    log = _command_log()
+    if log is not None:
+        log.append({'op': 'evict', 'pattern': pattern, 'caches': caches})
+    return removed
+
+
+def broadcast_prewarm(tickers: List[str]) -> None:
+    """Ask every other worker to prefetch price histories for tickers."""
+    log = _command_log()
+    if log is not None:
+        log.append({'op': 'prewarm', 'tickers': tickers})
+
+
+def apply_pending_commands(app: Flask, force: bool = False) -> int:
+    """Apply commands other workers appended since the last check. Returns the number applied."""
+    log = app.extensions.get('cache_command_log')
+    if log is None:
+        return 0
+    applied = 0
+    for command in log.read_new(force=force):
+        if command.get('pid') == os.getpid():
+            continue  # כבר בוצע בתהליך ששלח את הפקודה
+        if command.get('op') == 'evict':
+            removed = evict_local(command['pattern'], command.get('caches'))
+            app.logger.info("Applied broadcast cache eviction '%s': %d entries removed.", command['pattern'], removed)
+        elif command.get('op') == 'prewarm':
+            from modules.price_history import start_price_prewarm
+            start_price_prewarm(app, command['tickers'])
+            app.logger.info("Applied broadcast prewarm for %d tickers.", len(command['tickers']))
+        elif str(command.get('op')).startswith('memory_'):
+            # מעקב הזיכרון פר-תהליך - פקודות המנהל מופצות לכל התהליכים דרך אותו לוג
+            from app.memory_tracing import apply_command
+            apply_command(app, command)
+        else:
+            continue
+        applied += 1
+    return applied
+
+
+def init_cache_control(app: Flask) -> None:
+    """Open the shared command log and apply new commands before each request."""
+    path = app.config.get('CACHE_COMMAND_LOG')
+    if not path:
+        return
+    app.extensions['cache_command_log'] = CacheCommandLog(path, app.config.get('CACHE_COMMAND_POLL_INTERVAL', 1.0))
+
+    @app.before_request
+    def _apply_cache_commands():
+        apply_pending_commands(app)
@@ -5,14 +5,16 @@ from flask import current_app
 import plotly.express as px
 from typing import Optional, Dict, List 
 
-import json 
+import logging
+
+from modules.timing import timed
 
 
 def resample_ohlc(df: pd.DataFrame, rule: str) -> pd.DataFrame:
     """
     Resample OHLC data to a given frequency (e.g., 'W' for weekly, 'ME' for monthly).
     """
-    current_app.logger.debug(f"Resampling OHLC data with rule: {rule}. Original shape: {df.shape}")
+    current_app.logger.debug("Resampling OHLC data with rule: %s. Original shape: %s", rule, df.shape)
     ohlc_dict = {
         'Open': 'first',
         'High': 'max',
@@ -25,9 +27,10 @@ def resample_ohlc(df: pd.DataFrame, rule: str) -> pd.DataFrame:
     if 'Stock Splits' in df.columns: ohlc_dict['Stock Splits'] = 'sum'
     
     try:
-        df_resampled = df.resample(rule).apply(ohlc_dict)
-        df_resampled.dropna(how='all', inplace=True) 
-        current_app.logger.info(f"Resampled OHLC data. New shape: {df_resampled.shape}")
+        with timed('resample'):
+            df_resampled = df.resample(rule).apply(ohlc_dict)
+            df_resampled.dropna(how='all', inplace=True) 
+        current_app.logger.info("Resampled OHLC data. New shape: %s", df_resampled.shape)
         return df_resampled
     except Exception as e:
         current_app.logger.error(f"Error during OHLC resampling with rule '{rule}': {str(e)}")
@@ -36,7 +39,7 @@ def resample_ohlc(df: pd.DataFrame, rule: str) -> pd.DataFrame:
 
 
 def create_candlestick_chart(df: pd.DataFrame, chart_title: str, add_ma: bool = False, display_years: Optional[int] = None) -> Optional[str]:
-    current_app.logger.info(f"Attempting to create candlestick chart: '{chart_title}' (MA: {add_ma}, Display Years: {display_years})")
+    current_app.logger.info("Attempting to create candlestick chart: '%s' (MA: %s, Display Years: %s)", chart_title, add_ma, display_years)
     
     if df is None or df.empty:
         current_app.logger.warning(f"Cannot create chart '{chart_title}': Input DataFrame is empty or None.")
@@ -51,7 +54,7 @@ def create_candlestick_chart(df: pd.DataFrame, chart_title: str, add_ma: bool =
             if df.empty:
                  current_app.logger.warning(f"DataFrame became empty after index conversion/dropna for chart '{chart_title}'.")
                  return None
-            current_app.logger.debug(f"Index converted to DatetimeIndex for chart '{chart_title}'.")
+            current_app.logger.debug("Index converted to DatetimeIndex for chart '%s'.", chart_title)
         except Exception as e:
             current_app.logger.error(f"Error converting or cleaning index for chart '{chart_title}': {str(e)}")
             current_app.logger.exception("Detailed traceback for index conversion error in create_candlestick_chart:")
@@ -114,7 +117,8 @@ def create_candlestick_chart(df: pd.DataFrame, chart_title: str, add_ma: bool =
             for i, window in enumerate(windows):
                 if len(df_display) >= window:
                     ma_col = f'MA{window}'
-                    df_display[ma_col] = df_display['Close'].rolling(window=window, min_periods=1).mean()
+                    with timed('indicators'):
+                        df_display[ma_col] = df_display['Close'].rolling(window=window, min_periods=1).mean()
                     figure_data.append(
                         go.Scatter(
                             x=df_display.index, 
@@ -141,22 +145,17 @@ def create_candlestick_chart(df: pd.DataFrame, chart_title: str, add_ma: bool =
             showlegend=True, legend=dict(yanchor="top", y=0.99, xanchor="left", x=0.01)
         )
         
-        chart_json = fig.to_json()
-        current_app.logger.debug(f"Chart JSON for '{chart_title}' created. Length: {len(chart_json)}")
-        
-        try:
-            json_data = json.loads(chart_json)
-            if 'data' not in json_data or not json_data['data']:
-                current_app.logger.error(f"Chart JSON for '{chart_title}' has no data array or data array is empty after creation.")
-                return None
-            if 'layout' not in json_data:
-                current_app.logger.error(f"Chart JSON for '{chart_title}' has no layout after creation.")
-                return None
-        except json.JSONDecodeError as json_e:
-            current_app.logger.error(f"Failed to decode chart_json for '{chart_title}': {str(json_e)}")
+        # בודקים את אובייקט הגרף עצמו במקום לפענח מחדש את ה-JSON שנוצר
+        if not fig.data:
+            current_app.logger.error("Chart '%s' has no traces after creation.", chart_title)
             return None
 
-        current_app.logger.info(f"Successfully created and validated JSON for chart '{chart_title}'.")
+        with timed('serialize'):
+            chart_json = fig.to_json()
+        if current_app.logger.isEnabledFor(logging.DEBUG):
+            current_app.logger.debug("Chart JSON for '%s' created. Length: %d", chart_title, len(chart_json))
+
+        current_app.logger.info("Successfully created and validated JSON for chart '%s'.", chart_title)
         return chart_json
 
     except Exception as e:
@@ -171,7 +170,7 @@ def create_all_candlestick_charts(df_daily_full: pd.DataFrame, ticker: str, comp
         'weekly_chart_json': None,
         'monthly_chart_json': None
     }
-    current_app.logger.info(f"Creating all candlestick charts for ticker: {ticker} ({company_name})")
+    current_app.logger.info("Creating all candlestick charts for ticker: %s (%s)", ticker, company_name)
 
     if df_daily_full is None or df_daily_full.empty:
         current_app.logger.warning(f"Cannot create any charts for {ticker}: Input daily DataFrame is empty or None.")
@@ -180,7 +179,7 @@ def create_all_candlestick_charts(df_daily_full: pd.DataFrame, ticker: str, comp
     charts['daily_chart_json'] = create_candlestick_chart(df_daily_full, f"{company_name} ({ticker}) - Daily Prices (Last 2 Years)", add_ma=True, display_years=2)
 
     try:
-        current_app.logger.info(f"Resampling daily data to weekly for {ticker}.")
+        current_app.logger.info("Resampling daily data to weekly for %s.", ticker)
         weekly_df = resample_ohlc(df_daily_full, 'W-FRI') 
         if weekly_df.empty:
             current_app.logger.warning(f"Weekly resampled data is empty for {ticker}.")
@@ -196,7 +195,7 @@ def create_all_candlestick_charts(df_daily_full: pd.DataFrame, ticker: str, comp
         current_app.logger.exception("Detailed traceback for weekly chart creation error:")
     
     try:
-        current_app.logger.info(f"Resampling daily data to monthly for {ticker}.")
+        current_app.logger.info("Resampling daily data to monthly for %s.", ticker)
         monthly_df = resample_ohlc(df_daily_full, 'ME') 
         if monthly_df.empty:
             current_app.logger.warning(f"Monthly resampled data is empty for {ticker}.")
@@ -260,11 +259,155 @@ def create_simple_timeseries_chart(df: pd.DataFrame, date_column: str, value_col
             yaxis=dict(gridcolor='lightgray', showgrid=True)
         )
         
-        chart_json = fig.to_json()
+        with timed('serialize'):
+            chart_json = fig.to_json()
         current_app.logger.info(f"Successfully created JSON for simple timeseries chart '{chart_title}'.")
         return chart_json
 
     except Exception as e:
         current_app.logger.error(f"Error during simple timeseries chart creation for '{chart_title}': {str(e)}")
         current_app.logger.exception("Detailed traceback for simple timeseries chart creation error:")
-        return None
\ No newline at end of file
+        return None
+
+def create_histogram_chart(counts: List[int], edges: List[float], chart_title: str, markers: Optional[Dict[str, Optional[float]]] = None) -> Optional[str]:
+    """
+    Build a bar histogram from precomputed bin counts (e.g. np.histogram output).
+
+    Args:
+        counts (list): Count per bin
+        edges (list): Bin edges, one longer than counts
+        chart_title (str): Chart title
+        markers (dict, optional): Label -> x value for vertical reference lines
+
+    Returns:
+        str or None: Plotly figure JSON, or None if the chart could not be built
+    """
+    current_app.logger.info(f"Attempting to create histogram chart. Title: '{chart_title}'")
+
+    if not counts or len(edges) != len(counts) + 1:
+        current_app.logger.warning(f"Cannot create chart '{chart_title}': counts/edges are empty or mismatched.")
+        return None
+
+    try:
+        centers = [(edges[i] + edges[i + 1]) / 2 for i in range(len(counts))]
+        widths = [edges[i + 1] - edges[i] for i in range(len(counts))]
+        fig = go.Figure(data=[go.Bar(x=centers, y=counts, width=widths, name='Scenarios', marker_color='#1f77b4')])
+
+        marker_colors = ['#d62728', '#2ca02c', '#ff7f0e', '#9467bd']
+        for i, (label, x_value) in enumerate((markers or {}).items()):
+            if x_value is None:
+                continue
+            fig.add_vline(x=x_value, line_dash='dash', line_color=marker_colors[i % len(marker_colors)],
+                          annotation_text=f"{label}: {x_value:,.2f}", annotation_position='top')
+
+        fig.update_layout(
+            title_text=chart_title, title_x=0.5,
+            xaxis_title="Value per Share", yaxis_title="Scenarios",
+            bargap=0.02,
+            margin=dict(l=50, r=50, b=50, t=80, pad=4),
+            plot_bgcolor='white', paper_bgcolor='white',
+            xaxis=dict(gridcolor='lightgray', showgrid=True),
+            yaxis=dict(gridcolor='lightgray', showgrid=True),
+            showlegend=False
+        )
+
+        with timed('serialize'):
+            chart_json = fig.to_json()
+        current_app.logger.info(f"Successfully created JSON for histogram chart '{chart_title}'.")
+        return chart_json
+
+    except Exception as e:
+        current_app.logger.error(f"Error during histogram chart creation for '{chart_title}': {str(e)}")
+        current_app.logger.exception("Detailed traceback for histogram chart creation error:")
+        return None
+
+
+def create_comparison_chart(panel: pd.DataFrame, chart_title: str, y_axis_title: str = "Rebased (start = 100)") -> Optional[str]:
+    """
+    Overlay one line per column of a dates x tickers panel.
+
+    Args:
+        panel (pd.DataFrame): Aligned values, one column per ticker
+        chart_title (str): Chart title
+        y_axis_title (str): Y axis label
+
+    Returns:
+        str or None: Plotly figure JSON, or None if the chart could not be built
+    """
+    current_app.logger.info(f"Attempting to create comparison chart. Title: '{chart_title}' ({panel.shape[1] if panel is not None else 0} series)")
+
+    if panel is None or panel.empty:
+        current_app.logger.warning(f"Cannot create chart '{chart_title}': Input panel is empty or None.")
+        return None
+
+    try:
+        fig = go.Figure(data=[
+            go.Scatter(x=panel.index, y=panel[column], mode='lines', name=str(column), line=dict(width=1.5))
+            for column in panel.columns
+        ])
+        fig.update_layout(
+            title_text=chart_title, title_x=0.5,
+            xaxis_title="Date", yaxis_title=y_axis_title,
+            margin=dict(l=50, r=50, b=50, t=80, pad=4),
+            plot_bgcolor='white', paper_bgcolor='white',
+            xaxis=dict(gridcolor='lightgray', showgrid=True, type='date'),
+            yaxis=dict(gridcolor='lightgray', showgrid=True),
+            hovermode='x unified',
+            showlegend=True, legend=dict(yanchor="top", y=0.99, xanchor="left", x=0.01)
+        )
+
+        with timed('serialize'):
+            chart_json = fig.to_json()
+        current_app.logger.info(f"Successfully created JSON for comparison chart '{chart_title}'.")
+        return chart_json
+
+    except Exception as e:
+        current_app.logger.error(f"Error during comparison chart creation for '{chart_title}': {str(e)}")
+        current_app.logger.exception("Detailed traceback for comparison chart creation error:")
+        return None
+
+
+def create_heatmap_chart(matrix: pd.DataFrame, chart_title: str, zmin: float = -1.0, zmax: float = 1.0) -> Optional[str]:
+    """
+    Render a square labelled matrix (e.g. correlations) as a heatmap.
+
+    Args:
+        matrix (pd.DataFrame): Values with matching index/columns labels
+        chart_title (str): Chart title
+        zmin, zmax (float): Color scale bounds
+
+    Returns:
+        str or None: Plotly figure JSON, or None if the chart could not be built
+    """
+    current_app.logger.info(f"Attempting to create heatmap chart. Title: '{chart_title}'")
+
+    if matrix is None or matrix.empty:
+        current_app.logger.warning(f"Cannot create chart '{chart_title}': Input matrix is empty or None.")
+        return None
+
+    try:
+        labels = [str(label) for label in matrix.columns]
+        # תוויות ערכים רק למטריצות קטנות - מעבר לזה הן לא קריאות ומנפחות את ה-JSON
+        show_text = len(labels) <= 20
+        fig = go.Figure(data=[go.Heatmap(
+            z=matrix.to_numpy(), x=labels, y=[str(label) for label in matrix.index],
+            zmin=zmin, zmax=zmax, colorscale='RdBu', reversescale=True,
+            text=matrix.round(2).to_numpy() if show_text else None,
+            texttemplate='%{text}' if show_text else None,
+        )])
+        fig.update_layout(
+            title_text=chart_title, title_x=0.5,
+            margin=dict(l=80, r=50, b=80, t=80, pad=4),
+            plot_bgcolor='white', paper_bgcolor='white',
+            yaxis=dict(autorange='reversed'),
+        )
+
+        with timed('serialize'):
+            chart_json = fig.to_json()
+        current_app.logger.info(f"Successfully created JSON for heatmap chart '{chart_title}'.")
+        return chart_json
+
+    except Exception as e:
+        current_app.logger.error(f"Error during heatmap chart creation for '{chart_title}': {str(e)}")
+        current_app.logger.exception("Detailed traceback for heatmap chart creation error:")
+        return None
@@ -0,0 +1,120 @@
+# modules/comparison.py
+"""
+Multi-ticker comparison: concurrent fetching and aligned, rebased price panels.
+
+Price histories are fetched in parallel through get_price_history (so each
+ticker still lands in the shared price cache), aligned on the trading days
+common to all of them and rebased to 100 with a single 2-D NumPy operation.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import numpy as np
+import pandas as pd
+from flask import current_app
+from typing import Dict, List, Tuple
+
+from modules.price_history import get_price_history, prefetch_price_histories
+from modules.rate_limiter import current_upstream_identity, upstream_identity
+
+
+def fetch_price_histories(tickers: List[str], period: str = "5y", interval: str = "1d") -> Dict[str, pd.DataFrame]:
+    """
+    Fetch price histories for several tickers concurrently.
+
+    Cold tickers are first downloaded together through the batch path, which
+    fills the price cache; the per-ticker fetches that follow are then cache
+    hits (or individual retries for tickers the batch could not return).
+    Must be called inside an application context; each worker thread pushes
+    its own context so the cached fetchers can log and read config.
+
+    Args:
+        tickers (list): Ticker symbols
+        period (str): yfinance period
+        interval (str): yfinance interval
+
+    Returns:
+        dict: ticker -> DataFrame (empty DataFrame when nothing was returned)
+    """
+    if not tickers:
+        return {}
+
+    if len(tickers) > 1:
+        prefetch_price_histories(tickers, period=period, interval=interval)
+
+    app = current_app._get_current_object()
+    max_workers = min(len(tickers), app.config.get('COMPARE_MAX_WORKERS', 8))
+    # ה-threads לא רואים את הבקשה - מעבירים את זהות המשתמש (ועדיפות) למגביל הקצב
+    with upstream_identity(current_upstream_identity()):
+        caller_context = contextvars.copy_context()
+
+    def _fetch(ticker: str) -> pd.DataFrame:
+        with app.app_context():
+            return caller_context.copy().run(get_price_history, ticker, period=period, interval=interval)
+
+    current_app.logger.info(f"Fetching {len(tickers)} price histories with {max_workers} workers (P:{period}, I:{interval}).")
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='compare-fetch') as executor:
+        results = executor.map(_fetch, tickers)
+        return dict(zip(tickers, results))
+
+
+def normalize_date_index(index: pd.Index) -> pd.DatetimeIndex:
+    """Drop timezone and time-of-day so tickers from different exchanges share dates."""
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.normalize()
+
+
+def align_close_panel(histories: Dict[str, pd.DataFrame], column: str = 'Close') -> pd.DataFrame:
+    """
+    Align closing prices on the trading days common to every ticker.
+
+    Args:
+        histories (dict): ticker -> price DataFrame
+        column (str): Price column to use
+
+    Returns:
+        pd.DataFrame: Dates x tickers, only rows where every ticker has a price.
+                      Tickers without data are left out.
+    """
+    series = {}
+    for ticker, df in histories.items():
+        if df is None or df.empty or column not in df.columns:
+            continue
+        prices = pd.to_numeric(df[column], errors='coerce')
+        prices.index = normalize_date_index(df.index)
+        # אם יש כמה ברים באותו יום (דאטה תוך-יומי), נשמור את האחרון
+        series[ticker] = prices[~prices.index.duplicated(keep='last')]
+
+    if not series:
+        return pd.DataFrame()
+    return pd.concat(series, axis=1, join='inner').dropna().sort_index()
+
+
+def rebase_panel(panel: np.ndarray, base: float = 100.0) -> np.ndarray:
+    """Rebase every column of a dates x tickers price matrix so its first row equals base."""
+    return panel / panel[0] * base
+
+
+def build_comparison(tickers: List[str], period: str = "5y") -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Fetch, align and rebase a set of tickers.
+
+    Args:
+        tickers (list): Ticker symbols
+        period (str): yfinance period
+
+    Returns:
+        tuple: (rebased DataFrame of dates x tickers, tickers that had no data)
+    """
+    histories = fetch_price_histories(tickers, period=period, interval="1d")
+    aligned = align_close_panel(histories)
+    missing = [t for t in tickers if t not in aligned.columns]
+    if aligned.empty:
+        return aligned, missing
+
+    rebased = pd.DataFrame(rebase_panel(aligned.to_numpy(dtype=np.float64)),
+                           index=aligned.index, columns=aligned.columns)
+    current_app.logger.info(f"Comparison panel built: {rebased.shape[0]} common days x {rebased.shape[1]} tickers.")
+    return rebased, missing
@@ -0,0 +1,169 @@
+# modules/correlation.py
+"""
+Pairwise return correlation and beta against a benchmark.
+
+Daily returns are kept per ticker in a process-wide cache that is extended
+incrementally: when get_price_history returns bars newer than the cached
+ones, only the new returns are computed and appended. The matrix itself is
+a couple of vectorized NumPy products over the aligned returns panel.
+"""
+
+from collections import OrderedDict
+import threading
+import numpy as np
+import pandas as pd
+from flask import current_app
+from typing import Dict, List, Optional
+
+from modules.comparison import fetch_price_histories, normalize_date_index
+
+RETURNS_PERIOD = "5y"
+
+
+class ReturnsPanelCache:
+    """
+    LRU store of daily simple returns per ticker, updated incrementally.
+
+    Each entry keeps the return series plus the last close it was computed
+    from, so appending new bars only needs the closes after that date.
+    """
+
+    def __init__(self, maxsize: int = 500):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def update(self, ticker: str, closes: pd.Series) -> pd.Series:
+        """
+        Return the daily returns for ticker, computing only what is new.
+
+        Args:
+            ticker (str): Ticker symbol
+            closes (pd.Series): Full close history (date index, ascending)
+
+        Returns:
+            pd.Series: Daily simple returns indexed by date
+        """
+        closes = closes.dropna()
+        with self._lock:
+            entry = self._entries.get(ticker)
+
+        # ההיסטוריה ניתנת להרחבה רק אם הבר האחרון שחושב עדיין קיים עם אותו מחיר
+        # (התאמות ספליט/דיבידנד משנות את ההיסטוריה לאחור ומחייבות חישוב מלא)
+        if entry is not None and entry['last_date'] in closes.index \
+                and np.isclose(closes.loc[entry['last_date']], entry['last_close']):
+            new_closes = closes[closes.index > entry['last_date']]
+            returns = entry['returns']
+            if not new_closes.empty:
+                previous = np.concatenate(([entry['last_close']], new_closes.to_numpy()[:-1]))
+                new_returns = pd.Series(new_closes.to_numpy() / previous - 1.0, index=new_closes.index)
+                returns = pd.concat([returns, new_returns])
+            # חלון התקופה זז קדימה - משמיטים תשואות שלפני תחילת ההיסטוריה הנוכחית
+            returns = returns[returns.index > closes.index[0]]
+        else:
+            returns = closes.pct_change().dropna()
+
+        if closes.empty:
+            return returns
+
+        with self._lock:
+            self._entries[ticker] = {
+                'returns': returns,
+                'last_date': closes.index[-1],
+                'last_close': float(closes.iloc[-1]),
+            }
+            self._entries.move_to_end(ticker)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return returns
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+returns_panel_cache = ReturnsPanelCache()
+
+
+def get_returns_panel(tickers: List[str], window: Optional[int] = None) -> pd.DataFrame:
+    """
+    Build an aligned dates x tickers panel of daily returns.
+
+    Args:
+        tickers (list): Ticker symbols (the benchmark included, if wanted)
+        window (int, optional): Keep only the last N common trading days
+
+    Returns:
+        pd.DataFrame: Returns on the dates common to all tickers with data
+    """
+    histories = fetch_price_histories(tickers, period=RETURNS_PERIOD, interval="1d")
+    columns = {}
+    for ticker, df in histories.items():
+        if df is None or df.empty or 'Close' not in df.columns:
+            continue
+        closes = pd.to_numeric(df['Close'], errors='coerce')
+        closes.index = normalize_date_index(df.index)
+        closes = closes[~closes.index.duplicated(keep='last')]
+        columns[ticker] = returns_panel_cache.update(ticker, closes)
+
+    if not columns:
+        return pd.DataFrame()
+    panel = pd.concat(columns, axis=1, join='inner').dropna().sort_index()
+    if window:
+        panel = panel.tail(window)
+    return panel
+
+
+def correlation_matrix(returns: np.ndarray) -> np.ndarray:
+    """
+    Pearson correlation of the columns of a (days x tickers) returns matrix.
+
+    Constant columns get NaN correlations instead of a division error.
+    """
+    centered = returns - returns.mean(axis=0)
+    std = centered.std(axis=0, ddof=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        standardized = centered / std
+        corr = standardized.T @ standardized / (returns.shape[0] - 1)
+    return np.clip(corr, -1.0, 1.0)
+
+
+def betas_against(returns: np.ndarray, benchmark_returns: np.ndarray) -> np.ndarray:
+    """Beta of every column of returns against the benchmark return vector."""
+    centered = returns - returns.mean(axis=0)
+    bench_centered = benchmark_returns - benchmark_returns.mean()
+    variance = bench_centered @ bench_centered
+    if variance == 0:
+        return np.full(returns.shape[1], np.nan)
+    return (centered.T @ bench_centered) / variance
+
+
+def compute_correlation_report(tickers: List[str], benchmark: str, window: int = 252) -> Dict:
+    """
+    Correlation matrix and betas for tickers over the last window trading days.
+
+    Returns:
+        dict: 'tickers', 'matrix' (DataFrame), 'betas' (dict), 'days',
+              'missing' (tickers without data) and 'benchmark'
+    """
+    symbols = list(dict.fromkeys(list(tickers) + [benchmark]))
+    panel = get_returns_panel(symbols, window=window)
+    missing = [t for t in symbols if t not in panel.columns]
+    report = {'tickers': [], 'matrix': pd.DataFrame(), 'betas': {}, 'days': len(panel),
+              'missing': missing, 'benchmark': benchmark}
+    available = [t for t in tickers if t in panel.columns]
+    if len(panel) < 2 or not available:
+        return report
+
+    values = panel[available].to_numpy(dtype=np.float64)
+    report['tickers'] = available
+    report['matrix'] = pd.DataFrame(correlation_matrix(values), index=available, columns=available)
+    if benchmark in panel.columns:
+        betas = betas_against(values, panel[benchmark].to_numpy(dtype=np.float64))
+        report['betas'] = dict(zip(available, betas.tolist()))
+
+    current_app.logger.info(f"Correlation report: {len(available)} tickers over {len(panel)} days (benchmark {benchmark}).")
+    return report
@@ -1,28 +1,38 @@
+import logging
 import yfinance as yf
 from flask import current_app
 import pandas as pd
+from modules.http_session import get_http_session
+from modules.rate_limiter import acquire_upstream
+from modules.metrics import observe_upstream
 
 def get_stock_data(ticker):
     """
     Fetch stock data for the given ticker.
     Returns a DataFrame with OHLC data or None if there's an error.
     """
-    current_app.logger.info(f"Fetching stock data for ticker: {ticker}")
+    current_app.logger.info("Fetching stock data for ticker: %s", ticker)
+    acquire_upstream('yfinance')
     
     try:
         # Fetch data from yfinance
         current_app.logger.info("Fetching data from yfinance...")
-        stock = yf.Ticker(ticker)
-        df = stock.history(period="5y")
+        with observe_upstream('yfinance') as call:
+            stock = yf.Ticker(ticker, session=get_http_session())
+            df = stock.history(period="5y")
+            if df is None or df.empty:
+                call.mark_failed()
         
         if df is None or df.empty:
             current_app.logger.error("No data received from yfinance")
             return None
             
-        current_app.logger.info(f"Received data from yfinance. Shape: {df.shape}")
-        current_app.logger.info(f"Data columns: {df.columns.tolist()}")
-        current_app.logger.info(f"Data types:\n{df.dtypes}")
-        current_app.logger.info(f"First few rows:\n{df.head().to_string()}")
+        current_app.logger.info("Received data from yfinance. Shape: %s", df.shape)
+        # אבחון יקר (המרת DataFrame לטקסט) - רק כשרמת DEBUG פעילה
+        if current_app.logger.isEnabledFor(logging.DEBUG):
+            current_app.logger.debug("Data columns: %s", df.columns.tolist())
+            current_app.logger.debug("Data types:\n%s", df.dtypes)
+            current_app.logger.debug("First few rows:\n%s", df.head().to_string())
         
         # Validate required columns
         required_columns = ['Open', 'High', 'Low', 'Close']
@@ -0,0 +1,154 @@
+# modules/http_session.py
+"""
+Process-wide pooled HTTP session for every upstream call (yfinance, translator).
+
+yfinance requires a curl_cffi session, so the shared session is a
+curl_cffi Session configured with a connection cache size and TCP
+keep-alive. curl_cffi keeps one curl handle per thread, and each handle
+reuses its connections across requests, so repeated calls from a worker
+thread skip the TCP/TLS handshake. Every request records whether it had to
+open a new connection and how long the handshake took, per host.
+"""
+
+import threading
+import time
+from urllib.parse import urlsplit
+from curl_cffi import requests as curl_requests, CurlInfo, CurlOpt
+from typing import Dict, Optional
+
+_STAT_INFOS = [CurlInfo.NUM_CONNECTS, CurlInfo.CONNECT_TIME, CurlInfo.APPCONNECT_TIME, CurlInfo.TOTAL_TIME]
+
+
+class PoolStats:
+    """Thread-safe per-host counters for requests, new connections and handshake time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict[str, float]] = {}
+
+    def _host(self, host: str) -> Dict[str, float]:
+        entry = self._hosts.get(host)
+        if entry is None:
+            entry = self._hosts[host] = {
+                'requests': 0, 'errors': 0, 'new_connections': 0, 'reused_connections': 0,
+                'handshake_seconds': 0.0, 'total_seconds': 0.0,
+            }
+        return entry
+
+    def record(self, host: str, new_connections: int, handshake_seconds: float, total_seconds: float) -> None:
+        with self._lock:
+            entry = self._host(host)
+            entry['requests'] += 1
+            entry['new_connections'] += new_connections
+            if new_connections == 0:
+                entry['reused_connections'] += 1
+            entry['handshake_seconds'] += handshake_seconds
+            entry['total_seconds'] += total_seconds
+
+    def record_error(self, host: str, total_seconds: float) -> None:
+        with self._lock:
+            entry = self._host(host)
+            entry['requests'] += 1
+            entry['errors'] += 1
+            entry['total_seconds'] += total_seconds
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Copy of the per-host counters, with reuse ratio and average latencies."""
+        with self._lock:
+            hosts = {host: dict(entry) for host, entry in self._hosts.items()}
+        for entry in hosts.values():
+            requests = entry['requests'] or 1
+            entry['reuse_ratio'] = entry['reused_connections'] / requests
+            entry['avg_total_ms'] = entry['total_seconds'] / requests * 1000
+            entry['avg_handshake_ms'] = entry['handshake_seconds'] / requests * 1000
+            # זמן הקריאה ללא עלות ה-handshake - זה מה שהמאגר אמור לחסוך
+            entry['avg_latency_ex_handshake_ms'] = entry['avg_total_ms'] - entry['avg_handshake_ms']
+        return hosts
+
+    def reset(self) -> None:
+        with self._lock:
+            self._hosts.clear()
+
+
+class PooledSession(curl_requests.Session):
+    """curl_cffi Session that records connection reuse statistics for every request."""
+
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(curl_infos=_STAT_INFOS, **kwargs)
+        self.stats = stats
+
+    def request(self, method, url, *args, **kwargs):
+        host = urlsplit(url).hostname or 'unknown'
+        started = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except Exception:
+            self.stats.record_error(host, time.perf_counter() - started)
+            raise
+        infos = getattr(response, 'infos', None) or {}
+        self.stats.record(
+            host,
+            int(infos.get(CurlInfo.NUM_CONNECTS, 0) or 0),
+            float(infos.get(CurlInfo.APPCONNECT_TIME, 0.0) or infos.get(CurlInfo.CONNECT_TIME, 0.0) or 0.0),
+            float(infos.get(CurlInfo.TOTAL_TIME, 0.0) or (time.perf_counter() - started)),
+        )
+        return response
+
+
+class _TranslatorRequestsShim:
+    """Stand-in for the `requests` module inside deep_translator, routed through the pooled session."""
+
+    def __init__(self, session_getter):
+        self._session_getter = session_getter
+
+    def get(self, url, params=None, proxies=None, **kwargs):
+        if proxies:
+            kwargs['proxies'] = proxies
+        return self._session_getter().get(url, params=params, **kwargs)
+
+
+pool_stats = PoolStats()
+_session: Optional[PooledSession] = None
+_session_lock = threading.Lock()
+
+
+def _build_session(config) -> PooledSession:
+    return PooledSession(
+        pool_stats,
+        impersonate="chrome",
+        timeout=config.get('HTTP_TIMEOUT', 15),
+        curl_options={
+            CurlOpt.MAXCONNECTS: config.get('HTTP_POOL_MAXCONNECTS', 20),
+            CurlOpt.TCP_KEEPALIVE: 1,
+            CurlOpt.TCP_KEEPIDLE: config.get('HTTP_KEEPALIVE_IDLE', 60),
+            CurlOpt.TCP_KEEPINTVL: config.get('HTTP_KEEPALIVE_INTERVAL', 30),
+        },
+    )
+
+
+def get_http_session() -> PooledSession:
+    """
+    Return the process-wide pooled session, creating it on first use.
+
+    Pool settings are read from the current app's config when an app context
+    is available, otherwise defaults are used.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                from flask import current_app, has_app_context
+                config = current_app.config if has_app_context() else {}
+                _session = _build_session(config)
+    return _session
+
+
+def install_translator_session() -> None:
+    """Route deep_translator's Google requests through the pooled session (idempotent)."""
+    from deep_translator import google as google_translator_module
+    if not isinstance(google_translator_module.requests, _TranslatorRequestsShim):
+        google_translator_module.requests = _TranslatorRequestsShim(get_http_session)
+
+
+def get_pool_stats() -> Dict[str, Dict[str, float]]:
+    return pool_stats.snapshot()
@@ -0,0 +1,368 @@
+# modules/metrics.py
+"""
+Prometheus-style metrics aggregated across gunicorn workers.
+
+Each worker keeps its counters and histograms in plain dicts behind one
+lock, so recording a value on the hot path is a dict update. A daemon thread
+writes the worker's state every METRICS_FLUSH_INTERVAL seconds to its own
+file in METRICS_DIR ('metrics-<pid>.json', atomically replaced). /metrics
+merges every worker's file with the serving worker's live state and renders
+the Prometheus text format, so counters add up across processes. Files of
+workers that exited are kept, as in prometheus_client's multiprocess mode,
+so totals never go backwards; clear METRICS_DIR on deploy.
+"""
+
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+import glob
+import json
+import os
+import threading
+import time
+from cachetools import TTLCache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint.', LATENCY_BUCKETS),
+    'cache_requests_total': ('counter', 'Cache lookups by result (hit/miss).', None),
+    'cache_evictions_total': ('counter', 'Cache entries removed by reason (size/expired).', None),
+    'upstream_requests_total': ('counter', 'Upstream calls by outcome (ok/error).', None),
+    'upstream_request_duration_seconds': ('histogram', 'Upstream call latency.', LATENCY_BUCKETS),
+    'chart_build_duration_seconds': ('histogram', 'Time to build a chart bundle payload.', LATENCY_BUCKETS),
+    'chart_payload_bytes': ('histogram', 'Chart bundle payload size by encoding.', SIZE_BUCKETS),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Labels], float] = {}
+_histograms: Dict[Tuple[str, Labels], list] = {}  # [bucket counts..., +Inf count, sum]
+# בקשות לפי טיקר - לא נחשף ב-/metrics (מספר הסדרות לא חסום), רק בלוח הביצועים
+_tickers: Counter = Counter()
+MAX_TRACKED_TICKERS = 1000
+_owner_pid = os.getpid()
+_metrics_dir: Optional[str] = None
+_flush_interval = 10.0
+_flusher_pid: Optional[int] = None
+
+
+def _check_process() -> None:
+    # אחרי fork (gunicorn --preload) הילד לא יורש את ה-thread וגם לא צריך את המונים של האב
+    global _owner_pid
+    pid = os.getpid()
+    if pid != _owner_pid:
+        _owner_pid = pid
+        _counters.clear()
+        _histograms.clear()
+        _tickers.clear()
+    if _metrics_dir and _flusher_pid != pid:
+        _start_flusher()
+
+
+def inc(name: str, amount: float = 1.0, **labels: str) -> None:
+    """Increase a counter."""
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _check_process()
+        _counters[key] = _counters.get(key, 0.0) + amount
+
+
+def observe(name: str, value: float, **labels: str) -> None:
+    """Record a value in a histogram."""
+    buckets = METRICS[name][2]
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _check_process()
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+        entry[bisect_left(buckets, value)] += 1
+        entry[-1] += value
+
+
+def record_ticker_request(ticker: str) -> None:
+    """Count a request for a ticker (feeds the admin performance panel)."""
+    with _lock:
+        _check_process()
+        _tickers[ticker] += 1
+        if len(_tickers) > MAX_TRACKED_TICKERS:
+            # שומרים רק את החצי הפופולרי - הזנב הארוך לא מעניין את הלוח
+            keep = _tickers.most_common(MAX_TRACKED_TICKERS // 2)
+            _tickers.clear()
+            _tickers.update(dict(keep))
+
+
+class UpstreamCall:
+    """Handle yielded by observe_upstream for failures the client library reports without raising."""
+
+    __slots__ = ('failed',)
+
+    def __init__(self):
+        self.failed = False
+
+    def mark_failed(self) -> None:
+        self.failed = True
+
+
+@contextmanager
+def observe_upstream(upstream: str) -> Iterator[UpstreamCall]:
+    """
+    Count and time an upstream call.
+
+    The call counts as an error if an exception escapes the block or the block
+    calls mark_failed() on the yielded handle - yfinance, for one, logs most
+    failures and returns an empty frame or dict instead of raising.
+    """
+    started = time.perf_counter()
+    call = UpstreamCall()
+    outcome = 'error'
+    try:
+        yield call
+        if not call.failed:
+            outcome = 'ok'
+    finally:
+        observe('upstream_request_duration_seconds', time.perf_counter() - started, upstream=upstream)
+        inc('upstream_requests_total', upstream=upstream, outcome=outcome)
+
+
+class InstrumentedTTLCache(TTLCache):
+    """
+    TTLCache that counts hits, misses and evictions under its name.
+
+    Lookups through cache[key] and cache.get() are counted (this is what
+    cachetools.cached uses); membership tests (`key in cache`) are not.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float, **kwargs):
+        super().__init__(maxsize, ttl, **kwargs)
+        self.name = name
+        self._inserted: Dict = {}  # key -> timer() at insertion, for entry ages
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._inserted[key] = self.timer()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._inserted.pop(key, None)
+
+    def inserted_at(self, key) -> Optional[float]:
+        """timer() value when key was stored (None if unknown)."""
+        return self._inserted.get(key)
+
+    def __getitem__(self, key):
+        try:
+            value = super().__getitem__(key)
+        except KeyError:
+            inc('cache_requests_total', cache=self.name, result='miss')
+            raise
+        inc('cache_requests_total', cache=self.name, result='hit')
+        return value
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        inc('cache_requests_total', cache=self.name, result='miss')
+        return default
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for key, _value in expired:
+            self._inserted.pop(key, None)
+        if expired:
+            inc('cache_evictions_total', len(expired), cache=self.name, reason='expired')
+        return expired
+
+    def popitem(self):
+        item = super().popitem()
+        inc('cache_evictions_total', cache=self.name, reason='size')
+        return item
+
+    def peek(self, key):
+        """Value for key without counting a lookup (raises KeyError like cache[key])."""
+        return super().__getitem__(key)
+
+    def peek_values(self) -> List:
+        """Current values without counting lookups (for inspection)."""
+        values = []
+        for key in list(self.keys()):
+            try:
+                values.append(self.peek(key))
+            except KeyError:
+                continue  # פג תוקף בינתיים
+        return values
+
+    def pop(self, key, *default):
+        # Cache.pop קורא ל-self[key] - הוצאה מהקאש אינה פנייה ולא נספרת
+        if key in self:
+            value = super().__getitem__(key)
+            del self[key]
+            return value
+        if default:
+            return default[0]
+        raise KeyError(key)
+
+
+def _snapshot() -> Dict:
+    with _lock:
+        return {
+            'counters': [[name, list(labels), value] for (name, labels), value in _counters.items()],
+            'histograms': [[name, list(labels), list(entry)] for (name, labels), entry in _histograms.items()],
+            'tickers': dict(_tickers),
+        }
+
+
+def flush() -> None:
+    """Write this worker's metrics to METRICS_DIR (no-op when not configured)."""
+    if not _metrics_dir:
+        return
+    path = os.path.join(_metrics_dir, f'metrics-{os.getpid()}.json')
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(_snapshot(), f)
+    os.replace(tmp_path, path)
+
+
+def _start_flusher() -> None:
+    global _flusher_pid
+    _flusher_pid = os.getpid()
+
+    def _loop():
+        while True:
+            time.sleep(_flush_interval)
+            try:
+                flush()
+            except OSError:
+                pass  # ננסה שוב בסבב הבא
+
+    threading.Thread(target=_loop, name='metrics-flusher', daemon=True).start()
+
+
+def init_metrics(app) -> None:
+    """
+    Configure the per-worker metrics file and time every request.
+
+    Reads METRICS_DIR and METRICS_FLUSH_INTERVAL; request latency is recorded
+    per endpoint, method and status class.
+    """
+    global _metrics_dir, _flush_interval
+    _metrics_dir = app.config.get('METRICS_DIR')
+    _flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 10.0)
+    if _metrics_dir:
+        os.makedirs(_metrics_dir, exist_ok=True)
+
+    from flask import g, request
+
+    @app.before_request
+    def _start_metrics_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.get('_metrics_started')
+        if started is not None:
+            observe('http_request_duration_seconds', time.perf_counter() - started,
+                    endpoint=request.endpoint or 'unmatched', method=request.method,
+                    status=f'{response.status_code // 100}xx')
+        return response
+
+
+def _load_states() -> List[Dict]:
+    """This worker's live state plus the last flushed state of every other worker."""
+    states = [_snapshot()]
+    own_file = f'metrics-{os.getpid()}.json'
+    if _metrics_dir:
+        for path in glob.glob(os.path.join(_metrics_dir, 'metrics-*.json')):
+            if os.path.basename(path) == own_file:
+                continue  # המצב החי של התהליך הנוכחי כבר נכלל
+            try:
+                with open(path, encoding='utf-8') as f:
+                    states.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return states
+
+
+def collect() -> Tuple[Dict, Dict]:
+    """
+    Merge the metrics of every worker.
+
+    Returns:
+        tuple: (counters, histograms) keyed by (name, labels)
+    """
+    states = _load_states()
+    counters: Dict[Tuple[str, Labels], float] = {}
+    histograms: Dict[Tuple[str, Labels], list] = {}
+    for state in states:
+        for name, labels, value in state['counters']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0.0) + value
+        for name, labels, entry in state['histograms']:
+            if name not in METRICS or len(entry) != len(METRICS[name][2]) + 2:
+                continue  # קובץ מגרסה עם דליים אחרים
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.get(key)
+            histograms[key] = list(entry) if merged is None else [a + b for a, b in zip(merged, entry)]
+    return counters, histograms
+
+
+def top_tickers(limit: int = 10) -> List[Tuple[str, int]]:
+    """Most requested tickers across all workers, as (ticker, requests)."""
+    totals: Counter = Counter()
+    for state in _load_states():
+        totals.update(state.get('tickers', {}))
+    return totals.most_common(limit)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_prometheus() -> str:
+    """All workers' metrics in the Prometheus text exposition format."""
+    counters, histograms = collect()
+    lines: List[str] = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+            continue
+        for (metric, labels), entry in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, entry):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, ("le", _format_number(bound)))} {cumulative}')
+            cumulative += entry[len(buckets)]
+            lines.append(f'{name}_bucket{_format_labels(labels, ("le", "+Inf"))} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_number(entry[-1])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset() -> None:
+    """Clear this worker's in-memory metrics (used by tests)."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _tickers.clear()
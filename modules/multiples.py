@@ -0,0 +1,252 @@
+# modules/multiples.py
+"""
+Relative valuation multiples for a configured ticker universe.
+
+The table is built by a batch job (CLI command or background refresher) into
+a columnar pandas snapshot persisted to disk. Page requests only slice and
+sort the in-memory snapshot, so their latency does not depend on the size of
+the universe or on yfinance.
+"""
+
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from flask import current_app
+from typing import Iterable, Optional
+
+from modules.price_history import get_fundamentals
+from modules.rate_limiter import upstream_priority, PRIORITY_PREFETCH, UpstreamRateLimitExceeded
+
+try:
+    import fcntl
+except ImportError:  # Windows - אין נעילת קבצים, הריענון פשוט לא מתואם בין תהליכים
+    fcntl = None
+
+MULTIPLE_COLUMNS = ('pe', 'ev_ebitda', 'ps', 'pb')
+SNAPSHOT_COLUMNS = ('ticker', 'name', 'sector', 'price', 'market_cap') + MULTIPLE_COLUMNS
+
+# מצב ה-snapshot בזיכרון של התהליך הנוכחי
+_snapshot: Optional[pd.DataFrame] = None
+_snapshot_mtime: Optional[float] = None
+_snapshot_lock = threading.Lock()
+
+
+def _safe_ratio(numerator: pd.Series, denominator: pd.Series) -> pd.Series:
+    """Element-wise ratio that yields NaN for missing or non-positive inputs."""
+    valid = (numerator > 0) & (denominator > 0)
+    return (numerator / denominator).where(valid)
+
+
+def compute_multiples_table(raw: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compute multiples and sector-relative ranks from raw fundamentals.
+
+    Args:
+        raw (pd.DataFrame): One row per ticker with FUNDAMENTAL_FIELDS columns
+                            plus 'ticker', 'name' and 'sector'
+
+    Returns:
+        pd.DataFrame: SNAPSHOT_COLUMNS plus, for every multiple, '<m>_sector_median',
+                      '<m>_vs_sector' (premium/discount vs. the median) and
+                      '<m>_sector_rank' (percentile within the sector, lower = cheaper).
+    """
+    raw = raw.copy()
+    for column in ('currentPrice', 'marketCap', 'enterpriseValue', 'ebitda',
+                   'totalRevenue', 'trailingEps', 'bookValue'):
+        if column not in raw.columns:
+            raw[column] = np.nan
+        raw[column] = pd.to_numeric(raw[column], errors='coerce')
+
+    table = pd.DataFrame({
+        'ticker': raw['ticker'],
+        'name': raw.get('name', raw['ticker']),
+        'sector': raw.get('sector', pd.Series(index=raw.index, dtype=object)).fillna('Unknown'),
+        'price': raw['currentPrice'],
+        'market_cap': raw['marketCap'],
+        'pe': _safe_ratio(raw['currentPrice'], raw['trailingEps']),
+        'ev_ebitda': _safe_ratio(raw['enterpriseValue'], raw['ebitda']),
+        'ps': _safe_ratio(raw['marketCap'], raw['totalRevenue']),
+        'pb': _safe_ratio(raw['currentPrice'], raw['bookValue']),
+    })
+
+    by_sector = table.groupby('sector')
+    for multiple in MULTIPLE_COLUMNS:
+        median = by_sector[multiple].transform('median')
+        table[f'{multiple}_sector_median'] = median
+        table[f'{multiple}_vs_sector'] = table[multiple] / median - 1.0
+        table[f'{multiple}_sector_rank'] = by_sector[multiple].rank(pct=True)
+
+    return table.reset_index(drop=True)
+
+
+def build_multiples_snapshot(tickers: Iterable[str]) -> pd.DataFrame:
+    """
+    Fetch fundamentals for every ticker and compute the multiples table.
+
+    Must run inside an application context. Tickers whose fundamentals cannot
+    be fetched are skipped; those skipped because the upstream rate limiter
+    timed out are listed in the result's attrs['throttled'].
+    """
+    rows = []
+    throttled = []
+    for ticker in tickers:
+        try:
+            fundamentals = get_fundamentals(ticker)
+        except UpstreamRateLimitExceeded as e:
+            # טיקר אחד שנחסם לא מבטל את כל הבנייה - הוא ינוסה שוב בריענון הבא
+            current_app.logger.warning(f"Skipping {ticker} in multiples snapshot: upstream throttled ({str(e)}).")
+            throttled.append(ticker)
+            continue
+        if not fundamentals:
+            current_app.logger.warning(f"Skipping {ticker} in multiples snapshot: no fundamentals.")
+            continue
+        rows.append({'ticker': ticker, **fundamentals})
+
+    table = compute_multiples_table(pd.DataFrame(rows)) if rows else pd.DataFrame(columns=list(SNAPSHOT_COLUMNS))
+    table.attrs['throttled'] = throttled
+    return table
+
+
+def save_snapshot(table: pd.DataFrame, path: str) -> None:
+    """Persist the snapshot atomically (write to a temp file, then rename)."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    table.to_pickle(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def refresh_multiples_snapshot(tickers: Optional[Iterable[str]] = None,
+                               wait: bool = False) -> Optional[pd.DataFrame]:
+    """
+    Rebuild and persist the snapshot for the configured universe.
+
+    Only one process per host rebuilds at a time. If another process holds the
+    refresh lock, this call returns None and leaves the snapshot untouched -
+    or, with wait=True, blocks until that refresh ends and then rebuilds.
+    """
+    global _snapshot, _snapshot_mtime
+    path = current_app.config['MULTIPLES_SNAPSHOT_FILE']
+    tickers = list(tickers or current_app.config['VALUATION_UNIVERSE'])
+
+    lock_file = None
+    try:
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            lock_file = open(f"{path}.lock", 'w')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                current_app.logger.info("Multiples snapshot refresh already running in another process. Skipping.")
+                return None
+
+        started = time.perf_counter()
+        table = build_multiples_snapshot(tickers)
+        save_snapshot(table, path)
+        with _snapshot_lock:
+            _snapshot = table
+            _snapshot_mtime = os.path.getmtime(path)
+        current_app.logger.info(
+            f"Multiples snapshot refreshed: {len(table)} of {len(tickers)} tickers "
+            f"({len(table.attrs['throttled'])} throttled) in {time.perf_counter() - started:.1f}s."
+        )
+        return table
+    finally:
+        if lock_file is not None:
+            lock_file.close()
+
+
+def get_multiples_snapshot() -> Optional[pd.DataFrame]:
+    """
+    Return the current snapshot, reloading it only when the file has changed.
+
+    Returns:
+        pd.DataFrame or None: The snapshot, or None if none has been built yet
+    """
+    global _snapshot, _snapshot_mtime
+    path = current_app.config['MULTIPLES_SNAPSHOT_FILE']
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return _snapshot
+
+    if mtime != _snapshot_mtime:
+        with _snapshot_lock:
+            if mtime != _snapshot_mtime:
+                try:
+                    _snapshot = pd.read_pickle(path)
+                    _snapshot_mtime = mtime
+                    current_app.logger.info(f"Loaded multiples snapshot from {path}. Rows: {len(_snapshot)}")
+                except Exception as e:
+                    current_app.logger.error(f"Error loading multiples snapshot from {path}: {str(e)}")
+    return _snapshot
+
+
+def query_multiples(sector: Optional[str] = None, sort_by: str = 'pe',
+                    ascending: bool = True, limit: Optional[int] = None) -> pd.DataFrame:
+    """
+    Slice and sort the precomputed snapshot.
+
+    Args:
+        sector (str, optional): Only return tickers in this sector
+        sort_by (str): Column to sort by; NaNs always sort last
+        ascending (bool): Sort direction
+        limit (int, optional): Maximum number of rows
+
+    Returns:
+        pd.DataFrame: The requested view (empty if no snapshot exists yet)
+
+    Raises:
+        ValueError: If sort_by is not a snapshot column
+    """
+    snapshot = get_multiples_snapshot()
+    if snapshot is None or snapshot.empty:
+        return pd.DataFrame(columns=list(SNAPSHOT_COLUMNS))
+    if sort_by not in snapshot.columns:
+        raise ValueError(f"Unknown sort column '{sort_by}'")
+
+    view = snapshot
+    if sector:
+        view = view[view['sector'] == sector]
+    view = view.sort_values(sort_by, ascending=ascending, na_position='last')
+    if limit:
+        view = view.head(limit)
+    return view
+
+
+def start_multiples_refresher(app) -> Optional[threading.Thread]:
+    """
+    Start a daemon thread that rebuilds the snapshot every MULTIPLES_REFRESH_INTERVAL seconds.
+
+    A refresh that left tickers out because of upstream throttling is retried
+    after MULTIPLES_RETRY_BACKOFF seconds instead of a full interval; tickers
+    fetched in the meantime are served from the fundamentals cache. Returns
+    None (and starts nothing) when the interval is 0.
+    """
+    interval = app.config.get('MULTIPLES_REFRESH_INTERVAL', 0)
+    if not interval:
+        return None
+    backoff = min(app.config.get('MULTIPLES_RETRY_BACKOFF', 60), interval)
+
+    def _refresh_loop():
+        retry = False
+        while True:
+            with app.app_context(), upstream_priority(PRIORITY_PREFETCH):
+                try:
+                    path = app.config['MULTIPLES_SNAPSHOT_FILE']
+                    age = time.time() - os.path.getmtime(path) if os.path.exists(path) else None
+                    if retry or age is None or age >= interval:
+                        table = refresh_multiples_snapshot()
+                        retry = table is not None and bool(table.attrs.get('throttled'))
+                except Exception as e:
+                    app.logger.error(f"Multiples snapshot refresh failed: {str(e)}")
+                    app.logger.exception("Detailed traceback for multiples refresh error:")
+            time.sleep(backoff if retry else interval)
+
+    thread = threading.Thread(target=_refresh_loop, name='multiples-refresher', daemon=True)
+    thread.start()
+    app.logger.info(f"Multiples snapshot refresher started (interval: {interval}s)")
+    return thread
@@ -0,0 +1,98 @@
+# modules/payload_cache.py
+"""
+Cache of response payloads stored already compressed.
+
+Each payload is serialized once and kept as identity, gzip and (when the
+brotli package is available) brotli bodies together with a content ETag.
+Hot responses pick the body matching Accept-Encoding or answer 304 on a
+matching If-None-Match, so nothing is re-serialized or re-compressed per hit.
+Responses carry their own Content-Encoding, which Flask-Compress leaves alone.
+"""
+
+import gzip
+import hashlib
+import threading
+from flask import Response, request
+from typing import Callable, Dict, Hashable, Optional
+
+from modules.metrics import InstrumentedTTLCache
+
+try:
+    import brotli
+except ImportError:  # Flask-Compress מתקין את brotli, אבל בלעדיו פשוט מגישים gzip
+    brotli = None
+
+payload_cache = InstrumentedTTLCache('payload_cache', maxsize=200, ttl=3600)  # שעה - קצר מקאש המחירים שממנו נבנים הגרפים
+payload_cache_lock = threading.RLock()
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class CompressedPayload:
+    """
+    A serialized payload with its pre-compressed variants and ETag.
+
+    Args:
+        body (bytes): Uncompressed response body
+        mimetype (str): Response mimetype
+        meta (dict, optional): Server-side details about the payload (not sent to the client)
+    """
+
+    __slots__ = ('bodies', 'etag', 'mimetype', 'meta')
+
+    def __init__(self, body: bytes, mimetype: str = 'application/json', meta: Optional[Dict] = None):
+        self.bodies = {'identity': body, 'gzip': gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)}
+        if brotli is not None:
+            self.bodies['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.mimetype = mimetype
+        self.meta = meta or {}
+
+    def choose_encoding(self, accept_encodings) -> str:
+        """Best stored encoding the client accepts ('br', 'gzip' or 'identity')."""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.bodies and accept_encodings[encoding] > 0:
+                return encoding
+        return 'identity'
+
+
+def get_or_build_payload(key: Hashable, builder: Callable[[], Optional[CompressedPayload]]) -> Optional[CompressedPayload]:
+    """
+    Return the cached payload for key, building and caching it on a miss.
+
+    The builder runs outside the lock; a builder returning None is not cached.
+    """
+    with payload_cache_lock:
+        payload = payload_cache.get(key)
+    if payload is not None:
+        return payload
+
+    payload = builder()
+    if payload is not None:
+        with payload_cache_lock:
+            payload_cache[key] = payload
+    return payload
+
+
+def payload_response(payload: CompressedPayload, max_age: int = 0) -> Response:
+    """
+    Serve a cached payload for the current request.
+
+    Returns 304 when If-None-Match matches, otherwise the pre-compressed body
+    for the client's Accept-Encoding. The ETag is weak because it identifies
+    the content regardless of the transfer encoding chosen.
+    """
+    if request.if_none_match.contains_weak(payload.etag):
+        response = Response(status=304)
+    else:
+        encoding = payload.choose_encoding(request.accept_encodings)
+        response = Response(payload.bodies[encoding], mimetype=payload.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(payload.etag, weak=True)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    response.cache_control.must_revalidate = True
+    return response
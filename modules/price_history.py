@@ -1,25 +1,51 @@
 # modules/price_history.py
+import threading
 import yfinance as yf
 import pandas as pd
-from cachetools import TTLCache, cached
+from cachetools import cached
+from cachetools.keys import hashkey
 from flask import current_app 
-from typing import Optional, Dict # הוספנו Optional ו-Dict 
+from typing import Optional, Dict, List # הוספנו Optional ו-Dict 
 from deep_translator import GoogleTranslator # 1. ייבוא ספריית התרגום
+from modules.http_session import get_http_session, install_translator_session
+from modules.rate_limiter import acquire_upstream, upstream_priority, PRIORITY_PREFETCH, UpstreamRateLimitExceeded
+from modules.timing import timed
+from modules.metrics import InstrumentedTTLCache, observe_upstream
 
 # הגדרת אובייקטי הקאש
-price_data_cache = TTLCache(maxsize=100, ttl=43000)  # 12 שעות
-company_name_cache = TTLCache(maxsize=200, ttl=3600) # שעה 
-company_info_cache = TTLCache(maxsize=200, ttl=3600) # קאש גם למידע כללי על החברה
+# נבנה מחדש לפי PRICE_DATA_CACHE_MAXSIZE/TTL ב-configure_price_cache - לגשת תמיד דרך המודול, לא לייבא את השם
+price_data_cache = InstrumentedTTLCache('price_data_cache', maxsize=300, ttl=43000)  # 12 שעות
+company_name_cache = InstrumentedTTLCache('company_name_cache', maxsize=200, ttl=3600) # שעה 
+company_info_cache = InstrumentedTTLCache('company_info_cache', maxsize=200, ttl=3600) # קאש גם למידע כללי על החברה
+fundamentals_cache = InstrumentedTTLCache('fundamentals_cache', maxsize=500, ttl=21600) # 6 שעות - נתונים פיננסיים להערכות שווי
+
+# TTLCache אינו thread-safe - נעילה לכל קאש, כי פונקציות אלו נקראות גם במקביל (השוואת טיקרים)
+price_data_cache_lock = threading.RLock()
+company_name_cache_lock = threading.RLock()
+company_info_cache_lock = threading.RLock()
+fundamentals_cache_lock = threading.RLock()
+
+# שדות מספריים מתוך yfinance .info שמשמשים את מנועי הערכות השווי
+FUNDAMENTAL_FIELDS = (
+    'currentPrice', 'marketCap', 'enterpriseValue', 'sharesOutstanding',
+    'freeCashflow', 'operatingCashflow', 'ebitda', 'totalRevenue',
+    'totalDebt', 'totalCash', 'trailingEps', 'bookValue',
+    'trailingPE', 'enterpriseToEbitda', 'priceToSalesTrailing12Months', 'priceToBook',
+)
 
 # 2. פונקציית התרגום
 def translate_text_to_hebrew(text_to_translate: Optional[str]) -> Optional[str]:
     if not text_to_translate:
         current_app.logger.debug("translate_text_to_hebrew: No text provided for translation.")
         return None
+    # מחוץ ל-try: חריגת זמן המתנה אינה "תרגום נכשל" ולכן גם לא נשמרת בקאש של get_company_info
+    acquire_upstream('translator')
     try:
-        # יצירת מתרגם מאנגלית לעברית
-        translator = GoogleTranslator(source='en', target='iw')
-        translation_result = translator.translate(text_to_translate)
+        # יצירת מתרגם מאנגלית לעברית (הבקשות עוברות דרך ה-session המשותף)
+        install_translator_session()
+        with timed('translate'), observe_upstream('translator'):
+            translator = GoogleTranslator(source='en', target='iw')
+            translation_result = translator.translate(text_to_translate)
         if translation_result:
             current_app.logger.info("Text translated from 'en' to Hebrew successfully.")
             return translation_result
@@ -37,13 +63,35 @@ def _make_price_cache_key(ticker_symbol, period, interval):
     # current_app.logger.debug(f"Generated price_data_cache key: {key}")
     return key
 
-@cached(cache=price_data_cache, key=lambda ticker_symbol, period, interval: _make_price_cache_key(ticker_symbol, period, interval))
-def get_price_history(ticker_symbol, period, interval) -> pd.DataFrame: # הוספתי type hint לערך המוחזר
-    # הלוג הבא ירוץ רק אם הפונקציה המעוטרת נקראת (כלומר, אין HIT בקאש או שה-TTL עבר)
+def get_price_history(ticker_symbol, period, interval) -> pd.DataFrame:
+    """
+    Price history from price_data_cache, fetched from yfinance on a miss.
+
+    Looked up by name on every call (not bound with @cached) because
+    configure_price_cache replaces the cache object. A fetch that fails is
+    cached as an empty frame; a rate limiter timeout propagates and is not.
+    """
+    key = _make_price_cache_key(ticker_symbol, period, interval)
+    with price_data_cache_lock:
+        hist = price_data_cache.get(key)
+    if hist is None:
+        hist = _fetch_price_history(ticker_symbol, period, interval)
+        with price_data_cache_lock:
+            price_data_cache[key] = hist
+    return hist
+
+
+def _fetch_price_history(ticker_symbol, period, interval) -> pd.DataFrame:
+    # הלוג הבא ירוץ רק כשאין HIT בקאש או שה-TTL עבר
     current_app.logger.info(f"CACHE MISS/EXPIRED for price data: {ticker_symbol} (P:{period}, I:{interval}). Fetching FRESH from yfinance...")
+    # מחוץ ל-try: חריגת זמן המתנה לא נתפסת כ"אין נתונים" ולכן גם לא נשמרת בקאש
+    acquire_upstream('yfinance')
     try:
-        ticker = yf.Ticker(ticker_symbol)
-        hist = ticker.history(period=period, interval=interval)
+        with timed('fetch'), observe_upstream('yfinance') as call:
+            ticker = yf.Ticker(ticker_symbol, session=get_http_session())
+            hist = ticker.history(period=period, interval=interval)
+            if hist.empty:  # yfinance רושם את השגיאה ללוג ומחזיר מסגרת ריקה במקום לזרוק
+                call.mark_failed()
         
         if hist.empty:
             current_app.logger.warning(f"No price data returned by yfinance for {ticker_symbol} (P:{period}, I:{interval})")
@@ -63,11 +111,199 @@ def get_price_history(ticker_symbol, period, interval) -> pd.DataFrame: # הוס
         current_app.logger.exception("Detailed traceback for get_price_history error:")
         return pd.DataFrame()
 
-@cached(cache=company_name_cache)
+# yf.download משתמש במבני נתונים גלובליים של yfinance - אסור להריץ שתי הורדות במקביל
+_batch_download_lock = threading.Lock()
+
+
+def is_price_data_cached(ticker_symbol, period, interval) -> bool:
+    with price_data_cache_lock:
+        return _make_price_cache_key(ticker_symbol, period, interval) in price_data_cache
+
+
+def _download_errors(tickers) -> List[str]:
+    """Tickers of the last yf.download that yfinance recorded as failed (call under _batch_download_lock)."""
+    errors = getattr(yf.shared, '_ERRORS', None) or {}
+    return [ticker for ticker in tickers if ticker.upper() in errors]
+
+
+def _exchange_timezone(ticker: str) -> Optional[str]:
+    """Exchange timezone that yfinance cached for ticker while downloading it (None if unknown)."""
+    try:
+        return yf.cache.get_tz_cache().lookup(ticker)
+    except Exception:
+        return None
+
+
+def _to_exchange_timezone(hist: pd.DataFrame, tz: str) -> pd.DataFrame:
+    """Index hist in the exchange timezone, as Ticker.history returns it."""
+    # yf.download מחזיר שעון מקומי בלי אזור זמן ליומי ו-UTC לתוך-יומי
+    if hist.index.tz is None:
+        hist.index = hist.index.tz_localize(tz)
+    else:
+        hist.index = hist.index.tz_convert(tz)
+    return hist
+
+
+def _split_batch_frame(data: pd.DataFrame, tickers) -> Dict[str, pd.DataFrame]:
+    """
+    Split a yf.download(group_by='ticker') frame into one OHLC frame per ticker.
+
+    Each frame is indexed in its exchange timezone, so it matches what
+    get_price_history stores under the same key. Tickers whose timezone is
+    unknown are left out and load one by one on demand.
+    """
+    frames = {}
+    if data is None or data.empty:
+        return frames
+    available = set(data.columns.get_level_values(0)) if isinstance(data.columns, pd.MultiIndex) else set()
+    for ticker in tickers:
+        if ticker not in available:
+            continue
+        hist = data[ticker].dropna(how='all')
+        required_columns = ['Open', 'High', 'Low', 'Close']
+        if hist.empty or any(col not in hist.columns for col in required_columns):
+            continue
+        tz = _exchange_timezone(ticker)
+        if tz is None:
+            continue
+        try:
+            hist = _to_exchange_timezone(hist.copy(), tz)
+        except Exception as e:  # למשל שעה לא קיימת/כפולה במעבר שעון - הטיקר ייטען בנפרד
+            current_app.logger.warning(f"Could not index batch data for {ticker} in {tz}: {str(e)}")
+            continue
+        hist.columns.name = None
+        frames[ticker] = hist
+    return frames
+
+
+def prefetch_price_histories(ticker_symbols, period, interval,
+                             group_size: Optional[int] = None,
+                             max_workers: Optional[int] = None) -> Dict[str, pd.DataFrame]:
+    """
+    Download many tickers in grouped upstream calls and fan the results out
+    into price_data_cache, so later get_price_history calls are cache hits.
+
+    Tickers that are already cached are skipped. Each group is a single
+    yf.download call that fetches its tickers with at most max_workers
+    threads over one shared HTTP session.
+
+    Args:
+        ticker_symbols (iterable): Tickers to prefetch
+        period (str): yfinance period
+        interval (str): yfinance interval
+        group_size (int, optional): Tickers per yf.download call (PREFETCH_GROUP_SIZE)
+        max_workers (int, optional): Download threads per group (PREFETCH_MAX_WORKERS)
+
+    Returns:
+        dict: ticker -> DataFrame for every ticker that was downloaded successfully
+    """
+    group_size = group_size or current_app.config.get('PREFETCH_GROUP_SIZE', 50)
+    max_workers = max_workers or current_app.config.get('PREFETCH_MAX_WORKERS', 8)
+    tickers = [str(t).upper() for t in dict.fromkeys(ticker_symbols)]
+    cold = [t for t in tickers if not is_price_data_cached(t, period, interval)]
+    if not cold:
+        return {}
+
+    current_app.logger.info(
+        f"Batch prefetch of {len(cold)} tickers (skipped {len(tickers) - len(cold)} cached) "
+        f"in groups of {group_size} (P:{period}, I:{interval})."
+    )
+    fetched: Dict[str, pd.DataFrame] = {}
+    for start in range(0, len(cold), group_size):
+        group = cold[start:start + group_size]
+        try:
+            # yf.download שולח בקשה אחת לכל טיקר - טוקן לכל אחד
+            for _ in group:
+                acquire_upstream('yfinance')
+            with _batch_download_lock, observe_upstream('yfinance') as call:
+                data = yf.download(group, period=period, interval=interval, group_by='ticker',
+                                   actions=True, threads=min(max_workers, len(group)),
+                                   progress=False, session=get_http_session())
+                # yf.download לא זורק - טיקרים שנכשלו נרשמים ב-shared._ERRORS (מתאפס בכל קריאה, ולכן בתוך הנעילה)
+                if data is None or data.empty or _download_errors(group):
+                    call.mark_failed()
+        except UpstreamRateLimitExceeded as e:
+            # הקדמת טעינה היא אופטימיזציה בלבד - הטיקרים שנותרו ייטענו אחד-אחד
+            current_app.logger.warning(f"Batch prefetch stopped at {group[0]}: {str(e)}")
+            break
+        except Exception as e:
+            current_app.logger.error(f"Batch download failed for group starting at {group[0]} ({len(group)} tickers): {str(e)}")
+            current_app.logger.exception("Detailed traceback for prefetch_price_histories error:")
+            continue
+
+        frames = _split_batch_frame(data, group)
+        with price_data_cache_lock:
+            for ticker, hist in frames.items():
+                price_data_cache[_make_price_cache_key(ticker, period, interval)] = hist
+        fetched.update(frames)
+        missing = [t for t in group if t not in frames]
+        if missing:
+            current_app.logger.warning(f"Batch download returned no usable data or exchange timezone for: {missing}")
+
+    current_app.logger.info(f"Batch prefetch complete: {len(fetched)} of {len(cold)} tickers cached.")
+    return fetched
+
+def configure_price_cache(app) -> None:
+    """
+    Build price_data_cache from PRICE_DATA_CACHE_MAXSIZE and PRICE_DATA_CACHE_TTL.
+
+    The cache is replaced (empty) only when the configured size or TTL differs
+    from the current one, so creating more apps in one process keeps it.
+    """
+    global price_data_cache
+    maxsize = app.config.get('PRICE_DATA_CACHE_MAXSIZE', 300)
+    ttl = app.config.get('PRICE_DATA_CACHE_TTL', 43000)
+    with price_data_cache_lock:
+        if price_data_cache.maxsize != maxsize or price_data_cache.ttl != ttl:
+            price_data_cache = InstrumentedTTLCache('price_data_cache', maxsize=maxsize, ttl=ttl)
+
+
+def _prewarm_candidates(ticker_symbols, period, interval) -> List[str]:
+    """
+    Uncached tickers that fit in the free capacity of price_data_cache.
+
+    A prewarm is speculative, so it must not push out entries that live
+    requests loaded; the rest of the list is dropped (and logged).
+    """
+    tickers = [str(t).upper() for t in dict.fromkeys(ticker_symbols)]
+    with price_data_cache_lock:
+        price_data_cache.expire()
+        free = max(price_data_cache.maxsize - len(price_data_cache), 0)
+        cold = [t for t in tickers if _make_price_cache_key(t, period, interval) not in price_data_cache]
+    if len(cold) > free:
+        current_app.logger.warning(
+            f"Price prewarm truncated to {free} of {len(cold)} tickers: price_data_cache holds "
+            f"{price_data_cache.maxsize} entries (PRICE_DATA_CACHE_MAXSIZE)."
+        )
+        cold = cold[:free]
+    return cold
+
+
+def start_price_prewarm(app, ticker_symbols, period: str = "10y", interval: str = "1d") -> threading.Thread:
+    """Run prefetch_price_histories for ticker_symbols on a background daemon thread, within free cache capacity."""
+    def _prewarm():
+        with app.app_context(), upstream_priority(PRIORITY_PREFETCH):
+            try:
+                tickers = _prewarm_candidates(ticker_symbols, period, interval)
+                if tickers:
+                    prefetch_price_histories(tickers, period=period, interval=interval)
+            except Exception as e:
+                app.logger.error(f"Price prewarm failed: {str(e)}")
+                app.logger.exception("Detailed traceback for price prewarm error:")
+
+    thread = threading.Thread(target=_prewarm, name='price-prewarm', daemon=True)
+    thread.start()
+    return thread
+
+@cached(cache=company_name_cache, lock=company_name_cache_lock)
 def get_company_name(ticker_symbol: str) -> str:
     current_app.logger.info(f"CACHE MISS/EXPIRED for company name: '{ticker_symbol}'. Fetching FRESH from yfinance...")
+    acquire_upstream('yfinance')
     try:
-        ticker_info = yf.Ticker(ticker_symbol).info
+        with observe_upstream('yfinance') as call:
+            ticker_info = yf.Ticker(ticker_symbol, session=get_http_session()).info
+            if not ticker_info:
+                call.mark_failed()
         name = ticker_info.get('longName', ticker_info.get('shortName', ticker_symbol))
         if not name or name == ticker_symbol and ('longName' in ticker_info or 'shortName' in ticker_info) : 
              current_app.logger.warning(f"Company name from yfinance for '{ticker_symbol}' was empty or effectively same as ticker ('{name}'). Using ticker symbol as name.")
@@ -83,14 +319,18 @@ def get_company_name(ticker_symbol: str) -> str:
         current_app.logger.exception(f"Detailed traceback for get_company_name error (ticker: {ticker_symbol}):")
         return ticker_symbol
 
-@cached(cache=company_info_cache)
+@cached(cache=company_info_cache, lock=company_info_cache_lock)
 def get_company_info(ticker_symbol: str) -> Optional[Dict[str, Optional[str]]]: # עדכון Type Hint
     current_app.logger.info(f"Attempting to get_company_info for '{ticker_symbol}'.")
     # הלוג הבא ירוץ רק אם הפונקציה המעוטרת נקראת
     current_app.logger.info(f"CACHE MISS/EXPIRED for company info: '{ticker_symbol}'. Fetching FRESH from yfinance...")
+    acquire_upstream('yfinance')
     try:
-        ticker_obj = yf.Ticker(ticker_symbol)
-        info = ticker_obj.info
+        with observe_upstream('yfinance') as call:
+            ticker_obj = yf.Ticker(ticker_symbol, session=get_http_session())
+            info = ticker_obj.info
+            if not info:
+                call.mark_failed()
         if not info: 
             current_app.logger.warning(f"No company info dictionary returned by yfinance for '{ticker_symbol}'")
             return { # החזר מילון ברירת מחדל כדי שהתבנית לא תישבר
@@ -128,10 +368,68 @@ def get_company_info(ticker_symbol: str) -> Optional[Dict[str, Optional[str]]]:
         current_app.logger.info(f"Successfully fetched and processed company info for '{ticker_symbol}'.")
         return company_details
         
+    except UpstreamRateLimitExceeded:
+        raise  # מהמתרגם - לא לשמור בקאש תיאור חלופי בגלל עומס רגעי
     except Exception as e:
         current_app.logger.error(f"Error fetching company info for '{ticker_symbol}' with yfinance: {str(e)}")
         current_app.logger.exception(f"Detailed traceback for get_company_info error (ticker: {ticker_symbol}):")
         return { # החזר מילון ברירת מחדל במקרה של שגיאה
             "name": ticker_symbol, "description": "Error retrieving description.", "description_he": "שגיאה בקבלת התיאור.",
             "sector": "N/A", "industry": "N/A", "website": "N/A"
-        }
\ No newline at end of file
+        }
+
+def _to_float(value) -> Optional[float]:
+    try:
+        result = float(value)
+    except (TypeError, ValueError):
+        return None
+    return result if result == result else None # NaN -> None
+
+
+def get_fundamentals(ticker_symbol: str) -> Dict[str, Optional[float]]:
+    """
+    Fetch the numeric fundamentals used by the valuation engines.
+
+    Successful fetches are kept in fundamentals_cache; failures are not, so
+    the next call retries instead of serving an empty result for the full TTL.
+
+    Args:
+        ticker_symbol (str): Ticker symbol to fetch
+
+    Returns:
+        dict: FUNDAMENTAL_FIELDS mapped to floats (None when missing), plus
+              'sector' and 'name'. Empty dict on upstream failure.
+    """
+    key = hashkey(ticker_symbol)
+    with fundamentals_cache_lock:
+        fundamentals = fundamentals_cache.get(key)
+    if fundamentals is None:
+        fundamentals = _fetch_fundamentals(ticker_symbol)
+        if fundamentals:
+            with fundamentals_cache_lock:
+                fundamentals_cache[key] = fundamentals
+    return fundamentals
+
+
+def _fetch_fundamentals(ticker_symbol: str) -> Dict[str, Optional[float]]:
+    current_app.logger.info(f"CACHE MISS/EXPIRED for fundamentals: '{ticker_symbol}'. Fetching FRESH from yfinance...")
+    acquire_upstream('yfinance')
+    try:
+        with observe_upstream('yfinance') as call:
+            info = yf.Ticker(ticker_symbol, session=get_http_session()).info or {}
+            if not info:
+                call.mark_failed()
+        if not info:
+            current_app.logger.warning(f"No fundamentals returned by yfinance for '{ticker_symbol}'.")
+            return {}
+        fundamentals: Dict = {field: _to_float(info.get(field)) for field in FUNDAMENTAL_FIELDS}
+        if fundamentals['currentPrice'] is None:
+            fundamentals['currentPrice'] = _to_float(info.get('regularMarketPrice'))
+        fundamentals['sector'] = info.get('sector')
+        fundamentals['name'] = info.get('longName', info.get('shortName', ticker_symbol))
+        current_app.logger.info(f"Successfully fetched fundamentals for '{ticker_symbol}'.")
+        return fundamentals
+    except Exception as e:
+        current_app.logger.error(f"Error fetching fundamentals for '{ticker_symbol}' with yfinance: {str(e)}")
+        current_app.logger.exception(f"Detailed traceback for get_fundamentals error (ticker: {ticker_symbol}):")
+        return {}
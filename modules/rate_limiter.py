@@ -0,0 +1,244 @@
+# modules/rate_limiter.py
+"""
+Token-bucket rate limiting for upstream calls (yfinance, translator).
+
+Callers that find the bucket empty are queued and served by priority
+class first (interactive requests before prefetch jobs) and round-robin
+across users within a class, so one user's burst of cold analyses cannot
+monopolise the upstream budget. Queue wait times are recorded per
+priority for monitoring.
+"""
+
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+import contextvars
+import threading
+import time
+from typing import Dict, Optional
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_PREFETCH = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_PREFETCH: 'prefetch'}
+
+# זהות ועדיפות של הקורא הנוכחי; ברירת המחדל נגזרת מהבקשה (ראה _current_identity)
+_identity_var: contextvars.ContextVar = contextvars.ContextVar('upstream_identity', default=None)
+_priority_var: contextvars.ContextVar = contextvars.ContextVar('upstream_priority', default=PRIORITY_INTERACTIVE)
+
+
+class UpstreamRateLimitExceeded(Exception):
+    """Raised when a caller waited longer than its timeout for an upstream slot."""
+
+
+class _Waiter:
+    __slots__ = ('event', 'enqueued_at')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.enqueued_at = time.monotonic()
+
+
+class FairTokenBucket:
+    """
+    Token bucket with per-priority, per-user fair queuing.
+
+    Args:
+        rate (float): Tokens added per second (sustained upstream calls per second)
+        burst (int): Bucket capacity (calls allowed back-to-back after idling)
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+        # priority -> OrderedDict(identity -> deque[_Waiter]); סדר המפתחות הוא סדר הסבב
+        self._queues: Dict[int, "OrderedDict[str, deque]"] = {p: OrderedDict() for p in PRIORITY_NAMES}
+        self._stats = {
+            p: {'granted': 0, 'queued': 0, 'timeouts': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0}
+            for p in PRIORITY_NAMES
+        }
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _queued_count(self) -> int:
+        return sum(len(q) for users in self._queues.values() for q in users.values())
+
+    def _dispatch(self, now: float) -> None:
+        """Hand available tokens to queued waiters. Caller holds the lock."""
+        self._refill(now)
+        for priority in sorted(self._queues):
+            users = self._queues[priority]
+            while users and self._tokens >= 1.0:
+                identity, waiters = next(iter(users.items()))
+                waiter = waiters.popleft()
+                # סבב: המשתמש שקיבל עובר לסוף התור של אותה עדיפות
+                users.pop(identity)
+                if waiters:
+                    users[identity] = waiters
+                self._tokens -= 1.0
+                self._record_grant(priority, now - waiter.enqueued_at)
+                waiter.event.set()
+            if self._tokens < 1.0:
+                return
+
+    def _record_grant(self, priority: int, waited: float) -> None:
+        stats = self._stats[priority]
+        stats['granted'] += 1
+        stats['wait_seconds'] += waited
+        stats['max_wait_seconds'] = max(stats['max_wait_seconds'], waited)
+
+    def acquire(self, identity: str, priority: int = PRIORITY_INTERACTIVE, timeout: Optional[float] = None) -> float:
+        """
+        Block until a token is granted to this caller.
+
+        Args:
+            identity (str): Fairness key (usually the user)
+            priority (int): PRIORITY_INTERACTIVE or PRIORITY_PREFETCH
+            timeout (float, optional): Maximum seconds to wait
+
+        Returns:
+            float: Seconds spent waiting
+
+        Raises:
+            UpstreamRateLimitExceeded: If the timeout elapsed first
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= 1.0 and self._queued_count() == 0:
+                self._tokens -= 1.0
+                self._record_grant(priority, 0.0)
+                return 0.0
+            waiter = _Waiter()
+            self._queues[priority].setdefault(identity, deque()).append(waiter)
+            self._stats[priority]['queued'] += 1
+            self._dispatch(now)
+
+        deadline = None if timeout is None else waiter.enqueued_at + timeout
+        while not waiter.event.is_set():
+            # אין תהליך מחלק נפרד: כל ממתין מתעורר כשאמור להיווצר טוקן ומחלק בעצמו
+            sleep_for = max(0.001, (1.0 - self._tokens) / self.rate) if self.rate > 0 else 1.0
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    with self._lock:
+                        if waiter.event.is_set():
+                            break
+                        self._remove_waiter(priority, identity, waiter)
+                        self._stats[priority]['timeouts'] += 1
+                    raise UpstreamRateLimitExceeded(
+                        f"Upstream slot not granted within {timeout:.1f}s ({PRIORITY_NAMES[priority]}, {identity})"
+                    )
+                sleep_for = min(sleep_for, remaining)
+            if waiter.event.wait(sleep_for):
+                break
+            with self._lock:
+                self._dispatch(time.monotonic())
+
+        return time.monotonic() - waiter.enqueued_at
+
+    def _remove_waiter(self, priority: int, identity: str, waiter: _Waiter) -> None:
+        waiters = self._queues[priority].get(identity)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            return
+        if not waiters:
+            self._queues[priority].pop(identity, None)
+
+    def stats(self) -> Dict:
+        """Snapshot of tokens, queue depth and per-priority wait metrics."""
+        with self._lock:
+            self._refill(time.monotonic())
+            per_priority = {}
+            for priority, values in self._stats.items():
+                entry = dict(values)
+                entry['queue_depth'] = sum(len(q) for q in self._queues[priority].values())
+                entry['avg_wait_seconds'] = entry['wait_seconds'] / entry['granted'] if entry['granted'] else 0.0
+                per_priority[PRIORITY_NAMES[priority]] = entry
+            return {'rate': self.rate, 'burst': self.burst, 'tokens': self._tokens, 'priorities': per_priority}
+
+
+_limiters: Dict[str, FairTokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name: str) -> FairTokenBucket:
+    """Return the process-wide limiter for an upstream, configured from UPSTREAM_RATE_LIMITS."""
+    limiter = _limiters.get(name)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(name)
+            if limiter is None:
+                from flask import current_app, has_app_context
+                limits = current_app.config.get('UPSTREAM_RATE_LIMITS', {}) if has_app_context() else {}
+                rate, burst = limits.get(name, (2.0, 5))
+                limiter = _limiters[name] = FairTokenBucket(rate, burst)
+    return limiter
+
+
+def _current_identity() -> str:
+    identity = _identity_var.get()
+    if identity:
+        return identity
+    from flask import has_request_context
+    if has_request_context():
+        from flask_login import current_user
+        if current_user and current_user.is_authenticated:
+            return f"user:{current_user.id}"
+        return 'anonymous'
+    return 'system'
+
+
+def current_upstream_identity() -> str:
+    """The fairness key that would be used for an upstream call made right now."""
+    return _current_identity()
+
+
+@contextmanager
+def upstream_identity(identity: str):
+    """Attribute upstream calls in this block (and contexts copied from it) to identity."""
+    token = _identity_var.set(identity)
+    try:
+        yield
+    finally:
+        _identity_var.reset(token)
+
+
+@contextmanager
+def upstream_priority(priority: int):
+    """Run upstream calls in this block at the given priority (e.g. PRIORITY_PREFETCH for jobs)."""
+    token = _priority_var.set(priority)
+    try:
+        yield
+    finally:
+        _priority_var.reset(token)
+
+
+def acquire_upstream(name: str, timeout: Optional[float] = None) -> float:
+    """
+    Wait for an upstream slot for the current caller.
+
+    Args:
+        name (str): Upstream name ('yfinance', 'translator')
+        timeout (float, optional): Defaults to UPSTREAM_QUEUE_TIMEOUT
+
+    Returns:
+        float: Seconds spent queued
+
+    Raises:
+        UpstreamRateLimitExceeded: If no slot was granted in time
+    """
+    if timeout is None:
+        from flask import current_app, has_app_context
+        timeout = current_app.config.get('UPSTREAM_QUEUE_TIMEOUT', 30) if has_app_context() else 30
+    return get_limiter(name).acquire(_current_identity(), _priority_var.get(), timeout)
+
+
+def get_limiter_stats() -> Dict[str, Dict]:
+    return {name: limiter.stats() for name, limiter in list(_limiters.items())}
@@ -0,0 +1,112 @@
+# modules/routes/compare.py
+from flask import Blueprint, render_template, request, flash, current_app
+from flask_login import login_required
+from werkzeug.exceptions import BadRequest
+import re
+
+from modules.comparison import build_comparison
+from modules.correlation import compute_correlation_report
+from modules.chart_creator import create_comparison_chart, create_heatmap_chart
+from app.utils import validate_ticker
+from app.throttling import throttled
+
+compare_bp = Blueprint('compare_bp', __name__, url_prefix='/compare')
+
+COMPARE_PERIODS = ('1y', '2y', '5y', '10y', 'max')
+CORRELATION_WINDOWS = {'3m': 63, '6m': 126, '1y': 252, '3y': 756, '5y': 1260}
+
+
+def parse_ticker_list(raw_tickers: str, max_tickers: int) -> list:
+    """
+    Split a comma/space separated ticker list, validating and de-duplicating it.
+
+    Raises BadRequest with a user-facing message on invalid input.
+    """
+    tickers = []
+    for token in re.split(r'[\s,]+', raw_tickers or ''):
+        if not token:
+            continue
+        ticker = validate_ticker(token)
+        if ticker not in tickers:
+            tickers.append(ticker)
+
+    if not tickers:
+        raise BadRequest('אנא הזן לפחות סימול טיקר אחד.')
+    if len(tickers) > max_tickers:
+        raise BadRequest(f'ניתן להשוות עד {max_tickers} טיקרים.')
+    return tickers
+
+
+@compare_bp.route('/')
+@login_required
+@throttled('CHART_RATE_LIMIT')
+def compare_page():
+    """Overlay chart of several tickers rebased to 100 on their common trading days."""
+    raw_tickers = request.args.get('tickers', '')
+    period = request.args.get('period', '5y')
+    if period not in COMPARE_PERIODS:
+        period = '5y'
+
+    tickers = []
+    chart_json = None
+    if raw_tickers:
+        try:
+            tickers = parse_ticker_list(raw_tickers, current_app.config['COMPARE_MAX_TICKERS'])
+            panel, missing = build_comparison(tickers, period=period)
+            if missing:
+                flash(f"לא נמצאו נתוני מחירים עבור: {', '.join(missing)}", 'warning')
+            if panel.empty:
+                flash('אין ימי מסחר משותפים לטיקרים שנבחרו.', 'warning')
+            else:
+                chart_json = create_comparison_chart(panel, f"{' vs '.join(panel.columns)} - Rebased to 100 ({period})")
+        except BadRequest as e:
+            flash(e.description, 'warning')
+            current_app.logger.warning(f"BadRequest on compare page for '{raw_tickers}': {e.description}")
+        except Exception as e:
+            current_app.logger.error(f"Unhandled exception during comparison of '{raw_tickers}': {str(e)}")
+            current_app.logger.exception("Detailed traceback for comparison error:")
+            flash('אירעה שגיאה בעת השוואת הטיקרים. אנא נסה שוב.', 'danger')
+
+    return render_template('compare_page.html', page_title="השוואת מניות",
+                           tickers=tickers, raw_tickers=raw_tickers, period=period,
+                           periods=COMPARE_PERIODS, chart_json=chart_json)
+
+
+@compare_bp.route('/correlation')
+@login_required
+@throttled('CHART_RATE_LIMIT')
+def correlation_page():
+    """Pairwise return correlation heatmap and beta against a benchmark."""
+    raw_tickers = request.args.get('tickers', '')
+    raw_benchmark = request.args.get('benchmark') or current_app.config['CORRELATION_DEFAULT_BENCHMARK']
+    window_key = request.args.get('window', '1y')
+    if window_key not in CORRELATION_WINDOWS:
+        window_key = '1y'
+
+    report = None
+    chart_json = None
+    if raw_tickers:
+        try:
+            tickers = parse_ticker_list(raw_tickers, current_app.config['CORRELATION_MAX_TICKERS'])
+            benchmark = validate_ticker(raw_benchmark)
+            report = compute_correlation_report(tickers, benchmark, window=CORRELATION_WINDOWS[window_key])
+            if report['missing']:
+                flash(f"לא נמצאו נתוני מחירים עבור: {', '.join(report['missing'])}", 'warning')
+            if report['matrix'].empty:
+                flash('אין מספיק ימי מסחר משותפים לחישוב מתאמים.', 'warning')
+            else:
+                chart_json = create_heatmap_chart(
+                    report['matrix'], f"Daily Return Correlation ({window_key}, {report['days']} days)"
+                )
+        except BadRequest as e:
+            flash(e.description, 'warning')
+            current_app.logger.warning(f"BadRequest on correlation page for '{raw_tickers}': {e.description}")
+        except Exception as e:
+            current_app.logger.error(f"Unhandled exception during correlation of '{raw_tickers}': {str(e)}")
+            current_app.logger.exception("Detailed traceback for correlation error:")
+            flash('אירעה שגיאה בחישוב המתאמים. אנא נסה שוב.', 'danger')
+
+    return render_template('correlation_page.html', page_title="מתאמים ובטא",
+                           raw_tickers=raw_tickers, benchmark=raw_benchmark,
+                           window=window_key, windows=CORRELATION_WINDOWS,
+                           report=report, chart_json=chart_json)
@@ -1,21 +1,69 @@
 # modules/routes/home.py
-from flask import Blueprint, render_template, request, session, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, session, redirect, url_for, flash, current_app, jsonify, make_response, Response
 from flask_login import login_required, current_user
+from flask_wtf.csrf import generate_csrf
 # from flask_wtf.csrf import CSRFProtect # ודא שזה מוגדר כראוי אם אתה משתמש ב-CSRF
+import hashlib
+import html
+import json
+import re
+import time
 import pandas as pd
+from datetime import datetime
+from typing import Optional, Tuple
 
 # ודא שהנתיבים לייבוא נכונים.
-from modules.price_history import get_price_history, get_company_name, get_company_info
+from modules.price_history import get_price_history, get_company_name, get_company_info, is_price_data_cached
 from modules.chart_creator import create_all_candlestick_charts
-from werkzeug.exceptions import BadRequest
+from modules.payload_cache import CompressedPayload, get_or_build_payload, payload_response
+from modules.timing import timed
+from modules import metrics
+from modules.rate_limiter import UpstreamRateLimitExceeded
+from werkzeug.exceptions import BadRequest, ServiceUnavailable
+from werkzeug.http import is_resource_modified
 
 # Import utilities from the new utility module
-from app.utils import clear_session_data, validate_ticker, sanitize_ticker
+from app.utils import clear_session_data, validate_ticker, sanitize_ticker, log_user_action
+from app.throttling import throttled, cold_analysis_slot, shed_upstream_throttling
 
 
 home_bp = Blueprint('home_bp', __name__)
 
 
+def _build_chart_payload(ticker: str, company_name: str, df_daily: Optional[pd.DataFrame] = None) -> Optional[CompressedPayload]:
+    """
+    Build the daily/weekly/monthly chart bundle for a ticker as a pre-compressed JSON payload.
+
+    Args:
+        ticker (str): Validated ticker symbol
+        company_name (str): Name used in the chart titles
+        df_daily (pd.DataFrame, optional): Daily price history; fetched when not given
+
+    Returns:
+        CompressedPayload or None: None when no chart could be created.
+                                   meta['charts'] lists the chart keys present.
+    """
+    if df_daily is None:
+        df_daily = get_price_history(ticker, period="10y", interval="1d")
+    if df_daily is None or df_daily.empty:
+        return None
+
+    started = time.perf_counter()
+    charts = create_all_candlestick_charts(df_daily, ticker, company_name)
+    available = [key for key, chart_json in charts.items() if chart_json]
+    if not available:
+        return None
+    # הגרפים כבר מסודרים כ-JSON - מרכיבים את האובייקט בלי לפענח ולקודד אותם מחדש
+    with timed('serialize'):
+        body = '{' + ','.join(f'{json.dumps(key)}:{charts[key]}' for key in available) + '}'
+    with timed('compress'):
+        payload = CompressedPayload(body.encode('utf-8'), meta={'charts': available})
+    metrics.observe('chart_build_duration_seconds', time.perf_counter() - started)
+    for encoding, encoded_body in payload.bodies.items():
+        metrics.observe('chart_payload_bytes', len(encoded_body), encoding=encoding)
+    return payload
+
+
 @home_bp.route('/')
 @login_required
 def index():
@@ -33,64 +81,192 @@ def index():
 @home_bp.route('/analyze', methods=['POST'])
 @login_required
 def analyze():
+    """Form target: validate the ticker and redirect to its GET permalink."""
     ticker_from_form_raw = request.form.get('ticker', '')
-    ticker_from_form = "" # אתחול למקרה של שגיאה לפני שהערך נקבע
     try:
-        # הולידציה קורית כאן, ואם היא נכשלת, היא מעלה BadRequest
         ticker_from_form = validate_ticker(ticker_from_form_raw)
-        current_app.logger.info(f"Analyze request for validated ticker: {ticker_from_form} (raw input: '{ticker_from_form_raw}')")
+    except BadRequest as e:
+        flash(str(e), 'warning') # הודעת השגיאה מה-BadRequest תוצג ישירות
+        current_app.logger.warning(f"BadRequest during analyze for raw ticker '{html.escape(ticker_from_form_raw)}': {str(e)}")
+        return redirect(url_for('home_bp.index'))
+    # 303 - הדפדפן עובר ל-GET, כך שרענון/חזרה לא שולחים שוב את הטופס
+    return redirect(url_for('home_bp.analyze_ticker', ticker=ticker_from_form), code=303)
+
 
-        session['selected_ticker'] = ticker_from_form
+def _page_token_version() -> str:
+    """
+    Version of the per-session tokens the page embeds (the analyze form's CSRF token).
 
-        company_name_fetched = get_company_name(ticker_from_form)
-        company_name_display = company_name_fetched if company_name_fetched and company_name_fetched.strip().upper() != ticker_from_form else ticker_from_form
-        session['company_name'] = company_name_display
-        current_app.logger.debug(f"Company name set in session: {company_name_display}")
+    Changes with the session (login/logout rotate its id) and every half
+    WTF_CSRF_TIME_LIMIT, so a page revalidated with 304 never carries a
+    token older than half its lifetime.
+    """
+    generate_csrf()  # יוצר את סוד ה-CSRF בסשן אם עדיין אין, כמו שהתבנית תעשה
+    field = current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token')
+    time_limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    window = int(time.time() // max(time_limit // 2, 1)) if time_limit else 0
+    return f"{getattr(session, 'sid', '')}|{session.get(field)}|{window}"
 
-        company_info_display = get_company_info(ticker_from_form)
-        session['company_info'] = company_info_display
-        current_app.logger.debug(f"Company info set in session for: {ticker_from_form}")
 
-        chart1_json_data = None
-        chart2_json_data = None
-        chart3_json_data = None
+def _analysis_version(ticker: str, df_daily: pd.DataFrame) -> Tuple[str, datetime]:
+    """
+    ETag and Last-Modified for an analysis page, derived from the last price bar.
 
-        df_daily_for_charts = get_price_history(ticker_from_form, period="10y", interval="1d")
+    The ETag also covers the last close (an intraday bar changes without a new
+    date), the user, since the page layout is per user, and the session's
+    CSRF token (see _page_token_version), since the page embeds it.
+    """
+    last_bar = pd.Timestamp(df_daily.index[-1])
+    last_bar = last_bar.tz_convert('UTC') if last_bar.tzinfo else last_bar.tz_localize('UTC')
+    last_close = df_daily['Close'].iloc[-1] if 'Close' in df_daily.columns else None
+    version = f"{ticker}|{last_bar.isoformat()}|{last_close!r}|{current_user.get_id()}|{_page_token_version()}"
+    return hashlib.blake2b(version.encode('utf-8'), digest_size=16).hexdigest(), last_bar.to_pydatetime()
 
-        if df_daily_for_charts is not None and not df_daily_for_charts.empty:
-            current_app.logger.info(f"Price data found for {ticker_from_form} (shape: {df_daily_for_charts.shape}). Generating charts.")
-            all_charts_json = create_all_candlestick_charts(df_daily_for_charts, ticker_from_form, company_name_display)
 
-            chart1_json_data = all_charts_json.get('daily_chart_json')
-            chart2_json_data = all_charts_json.get('weekly_chart_json')
-            chart3_json_data = all_charts_json.get('monthly_chart_json')
+# Flask-Compress מוסיף לתג את האלגוריתם (W/"<hash>:br"); הדפדפן מחזיר אותו כך ב-If-None-Match
+_ENCODING_SUFFIX = re.compile(r':(?:br|gzip|deflate|zstd)"')
+
+
+def _revalidation_environ() -> dict:
+    """Request environ with compression suffixes removed from If-None-Match, for is_resource_modified."""
+    if_none_match = request.environ.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return request.environ
+    return dict(request.environ, HTTP_IF_NONE_MATCH=_ENCODING_SUFFIX.sub('"', if_none_match))
+
+
+def _set_cache_headers(response: Response, etag: str, last_modified: datetime) -> Response:
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.max_age = current_app.config.get('ANALYZE_PAGE_MAX_AGE', 60)
+    return response
+
+
+@home_bp.route('/analyze/<ticker>')
+@login_required
+@throttled('ANALYZE_RATE_LIMIT', deduct_when=lambda response: response.status_code != 304)
+def analyze_ticker(ticker):
+    """
+    Analysis page for a ticker, addressable and cacheable by URL.
+
+    The response depends only on the ticker, its price data version, the
+    user and the session's CSRF token, so repeat requests carrying
+    If-None-Match / If-Modified-Since are answered with 304 before company
+    info and charts are assembled. Pages that show flashed messages get no
+    validators.
+    """
+    ticker_raw = ticker
+    ticker = "" # אתחול למקרה של שגיאה לפני שהערך נקבע
+    try:
+        ticker = validate_ticker(ticker_raw)
+        current_app.logger.info(f"Analyze request for validated ticker: {ticker} (raw input: '{ticker_raw}')")
+        log_user_action('analyze_stock', f"ticker={ticker}")
+        metrics.record_ticker_request(ticker)
 
-            if not any([chart1_json_data, chart2_json_data, chart3_json_data]):
-                flash(f"לא נמצאו מספיק נתונים ליצירת גרפים עבור {html.escape(ticker_from_form)}.", 'warning')
-                current_app.logger.warning(f"Not enough data to create any charts for {ticker_from_form} after attempting generation.")
+        version = None
+        # ניתוח "קר" (מחירים לא בקאש) פונה ל-yfinance - מוגבל במספר המקבילים לתהליך
+        with cold_analysis_slot(not is_price_data_cached(ticker, "10y", "1d")):
+            df_daily_for_charts = get_price_history(ticker, period="10y", interval="1d")
+            has_prices = df_daily_for_charts is not None and not df_daily_for_charts.empty
+
+            if has_prices:
+                version = _analysis_version(ticker, df_daily_for_charts)
+                # הודעות שממתינות בסשן חייבות להיות מוצגות - עותק הדפדפן לא מכיל אותן
+                if not session.get('_flashes') and \
+                        not is_resource_modified(_revalidation_environ(), etag=version[0], last_modified=version[1]):
+                    session['selected_ticker'] = ticker
+                    current_app.logger.info(f"Analysis for {ticker} not modified since client's copy. Returning 304.")
+                    return _set_cache_headers(Response(status=304), *version)
+
+            session['selected_ticker'] = ticker
+
+            with timed('meta'):
+                company_name_fetched = get_company_name(ticker)
+            company_name_display = company_name_fetched if company_name_fetched and company_name_fetched.strip().upper() != ticker else ticker
+            session['company_name'] = company_name_display
+            current_app.logger.debug(f"Company name set in session: {company_name_display}")
+
+            with timed('meta'):
+                company_info_display = get_company_info(ticker)
+            session['company_info'] = company_info_display
+            current_app.logger.debug(f"Company info set in session for: {ticker}")
+
+            chart_keys = []
+
+            if has_prices:
+                current_app.logger.info(f"Price data found for {ticker} (shape: {df_daily_for_charts.shape}). Generating charts.")
+                payload = get_or_build_payload(
+                    ('charts', ticker),
+                    lambda: _build_chart_payload(ticker, company_name_display, df_daily_for_charts),
+                )
+                chart_keys = payload.meta['charts'] if payload is not None else []
+
+                if not chart_keys:
+                    flash(f"לא נמצאו מספיק נתונים ליצירת גרפים עבור {html.escape(ticker)}.", 'warning')
+                    current_app.logger.warning(f"Not enough data to create any charts for {ticker} after attempting generation.")
+                else:
+                    current_app.logger.info(f"Charts ready for {ticker}: {chart_keys}")
             else:
-                current_app.logger.info(f"Charts generated for {ticker_from_form}. Daily: {bool(chart1_json_data)}, Weekly: {bool(chart2_json_data)}, Monthly: {bool(chart3_json_data)}")
-        else:
-            flash(f"לא נמצאו נתוני מחירים בסיסיים עבור {html.escape(ticker_from_form)} ליצירת גרפים.", "danger")
-            current_app.logger.warning(f"No basic price data found for {ticker_from_form} from get_price_history.")
-
-        return render_template('content_home.html',
-                             selected_ticker=ticker_from_form,
-                             company_name=company_name_display,
-                             company_info=company_info_display,
-                             chart1_json=chart1_json_data,
-                             chart2_json=chart2_json_data,
-                             chart3_json=chart3_json_data)
+                flash(f"לא נמצאו נתוני מחירים בסיסיים עבור {html.escape(ticker)} ליצירת גרפים.", "danger")
+                current_app.logger.warning(f"No basic price data found for {ticker} from get_price_history.")
 
+        # דף עם הודעות flash הוא חד-פעמי - בלי מאמתים, כדי ש-304 לא יציג אותן שוב
+        if session.get('_flashes'):
+            version = None
+        # הדף מכיל רק את מבנה הגרפים; הנתונים עצמם נטענים מ-analyze_charts
+        with timed('render'):
+            response = make_response(render_template('content_home.html',
+                                                     selected_ticker=ticker,
+                                                     company_name=company_name_display,
+                                                     company_info=company_info_display,
+                                                     charts_url=url_for('home_bp.analyze_charts', ticker=ticker),
+                                                     chart1_json='daily_chart_json' in chart_keys,
+                                                     chart2_json='weekly_chart_json' in chart_keys,
+                                                     chart3_json='monthly_chart_json' in chart_keys))
+        # בלי נתוני מחירים או עם הודעות אין גרסה - התשובה לא נשמרת בקאש
+        return _set_cache_headers(response, *version) if version else response
+
+    except ServiceUnavailable:
+        raise  # מטופל ב-errorhandler(503) עם Retry-After
+    except UpstreamRateLimitExceeded as e:
+        # עומס זמני מול yfinance - לא שגיאה של המשתמש, הסשן נשאר כמו שהוא
+        current_app.logger.warning(f"Upstream throttled during analyze for '{html.escape(ticker or ticker_raw)}': {e}")
+        raise shed_upstream_throttling(e) from e
     except BadRequest as e:
-        flash(str(e), 'warning') # הודעת השגיאה מה-BadRequest תוצג ישירות
-        current_app.logger.warning(f"BadRequest during analyze for raw ticker '{html.escape(ticker_from_form_raw)}': {str(e)}")
+        flash(str(e), 'warning')
+        current_app.logger.warning(f"BadRequest during analyze for raw ticker '{html.escape(ticker_raw)}': {str(e)}")
         return redirect(url_for('home_bp.index'))
     except Exception as e:
-        # חשוב לכלול את הטיקר המקורי (raw) בלוג השגיאה אם ticker_from_form עדיין ריק
-        effective_ticker_for_log = ticker_from_form if ticker_from_form else ticker_from_form_raw
+        # חשוב לכלול את הטיקר המקורי (raw) בלוג השגיאה אם ticker עדיין ריק
+        effective_ticker_for_log = ticker if ticker else ticker_raw
         current_app.logger.error(f"Unhandled exception during analyze for ticker '{html.escape(effective_ticker_for_log)}': {str(e)}")
         current_app.logger.exception("Detailed traceback for unhandled exception in analyze:")
         clear_session_data()
         flash('אירעה שגיאה בעת ניתוח הטיקר. אנא נסה שוב.', 'danger')
         return redirect(url_for('home_bp.index'))
+
+
+@home_bp.route('/analyze/<ticker>/charts.json')
+@login_required
+@throttled('ANALYZE_RATE_LIMIT', deduct_when=lambda response: response.status_code != 304)
+def analyze_charts(ticker):
+    """Chart bundle for a ticker, served pre-compressed from the payload cache with an ETag."""
+    try:
+        ticker = validate_ticker(ticker)
+    except BadRequest as e:
+        return jsonify({'error': str(e)}), 400
+
+    def _build():
+        with cold_analysis_slot(not is_price_data_cached(ticker, "10y", "1d")):
+            with timed('meta'):
+                company_name = get_company_name(ticker) or ticker
+            return _build_chart_payload(ticker, company_name)
+
+    try:
+        payload = get_or_build_payload(('charts', ticker), _build)
+    except UpstreamRateLimitExceeded as e:
+        raise shed_upstream_throttling(e) from e
+    if payload is None:
+        return jsonify({'error': f'No chart data for {ticker}'}), 404
+    return payload_response(payload)
@@ -1,10 +1,116 @@
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, request, session, flash, current_app
 from flask_login import login_required
+from werkzeug.exceptions import BadRequest
+
+from modules.dcf_engine import get_dcf_valuation, DEFAULT_DCF_PARAMS
+from modules.multiples import query_multiples, get_multiples_snapshot, MULTIPLE_COLUMNS
+from app.utils import validate_ticker
+from app.throttling import throttled
 
 valuations_bp = Blueprint('valuations_bp', __name__, url_prefix='/valuations') # הוספת url_prefix
 
+# פרמטרים שהמשתמש מזין באחוזים: (שם, מינימום, מקסימום)
+PERCENT_PARAMS = (
+    ('growth_mean', -50.0, 100.0),
+    ('growth_std', 0.0, 50.0),
+    ('discount_mean', 1.0, 50.0),
+    ('discount_std', 0.0, 20.0),
+    ('terminal_growth', -5.0, 10.0),
+)
+PERCENT_PARAM_NAMES = {name for name, _, _ in PERCENT_PARAMS}
+YEARS_RANGE = (1, 30)
+SCENARIOS_RANGE = (100, 100000)
+
+
+def _parse_dcf_params(args) -> dict:
+    """
+    Read DCF overrides from the query string.
+
+    Rates are entered as percentages in the form and converted to fractions.
+    Raises BadRequest with a user-facing message on invalid input.
+    """
+    params = {}
+    for name, low, high in PERCENT_PARAMS:
+        raw_value = args.get(name, '').strip()
+        if not raw_value:
+            continue
+        try:
+            value = float(raw_value)
+        except ValueError:
+            raise BadRequest(f'ערך לא חוקי עבור {name}.')
+        if not (low <= value <= high):
+            raise BadRequest(f'הערך של {name} חייב להיות בין {low:g} ל-{high:g}.')
+        params[name] = round(value / 100.0, 6)
+
+    for name, (low, high) in (('years', YEARS_RANGE), ('scenarios', SCENARIOS_RANGE)):
+        raw_value = args.get(name, '').strip()
+        if not raw_value:
+            continue
+        try:
+            value = int(raw_value)
+        except ValueError:
+            raise BadRequest(f'ערך לא חוקי עבור {name}.')
+        if not (low <= value <= high):
+            raise BadRequest(f'הערך של {name} חייב להיות בין {low} ל-{high}.')
+        params[name] = value
+
+    return params
+
+
+def _to_form_values(params: dict) -> dict:
+    """Convert engine parameters back to the units shown in the form."""
+    return {name: round(value * 100, 4) if name in PERCENT_PARAM_NAMES else value
+            for name, value in params.items()}
+
+
 @valuations_bp.route('/')
 @login_required
+@throttled('CHART_RATE_LIMIT')
 def valuations_page():
-    """Renders the valuations page."""
-    return render_template('evaluation_page.html', page_title="הערכות שווי")
\ No newline at end of file
+    """Renders the valuations page, with a Monte Carlo DCF when a ticker is given."""
+    ticker_raw = request.args.get('ticker') or session.get('selected_ticker') or ''
+    form_values = _to_form_values(DEFAULT_DCF_PARAMS)
+    dcf_result = None
+    ticker = None
+
+    if ticker_raw:
+        try:
+            ticker = validate_ticker(ticker_raw)
+            overrides = _parse_dcf_params(request.args)
+            form_values.update(_to_form_values(overrides))
+            dcf_result = get_dcf_valuation(ticker, **overrides)
+            if dcf_result.get('error'):
+                flash(dcf_result['error'], 'warning')
+                dcf_result = None
+        except BadRequest as e:
+            flash(e.description, 'warning')
+            current_app.logger.warning(f"BadRequest on valuations page for ticker '{ticker_raw}': {e.description}")
+        except Exception as e:
+            current_app.logger.error(f"Unhandled exception during DCF valuation for '{ticker_raw}': {str(e)}")
+            current_app.logger.exception("Detailed traceback for DCF valuation error:")
+            flash('אירעה שגיאה בחישוב הערכת השווי. אנא נסה שוב.', 'danger')
+            dcf_result = None
+
+    return render_template('evaluation_page.html', page_title="הערכות שווי",
+                           ticker=ticker, form_values=form_values, dcf=dcf_result)
+
+
+@valuations_bp.route('/multiples')
+@login_required
+def multiples_page():
+    """Renders the relative valuation table from the precomputed multiples snapshot."""
+    sector = request.args.get('sector') or None
+    sort_by = request.args.get('sort', 'pe')
+    ascending = request.args.get('order', 'asc') != 'desc'
+    if sort_by not in MULTIPLE_COLUMNS + ('market_cap', 'ticker'):
+        flash('עמודת מיון לא חוקית.', 'warning')
+        sort_by = 'pe'
+
+    snapshot = get_multiples_snapshot()
+    sectors = sorted(snapshot['sector'].dropna().unique()) if snapshot is not None and not snapshot.empty else []
+    rows = query_multiples(sector=sector, sort_by=sort_by, ascending=ascending).to_dict('records')
+
+    return render_template('multiples_page.html', page_title="מכפילי שווי",
+                           rows=rows, sectors=sectors, selected_sector=sector,
+                           sort_by=sort_by, ascending=ascending,
+                           multiples=MULTIPLE_COLUMNS, has_snapshot=snapshot is not None)
@@ -0,0 +1,224 @@
+# modules/timing.py
+"""
+Per-request stage timing, reported as a Server-Timing header and a log record.
+
+Code anywhere in the request (routes, price_history, chart_creator) wraps a
+stage in `with timed('fetch'):`; durations of the same stage are summed.
+After the request the spans are sent to the browser in Server-Timing (visible
+in devtools) and written as one JSON 'REQUEST_TIMING' log line for aggregate
+analysis. Outside a request - background jobs, worker threads without a
+request context - timed() does nothing.
+
+Requests slower than SLOW_REQUEST_THRESHOLD_MS are also written to the slow
+log (SLOW_REQUEST_LOG_FILE) with route, ticker, user, spans and stack
+samples. The samples are taken while the request is still running: each
+request registers its thread on start, and a watchdog thread wakes every
+SLOW_REQUEST_STACK_INTERVAL_MS and records the stack of any request already
+over the threshold (via sys._current_frames), so the log shows where a slow
+request was spending its time, not just that it was slow.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from flask import Flask, g, has_request_context, request
+from typing import Dict, Iterator, List, Optional, Tuple
+
+SLOW_REQUEST_LOGGER = 'data_analyzer.slow_requests'
+
+# שלבים מוכרים ותיאורם (מוצג ב-devtools)
+STAGE_DESCRIPTIONS = {
+    'fetch': 'Upstream price fetch',
+    'meta': 'Company metadata',
+    'translate': 'Description translation',
+    'resample': 'OHLC resampling',
+    'indicators': 'Moving averages',
+    'serialize': 'Chart serialization',
+    'compress': 'Payload compression',
+    'render': 'Template render',
+}
+
+# הבקשות האיטיות האחרונות בתהליך הזה (ללוח הביצועים)
+_slow_requests: deque = deque(maxlen=50)
+_slow_requests_lock = threading.Lock()
+
+# בקשות שרצות כרגע: thread id -> {'started', 'stacks'}; הכלב השומר דוגם רק אותן
+_inflight: Dict[int, Dict] = {}
+_inflight_lock = threading.Lock()
+_watchdog_pid: Optional[int] = None
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Add the duration of the block to the current request's span for stage."""
+    if not has_request_context():
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - started)
+
+
+def record_span(stage: str, seconds: float) -> None:
+    """Add seconds to the stage's span of the current request (no-op outside a request)."""
+    if not has_request_context():
+        return
+    spans: Dict[str, List[float]] = g.setdefault('_timing_spans', {})
+    span = spans.setdefault(stage, [0.0, 0])
+    span[0] += seconds
+    span[1] += 1
+
+
+def get_spans() -> List[Tuple[str, float, int]]:
+    """Spans of the current request as (stage, milliseconds, count), in first-seen order."""
+    spans = g.get('_timing_spans', {}) if has_request_context() else {}
+    return [(stage, total * 1000.0, count) for stage, (total, count) in spans.items()]
+
+
+def server_timing_header(spans: List[Tuple[str, float, int]], total_ms: float) -> str:
+    """Format spans as a Server-Timing header value."""
+    entries = []
+    for stage, ms, _count in spans:
+        description = STAGE_DESCRIPTIONS.get(stage)
+        entry = f'{stage};dur={ms:.1f}'
+        entries.append(f'{entry};desc="{description}"' if description else entry)
+    entries.append(f'total;dur={total_ms:.1f}')
+    return ', '.join(entries)
+
+
+def get_slow_requests() -> List[Dict]:
+    """Recent requests slower than SLOW_REQUEST_THRESHOLD_MS in this worker, newest first."""
+    with _slow_requests_lock:
+        return list(reversed(_slow_requests))
+
+
+def _capture_stack(thread_id: int, limit: int = 40) -> Optional[List[str]]:
+    """Current stack of another thread as 'file:line in function' lines, innermost last."""
+    frame = sys._current_frames().get(thread_id)
+    if frame is None:
+        return None
+    return [f"{os.path.basename(entry.filename)}:{entry.lineno} in {entry.name}"
+            for entry in traceback.extract_stack(frame, limit=limit)]
+
+
+def _sample_slow_requests(max_stacks: int) -> None:
+    """One watchdog pass: add a stack sample to every in-flight request over its threshold."""
+    now = time.perf_counter()
+    with _inflight_lock:
+        due = [(thread_id, entry) for thread_id, entry in _inflight.items()
+               if now - entry['started'] >= entry['threshold_s'] and len(entry['stacks']) < max_stacks]
+    for thread_id, entry in due:
+        stack = _capture_stack(thread_id)
+        if stack is not None:
+            entry['stacks'].append({'at_ms': round((time.perf_counter() - entry['started']) * 1000.0, 1),
+                                    'stack': stack})
+
+
+def _start_watchdog(interval_s: float, max_stacks: int) -> None:
+    global _watchdog_pid
+    _watchdog_pid = os.getpid()
+
+    def _loop():
+        while True:
+            time.sleep(interval_s)
+            try:
+                _sample_slow_requests(max_stacks)
+            except Exception:
+                pass  # הכלב השומר לא אמור להפיל דבר; ננסה בסבב הבא
+
+    threading.Thread(target=_loop, name='slow-request-watchdog', daemon=True).start()
+
+
+def _request_ticker() -> Optional[str]:
+    ticker = (request.view_args or {}).get('ticker') or request.values.get('ticker')
+    return str(ticker).upper() if ticker else None
+
+
+def _request_user() -> Optional[str]:
+    from flask_login import current_user
+    try:
+        return current_user.username if current_user.is_authenticated else None
+    except Exception:
+        return None
+
+
+class _TimingRecord:
+    """Log argument rendered to JSON only when the log record is formatted (on the listener thread)."""
+
+    __slots__ = ('fields',)
+
+    def __init__(self, fields: Dict):
+        self.fields = fields
+
+    def __str__(self) -> str:
+        return json.dumps(self.fields, sort_keys=True)
+
+
+def init_server_timing(app: Flask) -> None:
+    """
+    Register request hooks that time the whole request and emit the spans.
+
+    Controlled by SERVER_TIMING_ENABLED; requests without any span (static
+    files, redirects) get only the header and no log line.
+    """
+    if not app.config.get('SERVER_TIMING_ENABLED', True):
+        return
+    stack_interval_ms = app.config.get('SLOW_REQUEST_STACK_INTERVAL_MS', 250)
+    max_stacks = app.config.get('SLOW_REQUEST_MAX_STACKS', 5)
+    slow_logger = logging.getLogger(SLOW_REQUEST_LOGGER)
+
+    @app.before_request
+    def _start_request_timer():
+        started = time.perf_counter()
+        g._timing_started = started
+        if stack_interval_ms:
+            # אחרי fork כל worker מפעיל כלב שומר משלו
+            if _watchdog_pid != os.getpid():
+                _start_watchdog(stack_interval_ms / 1000.0, max_stacks)
+            threshold_s = app.config.get('SLOW_REQUEST_THRESHOLD_MS', 1000) / 1000.0
+            with _inflight_lock:
+                _inflight[threading.get_ident()] = {'started': started, 'threshold_s': threshold_s, 'stacks': []}
+
+    @app.teardown_request
+    def _forget_inflight_request(_error=None):
+        with _inflight_lock:
+            _inflight.pop(threading.get_ident(), None)
+
+    @app.after_request
+    def _emit_server_timing(response):
+        started = g.get('_timing_started')
+        if started is None:
+            return response
+        total_ms = (time.perf_counter() - started) * 1000.0
+        spans = get_spans()
+        response.headers['Server-Timing'] = server_timing_header(spans, total_ms)
+        fields = None
+        if spans:
+            fields = {
+                'endpoint': request.endpoint,
+                'method': request.method,
+                'status': response.status_code,
+                'total_ms': round(total_ms, 2),
+                'spans': {stage: {'ms': round(ms, 2), 'count': count} for stage, ms, count in spans},
+            }
+            app.logger.info('REQUEST_TIMING %s', _TimingRecord(fields))
+        if total_ms >= app.config.get('SLOW_REQUEST_THRESHOLD_MS', 1000):
+            slow = dict(fields or {'endpoint': request.endpoint, 'method': request.method,
+                                   'status': response.status_code, 'total_ms': round(total_ms, 2), 'spans': {}})
+            slow.update(path=request.path, at=time.time())
+            with _slow_requests_lock:
+                _slow_requests.append(slow)
+            with _inflight_lock:
+                entry = _inflight.pop(threading.get_ident(), None)
+            record = dict(slow, ticker=_request_ticker(), user=_request_user(), pid=os.getpid(),
+                          stacks=entry['stacks'] if entry else [])
+            (slow_logger if slow_logger.handlers else app.logger).warning('SLOW_REQUEST %s', _TimingRecord(record))
+        return response
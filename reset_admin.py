@@ -4,59 +4,75 @@ Reset admin password script for Data Analyzer
 
 This script resets the admin user's password to the default value.
 Use this if you're having trouble logging in with the admin account.
+
+The password is written through the configured user store
+(USER_STORE_BACKEND - SQLite or users.json), so it takes effect for the
+backend the application actually reads. The configuration is chosen by
+FLASK_ENV, as in run.py.
+
+Usage:
+    python reset_admin.py
+    FLASK_ENV=production python reset_admin.py
 """
 
-import json
 import os
+from flask import Flask
 from werkzeug.security import generate_password_hash
 
+from config import config
+
 # Configuration
-USERS_FILE = 'users.json'
+ADMIN_USER_ID = 1
 ADMIN_USERNAME = 'admin'
 ADMIN_PASSWORD = 'Admin123!'
 
-def reset_admin_password():
-    """Reset the admin user's password to the default value."""
-    print(f"Resetting password for admin user to '{ADMIN_PASSWORD}'")
-    
-    # Check if users file exists
-    if not os.path.exists(USERS_FILE):
-        print(f"Error: {USERS_FILE} not found. Creating a new users file.")
-        users_data = {}
-    else:
+def reset_admin_password(config_name: str = 'default') -> bool:
+    """
+    Reset the admin user's password to the default value.
+
+    Args:
+        config_name (str): Configuration environment name ('development', 'testing', 'production')
+
+    Returns:
+        bool: True if the admin user was updated or created
+    """
+    # אפליקציה מינימלית - רק הקונפיגורציה, בלי create_app ועבודות הרקע שלו
+    app = Flask(__name__)
+    app.config.from_object(config.get(config_name, config['default']))
+
+    with app.app_context():
+        from app.models import UserManager
         try:
-            # Load existing users data
-            with open(USERS_FILE, 'r') as f:
-                users_data = json.load(f)
-            print(f"Loaded existing users data from {USERS_FILE}")
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"Error reading {USERS_FILE}: {e}")
-            print("Creating a new users file.")
-            users_data = {}
-    
-    # Generate new password hash
-    password_hash = generate_password_hash(ADMIN_PASSWORD)
-    print(f"Generated new password hash")
-    
-    # Update or create admin user
-    users_data["1"] = {
-        "username": ADMIN_USERNAME,
-        "password_hash": password_hash,
-        "is_approved": True
-    }
-    
-    # Save updated users data
-    try:
-        with open(USERS_FILE, 'w') as f:
-            json.dump(users_data, f, indent=4)
-        print(f"Successfully updated {USERS_FILE}")
-        print(f"You can now login with username '{ADMIN_USERNAME}' and password '{ADMIN_PASSWORD}'")
-        return True
-    except IOError as e:
-        print(f"Error saving {USERS_FILE}: {e}")
-        return False
+            manager = UserManager()
+        except ValueError as e:
+            print(f"Error opening the user store: {e}")
+            return False
+        store = manager.store
+        print(f"Resetting password for admin user to '{ADMIN_PASSWORD}' "
+              f"(backend: {app.config.get('USER_STORE_BACKEND', 'sqlite')}, "
+              f"store: {getattr(store, 'db_file', manager.users_file)})")
+
+        # Generate new password hash with the configured method, so the first login doesn't rehash it
+        password_hash = generate_password_hash(ADMIN_PASSWORD, app.config.get('PASSWORD_HASH_METHOD', 'scrypt'))
+        print("Generated new password hash")
+
+        # Update or create admin user
+        try:
+            if manager.get_user(ADMIN_USER_ID):
+                manager.update_user(ADMIN_USER_ID, username=ADMIN_USERNAME,
+                                    password_hash=password_hash, is_approved=True)
+            else:
+                store.add(ADMIN_USERNAME, password_hash, True, user_id=ADMIN_USER_ID)
+        except ValueError as e:
+            # שם המשתמש admin תפוס על ידי משתמש אחר
+            print(f"Error updating admin user: {e}")
+            return False
+
+    print(f"You can now login with username '{ADMIN_USERNAME}' and password '{ADMIN_PASSWORD}'")
+    return True
 
 if __name__ == "__main__":
     print("=== Admin Password Reset Tool ===")
-    reset_admin_password()
-    print("=== Operation completed ===")
+    ok = reset_admin_password(os.environ.get('FLASK_ENV', 'development'))
+    print("=== Operation completed ===" if ok else "=== Operation failed ===")
+    raise SystemExit(0 if ok else 1)
@@ -41,4 +41,15 @@ def authenticated_client(client):
     # if b"שם משתמש או סיסמה שגויים." in login_response.data:
     #     raise AssertionError(f"Login failed for user {ADMIN_USERNAME} in authenticated_client fixture")
         
-    return client
\ No newline at end of file
+    return client
+
+@pytest.fixture
+def logged_in_client(client):
+    """
+    מחזיר לקוח בדיקות שמחובר כמשתמש האדמין (ID 1) ישירות דרך ה-session,
+    בלי לעבור דרך טופס ההתחברות.
+    """
+    with client.session_transaction() as sess:
+        sess['_user_id'] = '1'
+        sess['_fresh'] = True
+    return client
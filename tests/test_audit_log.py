@@ -0,0 +1,74 @@
+# tests/test_audit_log.py
+import sqlite3
+import pytest
+
+from app.audit import AuditLog
+
+
+@pytest.fixture
+def audit_log(tmp_path):
+    # flush_interval ארוך - הבדיקות קובעות מתי נכתבת האצווה
+    return AuditLog(str(tmp_path / 'audit.sqlite3'), batch_size=50, flush_interval=60)
+
+
+class TestAuditLog:
+
+    def test_events_are_buffered_until_flush(self, audit_log):
+        audit_log.record('login', user_id=2, ip='10.0.0.1')
+        audit_log.record('analyze_stock', 'ticker=AAPL', user_id=2)
+        assert audit_log.query() == []
+        assert audit_log.flush() == 2
+        events = audit_log.query()
+        assert [e['action'] for e in events] == ['analyze_stock', 'login']
+        assert events[1]['ip'] == '10.0.0.1'
+        assert audit_log.stats()['batches'] == 1
+
+    def test_filters_and_keyset_pages(self, audit_log):
+        for i in range(5):
+            audit_log.record('analyze_stock', f'ticker=T{i}', user_id=2)
+            audit_log.record('login', user_id=3)
+        audit_log.flush()
+        assert len(audit_log.query(user_id=3)) == 5
+        first = audit_log.query(user_id=2, action='analyze_stock', limit=3)
+        assert [e['details'] for e in first] == ['ticker=T4', 'ticker=T3', 'ticker=T2']
+        rest = audit_log.query(user_id=2, action='analyze_stock', before=(first[-1]['ts'], first[-1]['id']))
+        assert [e['details'] for e in rest] == ['ticker=T1', 'ticker=T0']
+
+    def test_user_query_uses_index(self, audit_log):
+        plan = audit_log._connect().execute(
+            'EXPLAIN QUERY PLAN SELECT id FROM audit_events WHERE user_id = ? ORDER BY ts DESC, id DESC LIMIT 10', (1,)
+        ).fetchall()
+        assert any('audit_user_ts' in row[-1] for row in plan)
+
+    def test_rows_are_append_only(self, audit_log):
+        audit_log.record('login', user_id=2)
+        audit_log.flush()
+        conn = audit_log._connect()
+        with pytest.raises(sqlite3.DatabaseError):
+            conn.execute('DELETE FROM audit_events')
+        with pytest.raises(sqlite3.DatabaseError):
+            conn.execute("UPDATE audit_events SET action = 'x'")
+
+    def test_full_buffer_drops_instead_of_blocking(self, tmp_path):
+        audit_log = AuditLog(str(tmp_path / 'audit.sqlite3'), flush_interval=60, max_buffer=1)
+        assert audit_log.record('login')
+        assert not audit_log.record('login')
+        assert audit_log.stats()['dropped'] == 1
+
+
+class TestAuditEndpoint:
+
+    def test_admin_can_query_recorded_actions(self, app, logged_in_client):
+        from app.audit import get_audit_log
+        from app.utils import log_user_action
+        with app.test_request_context():
+            log_user_action('analyze_stock', 'ticker=MSFT', user_id=1)
+        get_audit_log().flush()
+        response = logged_in_client.get('/admin/api/audit?action=analyze_stock&user_id=1&limit=1')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['events'][0]['details'] == 'ticker=MSFT'
+        assert data['next_before']
+
+    def test_invalid_cursor_is_rejected(self, logged_in_client):
+        assert logged_in_client.get('/admin/api/audit?before=nope').status_code == 400
@@ -0,0 +1,35 @@
+# tests/test_benchmarks.py
+from benchmarks.fixtures import make_ohlcv
+from benchmarks.run import compare, time_case
+
+
+class TestBenchmarkFixtures:
+
+    def test_daily_history_is_deterministic_and_consistent(self):
+        df = make_ohlcv('1d', years=1)
+        assert len(df) == 252 and str(df.index.tz) == 'America/New_York'
+        assert (df['High'] >= df[['Open', 'Close']].max(axis=1)).all()
+        assert (df['Low'] <= df[['Open', 'Close']].min(axis=1)).all()
+        assert df.equals(make_ohlcv('1d', years=1))
+
+    def test_intraday_bars_cover_the_session_only(self):
+        df = make_ohlcv('1h', years=1)
+        assert len(df) == 252 * 7
+        assert df.index.min().strftime('%H:%M') == '09:30' and df.index.max().strftime('%H:%M') == '15:30'
+
+
+class TestBenchmarkHarness:
+
+    def test_time_case_reports_per_call_stats(self):
+        calls = []
+        timings = time_case(lambda: calls.append(1), repeat=3, min_time=0.001)
+        assert timings['runs'] == 3 and timings['loops'] >= 1
+        assert 0 < timings['min_s'] <= timings['median_s']
+        assert len(calls) > 3 * timings['loops']
+
+    def test_compare_matches_by_name_and_params(self):
+        baseline = {'results': [{'name': 'resample_ohlc', 'params': {'rule': 'ME'}, 'median_s': 0.02}]}
+        current = {'results': [{'name': 'resample_ohlc', 'params': {'rule': 'ME'}, 'median_s': 0.01},
+                               {'name': 'resample_ohlc', 'params': {'rule': 'W-FRI'}, 'median_s': 0.01}]}
+        [row] = compare(baseline, current)
+        assert row['ratio'] == 0.5
@@ -0,0 +1,78 @@
+# tests/test_cache_control.py
+import json
+import pandas as pd
+import pytest
+from unittest.mock import patch
+
+from modules.cache_control import CacheCommandLog, apply_pending_commands, evict_local, list_entries
+from modules import price_history
+from modules.price_history import price_data_cache_lock, company_name_cache, company_name_cache_lock
+
+
+@pytest.fixture
+def seeded_caches():
+    with price_data_cache_lock:
+        price_history.price_data_cache[('AAPL', '10y', '1d')] = pd.DataFrame({'Close': [1.0, 2.0]})
+        price_history.price_data_cache[('BRK-A', '10y', '1d')] = pd.DataFrame({'Close': [3.0]})
+        price_history.price_data_cache[('BRK-B', '10y', '1d')] = pd.DataFrame({'Close': [4.0]})
+    with company_name_cache_lock:
+        company_name_cache[('AAPL',)] = 'Apple Inc.'
+    yield
+    for ticker in ('AAPL', 'BRK-A', 'BRK-B'):
+        evict_local(ticker)
+
+
+class TestLocalCacheControl:
+
+    def test_list_entries_reports_age_and_size(self, seeded_caches):
+        entries = list_entries(['price_data_cache'])['price_data_cache']
+        aapl = next(e for e in entries if e['ticker'] == 'AAPL')
+        assert aapl['key'] == ['AAPL', '10y', '1d']
+        assert aapl['age_seconds'] >= 0 and aapl['size_bytes'] > 0
+
+    def test_unknown_cache_is_rejected(self):
+        with pytest.raises(ValueError):
+            list_entries(['nope'])
+
+    def test_evict_by_pattern_across_caches(self, seeded_caches):
+        assert evict_local('brk*') == 2
+        assert ('AAPL', '10y', '1d') in price_history.price_data_cache
+        assert evict_local('AAPL') == 2
+        assert ('AAPL',) not in company_name_cache
+
+
+class TestCommandLog:
+
+    def test_other_workers_apply_broadcast_evictions(self, app, tmp_path, seeded_caches):
+        path = str(tmp_path / 'commands.jsonl')
+        sender = CacheCommandLog(path)
+        sender.append({'op': 'evict', 'pattern': 'BRK*', 'caches': None})
+        receiver = CacheCommandLog(path, poll_interval=0)
+        # פקודות שנכתבו לפני שהתהליך עלה לא מבוצעות
+        assert receiver.read_new() == []
+        # שורה מ-worker אחר (pid שונה משלנו)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'op': 'evict', 'pattern': 'AAPL', 'caches': ['price_data_cache'], 'pid': -1}) + '\n')
+        with patch.dict(app.extensions, {'cache_command_log': receiver}):
+            assert apply_pending_commands(app, force=True) == 1
+        assert ('AAPL', '10y', '1d') not in price_history.price_data_cache
+        assert ('BRK-A', '10y', '1d') in price_history.price_data_cache
+
+
+class TestCacheAdminApi:
+
+    def test_list_evict_and_prewarm(self, logged_in_client, seeded_caches):
+        data = logged_in_client.get('/admin/api/cache?cache=price_data_cache').get_json()
+        assert {e['ticker'] for e in data['caches']['price_data_cache']} >= {'AAPL', 'BRK-A'}
+
+        response = logged_in_client.post('/admin/api/cache/evict', json={'pattern': 'BRK*'})
+        assert response.get_json()['removed_in_worker'] == 2
+
+        with patch('modules.price_history.start_price_prewarm') as prewarm:
+            response = logged_in_client.post('/admin/api/cache/prewarm', json={'tickers': ['msft', 'bad ticker!', 'MSFT']})
+        assert response.status_code == 202
+        assert response.get_json()['tickers'] == ['MSFT']
+        prewarm.assert_called_once()
+
+    def test_evict_requires_pattern(self, logged_in_client):
+        assert logged_in_client.post('/admin/api/cache/evict', json={}).status_code == 400
@@ -0,0 +1,115 @@
+# tests/test_compare.py
+import pytest
+import numpy as np
+import pandas as pd
+from unittest.mock import patch
+from werkzeug.exceptions import BadRequest
+
+from modules.comparison import align_close_panel, rebase_panel, build_comparison
+from modules.correlation import ReturnsPanelCache, correlation_matrix, betas_against, returns_panel_cache
+from modules.routes.compare import parse_ticker_list
+
+
+def make_history(dates, closes, tz=None):
+    index = pd.DatetimeIndex(pd.to_datetime(dates))
+    if tz:
+        index = index.tz_localize(tz)
+    return pd.DataFrame({'Open': closes, 'High': closes, 'Low': closes, 'Close': closes}, index=index)
+
+
+@pytest.fixture(autouse=True)
+def no_batch_prefetch():
+    with patch('modules.comparison.prefetch_price_histories', return_value={}):
+        yield
+
+
+HISTORIES = {
+    'AAA': make_history(['2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05'], [10.0, 11.0, 12.0, 13.0], tz='America/New_York'),
+    'BBB': make_history(['2024-01-03', '2024-01-04', '2024-01-05'], [50.0, 25.0, 100.0]),
+    'EMPTY': pd.DataFrame(),
+}
+
+
+class TestComparisonPanel:
+
+    def test_alignment_uses_common_trading_days(self):
+        panel = align_close_panel(HISTORIES)
+        assert list(panel.columns) == ['AAA', 'BBB']
+        assert len(panel) == 3
+        assert panel.index[0] == pd.Timestamp('2024-01-03')
+
+    def test_rebase_is_column_wise(self):
+        rebased = rebase_panel(np.array([[2.0, 50.0], [4.0, 25.0]]))
+        assert np.allclose(rebased, [[100.0, 100.0], [200.0, 50.0]])
+
+    def test_build_comparison_reports_missing(self, app):
+        with app.app_context(), \
+             patch('modules.comparison.get_price_history', side_effect=lambda t, period, interval: HISTORIES[t]) as mock_fetch:
+            rebased, missing = build_comparison(['AAA', 'BBB', 'EMPTY'])
+        assert missing == ['EMPTY']
+        assert mock_fetch.call_count == 3
+        assert rebased.iloc[0].tolist() == [100.0, 100.0]
+        assert rebased['BBB'].iloc[-1] == pytest.approx(200.0)
+
+    def test_parse_ticker_list(self):
+        assert parse_ticker_list('aapl, msft  AAPL', 10) == ['AAPL', 'MSFT']
+        with pytest.raises(BadRequest):
+            parse_ticker_list('A,B,C', 2)
+        with pytest.raises(BadRequest):
+            parse_ticker_list(' , ', 2)
+
+
+class TestComparePage:
+
+    def test_compare_page_renders_chart(self, logged_in_client):
+        with patch('modules.comparison.get_price_history', side_effect=lambda t, period, interval: HISTORIES[t]):
+            response = logged_in_client.get('/compare/?tickers=AAA,BBB&period=1y')
+        assert response.status_code == 200
+        assert 'compareChartDiv' in response.data.decode('utf-8')
+
+
+class TestCorrelationEngine:
+
+    RETURNS = np.random.default_rng(7).normal(0, 0.01, size=(300, 5))
+
+    def test_correlation_matches_numpy(self):
+        assert np.allclose(correlation_matrix(self.RETURNS), np.corrcoef(self.RETURNS, rowvar=False))
+
+    def test_beta_of_scaled_benchmark(self):
+        benchmark = self.RETURNS[:, 0]
+        stacked = np.column_stack([benchmark, 2 * benchmark, -0.5 * benchmark])
+        assert np.allclose(betas_against(stacked, benchmark), [1.0, 2.0, -0.5])
+
+    def test_incremental_update_matches_full_recompute(self):
+        dates = pd.bdate_range('2024-01-01', periods=30)
+        closes = pd.Series(np.linspace(100, 130, 30), index=dates)
+        cache = ReturnsPanelCache()
+        cache.update('AAA', closes.iloc[:20])
+        # חלון מתגלגל: נוספו ברים חדשים והברים הראשונים נשמטו
+        incremental = cache.update('AAA', closes.iloc[5:])
+        expected = closes.iloc[5:].pct_change().dropna()
+        pd.testing.assert_series_equal(incremental, expected, check_names=False, check_freq=False)
+
+    def test_adjusted_history_triggers_full_recompute(self):
+        dates = pd.bdate_range('2024-01-01', periods=10)
+        closes = pd.Series(np.arange(10, 20, dtype=float), index=dates)
+        cache = ReturnsPanelCache()
+        cache.update('AAA', closes)
+        adjusted = closes / 2  # ספליט 2:1 שמתאים את כל ההיסטוריה
+        returns = cache.update('AAA', adjusted)
+        pd.testing.assert_series_equal(returns, adjusted.pct_change().dropna(), check_freq=False)
+
+    def test_correlation_page_renders_heatmap(self, logged_in_client):
+        dates = pd.bdate_range('2024-01-01', periods=60)
+        rng = np.random.default_rng(1)
+        histories = {
+            ticker: make_history(dates, 100 * np.cumprod(1 + rng.normal(0, 0.01, 60)))
+            for ticker in ('AAA', 'BBB', '^GSPC')
+        }
+        returns_panel_cache.clear()
+        with patch('modules.comparison.get_price_history', side_effect=lambda t, period, interval: histories[t]):
+            response = logged_in_client.get('/compare/correlation?tickers=AAA,BBB&benchmark=^GSPC&window=3m')
+        assert response.status_code == 200
+        html = response.data.decode('utf-8')
+        assert 'correlationChartDiv' in html
+        assert 'Beta vs ^GSPC' in html
@@ -0,0 +1,110 @@
+# tests/test_home_routes.py
+import time
+import pandas as pd
+import pytest
+from unittest.mock import patch
+
+from modules import payload_cache
+
+
+def make_prices(last_close=12.0):
+    index = pd.date_range('2024-01-02', periods=3, freq='B', tz='America/New_York')
+    return pd.DataFrame({'Open': 10.0, 'High': 13.0, 'Low': 9.0, 'Close': [10.0, 11.0, last_close]}, index=index)
+
+
+@pytest.fixture(autouse=True)
+def clear_payload_cache():
+    payload_cache.payload_cache.clear()
+    yield
+    payload_cache.payload_cache.clear()
+
+
+@pytest.fixture
+def mocked_analysis():
+    with patch('modules.routes.home.is_price_data_cached', return_value=True), \
+         patch('modules.routes.home.get_price_history', return_value=make_prices()) as mock_prices, \
+         patch('modules.routes.home.get_company_name', return_value='Test Co'), \
+         patch('modules.routes.home.get_company_info', return_value={'description': 'desc'}) as mock_info, \
+         patch('modules.routes.home.create_all_candlestick_charts',
+               return_value={'daily_chart_json': '{"data": [], "layout": {}}'}):
+        yield mock_prices, mock_info
+
+
+class TestAnalyzePermalink:
+
+    def test_post_redirects_to_get_permalink(self, logged_in_client):
+        response = logged_in_client.post('/analyze', data={'ticker': 'test'})
+        assert response.status_code == 303
+        assert response.headers['Location'].endswith('/analyze/TEST')
+
+    def test_post_with_invalid_ticker_returns_home(self, logged_in_client):
+        response = logged_in_client.post('/analyze', data={'ticker': ''})
+        assert response.status_code == 302
+
+    def test_get_sets_validators_and_renders(self, logged_in_client, mocked_analysis):
+        response = logged_in_client.get('/analyze/TEST')
+        assert response.status_code == 200
+        assert response.headers['ETag'].startswith('W/')
+        # הבר האחרון: 2024-01-04 בשעון ניו-יורק
+        assert response.headers['Last-Modified'] == 'Thu, 04 Jan 2024 05:00:00 GMT'
+        assert 'private' in response.headers['Cache-Control']
+        assert b'/analyze/TEST/charts.json' in response.data
+
+    def test_conditional_request_skips_pipeline(self, logged_in_client, mocked_analysis):
+        _, mock_info = mocked_analysis
+        etag = logged_in_client.get('/analyze/TEST').headers['ETag']
+        mock_info.reset_mock()
+
+        response = logged_in_client.get('/analyze/TEST', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        mock_info.assert_not_called()
+
+        response = logged_in_client.get('/analyze/TEST', headers={'If-Modified-Since': 'Fri, 05 Jan 2024 00:00:00 GMT'})
+        assert response.status_code == 304
+
+    def test_compressed_etag_revalidates(self, logged_in_client, mocked_analysis):
+        headers = {'Accept-Encoding': 'gzip, br'}
+        first = logged_in_client.get('/analyze/TEST', headers=headers)
+        etag = first.headers['ETag']
+        assert etag.endswith(':br"') or etag.endswith(':gzip"')
+        with logged_in_client.session_transaction() as sess:
+            sess.pop('selected_ticker', None)
+
+        response = logged_in_client.get('/analyze/TEST', headers=dict(
+            headers, **{'If-None-Match': etag, 'If-Modified-Since': first.headers['Last-Modified']}))
+        assert response.status_code == 304
+        with logged_in_client.session_transaction() as sess:
+            assert sess['selected_ticker'] == 'TEST'
+
+    def test_new_close_changes_etag(self, logged_in_client, mocked_analysis):
+        mock_prices, _ = mocked_analysis
+        etag = logged_in_client.get('/analyze/TEST').headers['ETag']
+        mock_prices.return_value = make_prices(last_close=12.5)
+        response = logged_in_client.get('/analyze/TEST', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
+    def test_etag_follows_session_and_csrf_token_age(self, app, logged_in_client, mocked_analysis):
+        etag = logged_in_client.get('/analyze/TEST').headers['ETag']
+
+        # סשן אחר (למשל אחרי התחברות מחדש) - טוקן CSRF אחר בדף
+        other = app.test_client()
+        with other.session_transaction() as sess:
+            sess['_user_id'] = '1'
+        assert other.get('/analyze/TEST', headers={'If-None-Match': etag}).status_code == 200
+
+        # אחרי חצי מזמן החיים של הטוקן הדף נבנה מחדש עם טוקן חדש
+        now = time.time()
+        with patch('modules.routes.home.time.time', return_value=now + app.config.get('WTF_CSRF_TIME_LIMIT', 3600)):
+            response = logged_in_client.get('/analyze/TEST', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
+    def test_pending_flash_is_not_answered_with_304(self, logged_in_client, mocked_analysis):
+        etag = logged_in_client.get('/analyze/TEST').headers['ETag']
+        with logged_in_client.session_transaction() as sess:
+            sess['_flashes'] = [('info', 'hello')]
+        response = logged_in_client.get('/analyze/TEST', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert 'hello' in response.get_data(as_text=True)
+        assert 'ETag' not in response.headers
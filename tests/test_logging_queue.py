@@ -0,0 +1,121 @@
+# tests/test_logging_queue.py
+import logging
+import os
+import queue
+import time
+
+from app.logging_queue import HostLogWriter, LazyQueueHandler
+
+
+class _Exploding:
+    """Argument whose rendering would fail if it happened on the calling thread."""
+    rendered = 0
+
+    def __str__(self):
+        _Exploding.rendered += 1
+        return 'rendered'
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+class TestLazyQueueHandler:
+
+    def test_arguments_are_not_formatted_on_the_calling_thread(self):
+        log_queue = queue.SimpleQueue()
+        logger = logging.getLogger('test.lazy_queue')
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        handler = LazyQueueHandler(log_queue)
+        logger.addHandler(handler)
+        try:
+            logger.info('value: %s', _Exploding())
+            assert _Exploding.rendered == 0
+            record = log_queue.get_nowait()
+            assert record.getMessage() == 'value: rendered'
+        finally:
+            logger.removeHandler(handler)
+
+
+class TestHostLogWriter:
+
+    def test_second_process_forwards_to_the_writer(self, tmp_path):
+        log_file = tmp_path / 'app.log'
+        lock_path, socket_path = str(tmp_path / 'app.log.writer.lock'), str(tmp_path / 'app.log.sock')
+        writer = HostLogWriter(logging.FileHandler(str(log_file)), lock_path, socket_path)
+        # אותה נעילה מ-handler נוסף מתנהגת כמו worker אחר על אותו host
+        follower = HostLogWriter(logging.FileHandler(str(tmp_path / 'unused.log')), lock_path, socket_path)
+        try:
+            assert writer.is_writer and not follower.is_writer
+            follower.handle(logging.makeLogRecord({'msg': 'from follower %s', 'args': (2,)}))
+            writer.handle(logging.makeLogRecord({'msg': 'from writer'}))
+            assert _wait_for(lambda: 'from follower 2' in log_file.read_text())
+            assert 'from writer' in log_file.read_text()
+            assert (tmp_path / 'unused.log').read_text() == ''
+        finally:
+            follower.close()
+            writer.close()
+
+    def test_follower_takes_over_when_writer_is_gone(self, tmp_path):
+        lock_path, socket_path = str(tmp_path / 'app.log.writer.lock'), str(tmp_path / 'app.log.sock')
+        writer = HostLogWriter(logging.FileHandler(str(tmp_path / 'first.log')), lock_path, socket_path)
+        follower_log = tmp_path / 'second.log'
+        follower = HostLogWriter(logging.FileHandler(str(follower_log)), lock_path, socket_path)
+        try:
+            writer.close()
+            follower.handle(logging.makeLogRecord({'msg': 'after takeover'}))
+            assert follower.is_writer
+            assert 'after takeover' in follower_log.read_text()
+        finally:
+            follower.close()
+
+    def test_follower_writes_locally_when_writer_is_unreachable(self, tmp_path):
+        lock_path, socket_path = str(tmp_path / 'app.log.writer.lock'), str(tmp_path / 'app.log.sock')
+        writer = HostLogWriter(logging.FileHandler(str(tmp_path / 'first.log')), lock_path, socket_path)
+        follower_log = tmp_path / 'second.log'
+        follower = HostLogWriter(logging.FileHandler(str(follower_log)), lock_path, socket_path)
+        try:
+            # הכותב עדיין מחזיק בנעילה אבל כבר לא מקבל חיבורים
+            writer._server.shutdown()
+            writer._server.server_close()
+            follower.handle(logging.makeLogRecord({'msg': 'not lost'}))
+            assert not follower.is_writer
+            assert 'not lost' in follower_log.read_text()
+        finally:
+            follower.close()
+            writer._server = None
+            writer.close()
+
+
+class TestQueueLoggingAfterFork:
+
+    def test_forked_child_logs_through_the_writer(self, app, tmp_path):
+        from app.logging_queue import configure_queue_logging, stop_queue_logging
+        log_file = tmp_path / 'fork.log'
+        logger = logging.getLogger('test.fork')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        configure_queue_logging(app, logging.INFO, logger=logger, log_file=str(log_file), listener_key='test_fork_listener')
+        try:
+            pid = os.fork()
+            if pid == 0:  # כמו worker של gunicorn --preload
+                code = 1
+                try:
+                    logger.info('from child %s', os.getpid())
+                    stop_queue_logging(app, 'test_fork_listener')
+                    code = 0
+                finally:
+                    os._exit(code)
+            _, status = os.waitpid(pid, 0)
+            assert os.WEXITSTATUS(status) == 0
+            assert _wait_for(lambda: log_file.exists() and f'from child {pid}' in log_file.read_text())
+        finally:
+            stop_queue_logging(app, 'test_fork_listener')
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
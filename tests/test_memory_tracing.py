@@ -0,0 +1,109 @@
+# tests/test_memory_tracing.py
+import glob
+import json
+import os
+import shutil
+import pytest
+
+from app import memory_tracing
+from modules.cache_control import apply_pending_commands
+
+OTHER_PID = 999999
+
+
+@pytest.fixture
+def store_dir(tmp_path):
+    return str(tmp_path / 'snapshots')
+
+
+@pytest.fixture
+def tracing(store_dir):
+    memory_tracing.start_tracing(10)
+    yield memory_tracing
+    memory_tracing.stop_tracing(store_dir)
+
+
+def _as_other_worker(store_dir, snapshot_id):
+    """Copy this worker's snapshot files as if another worker had taken them."""
+    for ext in ('snapshot', 'json'):
+        shutil.copy(os.path.join(store_dir, f'{snapshot_id}.{os.getpid()}.{ext}'),
+                    os.path.join(store_dir, f'{snapshot_id}.{OTHER_PID}.{ext}'))
+    path = os.path.join(store_dir, f'{snapshot_id}.{OTHER_PID}.json')
+    with open(path, encoding='utf-8') as f:
+        summary = json.load(f)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dict(summary, pid=OTHER_PID), f)
+
+
+class TestMemoryTracing:
+
+    def test_snapshot_requires_tracing(self, store_dir):
+        with pytest.raises(RuntimeError):
+            memory_tracing.take_snapshot(store_dir, 1)
+
+    def test_growth_is_attributed_to_project_module(self, tracing, store_dir):
+        first = tracing.take_snapshot(store_dir, tracing.next_snapshot_id(store_dir), 'before')['id']
+        held = ['x' * 1000 + str(i) for i in range(500)]
+        second = tracing.take_snapshot(store_dir, tracing.next_snapshot_id(store_dir), 'after')['id']
+
+        modules = {row['module']: row for row in tracing.diff(store_dir, first, second)['modules']}
+        assert modules['tests.test_memory_tracing']['size_diff_bytes'] > 500 * 1000
+        assert len(held) == 500
+
+    def test_oldest_snapshot_is_dropped(self, tracing, store_dir):
+        ids = [tracing.take_snapshot(store_dir, tracing.next_snapshot_id(store_dir), max_snapshots=2)['id']
+               for _ in range(3)]
+        assert [s['id'] for s in tracing.list_snapshots(store_dir)] == ids[1:]
+        with pytest.raises(KeyError):
+            tracing.top_allocations(store_dir, ids[0])
+
+    def test_other_workers_snapshots_are_readable(self, tracing, store_dir):
+        snapshot_id = tracing.take_snapshot(store_dir, tracing.next_snapshot_id(store_dir))['id']
+        _as_other_worker(store_dir, snapshot_id)
+        assert tracing.top_allocations(store_dir, snapshot_id, pid=OTHER_PID)['pid'] == OTHER_PID
+        assert tracing.top_allocations(store_dir, snapshot_id)['pid'] == os.getpid()
+        tracing.stop_tracing(store_dir)
+        # הקבצים של התהליך האחר נשארים עד שהוא עצמו מפסיק לעקוב
+        assert tracing.top_allocations(store_dir, snapshot_id)['pid'] == OTHER_PID
+
+    def test_module_names(self):
+        assert memory_tracing._module_of(memory_tracing.PROJECT_ROOT + '/modules/price_history.py') == 'modules.price_history'
+        assert memory_tracing._module_of('/usr/lib/python3/site-packages/pandas/core/frame.py') == 'pandas'
+
+
+class TestMemoryAdminApi:
+
+    def test_start_snapshot_diff_stop(self, logged_in_client):
+        assert logged_in_client.post('/admin/api/memory', json={'action': 'start'}).get_json()['tracing']
+        try:
+            first = logged_in_client.post('/admin/api/memory/snapshots', json={'label': 'a'}).get_json()['id']
+            second = logged_in_client.post('/admin/api/memory/snapshots').get_json()['id']
+            top = logged_in_client.get(f'/admin/api/memory/snapshots/{second}?limit=5').get_json()
+            assert len(top['modules']) <= 5 and top['sites']
+            diff = logged_in_client.get(f'/admin/api/memory/diff?from={first}&to={second}')
+            assert diff.status_code == 200
+            assert logged_in_client.get('/admin/api/memory/diff?from=999&to=1000').status_code == 404
+            assert logged_in_client.get(f'/admin/api/memory/snapshots/{second}?pid={OTHER_PID}').status_code == 404
+        finally:
+            assert not logged_in_client.post('/admin/api/memory', json={'action': 'stop'}).get_json()['tracing']
+
+    def test_snapshot_without_tracing_is_conflict(self, logged_in_client):
+        assert logged_in_client.post('/admin/api/memory/snapshots').status_code == 409
+
+    def test_commands_reach_other_workers(self, app):
+        log = app.extensions['cache_command_log']
+        store_dir = app.config['MEMORY_SNAPSHOT_DIR']
+        apply_pending_commands(app, force=True)  # פקודות ישנות של בדיקות אחרות
+
+        # פקודות שתהליך אחר כתב ללוג - התהליך הנוכחי מבצע אותן בבקשה הבאה
+        for command in ({'op': 'memory_start'}, {'op': 'memory_snapshot', 'id': 4242, 'label': 'broadcast'}):
+            with open(log.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(dict(command, pid=OTHER_PID)) + '\n')
+        try:
+            assert apply_pending_commands(app, force=True) == 2
+            assert memory_tracing.top_allocations(store_dir, 4242, pid=os.getpid())['snapshot']['label'] == 'broadcast'
+        finally:
+            with open(log.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'op': 'memory_stop', 'pid': OTHER_PID}) + '\n')
+            apply_pending_commands(app, force=True)
+        assert not glob.glob(os.path.join(store_dir, f'*.{os.getpid()}.snapshot'))
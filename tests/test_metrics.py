@@ -0,0 +1,131 @@
+# tests/test_metrics.py
+import json
+import os
+import pytest
+import pandas as pd
+from unittest.mock import patch
+
+from modules import metrics, price_history
+from modules.metrics import InstrumentedTTLCache, observe_upstream
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def _counter(name, **labels):
+    counters, _ = metrics.collect()
+    return counters.get((name, tuple(sorted(labels.items()))), 0)
+
+
+class TestInstrumentedCache:
+
+    def test_hits_misses_and_evictions(self):
+        cache = InstrumentedTTLCache('test_cache', maxsize=1, ttl=60)
+        assert cache.get('a') is None
+        cache['a'] = 1
+        assert cache['a'] == 1
+        cache['b'] = 2  # דוחק את 'a'
+        assert 'a' not in cache
+        assert _counter('cache_requests_total', cache='test_cache', result='hit') == 1
+        assert _counter('cache_requests_total', cache='test_cache', result='miss') == 1
+        assert _counter('cache_evictions_total', cache='test_cache', reason='size') == 1
+
+
+class TestUpstreamAndRendering:
+
+    def test_upstream_errors_are_counted(self):
+        with observe_upstream('yfinance'):
+            pass
+        with pytest.raises(RuntimeError):
+            with observe_upstream('yfinance'):
+                raise RuntimeError('boom')
+        assert _counter('upstream_requests_total', upstream='yfinance', outcome='ok') == 1
+        assert _counter('upstream_requests_total', upstream='yfinance', outcome='error') == 1
+
+    def test_swallowed_upstream_failures_are_counted(self, app):
+        with observe_upstream('yfinance') as call:
+            call.mark_failed()
+        assert _counter('upstream_requests_total', upstream='yfinance', outcome='error') == 1
+
+        # yfinance מחזיר מסגרת ריקה במקום לזרוק כשהבקשה נכשלת
+        price_history.price_data_cache.clear()
+        with app.app_context(), \
+             patch('modules.price_history.yf.Ticker') as mock_ticker, \
+             patch('modules.price_history.get_http_session', return_value=None):
+            mock_ticker.return_value.history.return_value = pd.DataFrame()
+            assert price_history.get_price_history('NOPE', '1y', '1d').empty
+        price_history.price_data_cache.clear()
+        assert _counter('upstream_requests_total', upstream='yfinance', outcome='error') == 2
+        assert _counter('upstream_requests_total', upstream='yfinance', outcome='ok') == 0
+
+    def test_histogram_exposition(self):
+        metrics.observe('upstream_request_duration_seconds', 0.02, upstream='translator')
+        metrics.observe('upstream_request_duration_seconds', 3.0, upstream='translator')
+        text = metrics.render_prometheus()
+        assert 'upstream_request_duration_seconds_bucket{upstream="translator",le="0.025"} 1' in text
+        assert 'upstream_request_duration_seconds_bucket{upstream="translator",le="+Inf"} 2' in text
+        assert 'upstream_request_duration_seconds_count{upstream="translator"} 2' in text
+
+    def test_other_workers_files_are_summed(self, app):
+        metrics.inc('upstream_requests_total', upstream='yfinance', outcome='ok')
+        other = os.path.join(app.config['METRICS_DIR'], 'metrics-999999.json')
+        with open(other, 'w', encoding='utf-8') as f:
+            json.dump({'counters': [['upstream_requests_total', [['outcome', 'ok'], ['upstream', 'yfinance']], 4]],
+                       'histograms': []}, f)
+        try:
+            assert _counter('upstream_requests_total', upstream='yfinance', outcome='ok') == 5
+        finally:
+            os.remove(other)
+
+
+class TestMetricsEndpoint:
+
+    def test_endpoint_reports_request_latency(self, client):
+        client.get('/auth/login')
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+        assert 'http_request_duration_seconds_count{endpoint="auth.login",method="GET",status="2xx"} 1' in response.get_data(as_text=True)
+
+    def test_token_is_required_when_configured(self, app, client):
+        app.config['METRICS_TOKEN'] = 'secret'
+        try:
+            assert client.get('/metrics').status_code == 401
+            assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+        finally:
+            app.config['METRICS_TOKEN'] = None
+
+
+class TestPerformancePanel:
+
+    def test_snapshot_reports_caches_tickers_and_slow_requests(self, app, logged_in_client):
+        from modules.price_history import price_data_cache_lock
+        import pandas as pd
+        with price_data_cache_lock:
+            price_history.price_data_cache[('PERF', '10y', '1d')] = pd.DataFrame({'Close': [1.0] * 100})
+        metrics.record_ticker_request('PERF')
+        metrics.record_ticker_request('PERF')
+        metrics.inc('upstream_requests_total', upstream='yfinance', outcome='error')
+        app.config['SLOW_REQUEST_THRESHOLD_MS'] = 0
+        try:
+            logged_in_client.get('/auth/login')
+            data = logged_in_client.get('/admin/api/performance').get_json()
+        finally:
+            app.config['SLOW_REQUEST_THRESHOLD_MS'] = 1000
+            with price_data_cache_lock:
+                price_history.price_data_cache.pop(('PERF', '10y', '1d'), None)
+
+        price = next(c for c in data['caches'] if c['name'] == 'price_data_cache')
+        assert price['entries'] >= 1 and price['memory_bytes'] >= 800
+        assert data['top_tickers'][0] == ['PERF', 2]
+        assert data['upstreams'][0]['error_rate'] == 1.0
+        assert any(slow['path'] == '/auth/login' for slow in data['slow_requests'])
+
+    def test_dashboard_renders_panel(self, logged_in_client):
+        response = logged_in_client.get('/admin/dashboard')
+        assert response.status_code == 200
+        assert b'Recent slow requests' in response.data
@@ -0,0 +1,88 @@
+# tests/test_password_hashing.py
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from werkzeug.security import generate_password_hash
+
+from app.auth import hashing
+from app.auth.hashing import PasswordHasher, PasswordHashQueueTimeout
+from app.models import get_user_manager
+
+FAST_METHOD = 'pbkdf2:sha256:1000'
+
+
+class TestPasswordHasher:
+
+    def test_hash_and_verify_on_pool(self):
+        hasher = PasswordHasher(FAST_METHOD, max_workers=1, queue_timeout=5)
+        stored = hasher.hash('secret1')
+        assert stored.startswith(FAST_METHOD + '$')
+        assert hasher.verify(stored, 'secret1')
+        assert not hasher.verify(stored, 'wrong')
+        stats = hasher.stats()
+        assert stats['completed'] == 3 and stats['timeouts'] == 0 and stats['queued'] == 0
+
+    def test_needs_rehash_compares_parameters(self):
+        hasher = PasswordHasher(FAST_METHOD, max_workers=1, queue_timeout=5)
+        assert not hasher.needs_rehash(generate_password_hash('x', FAST_METHOD))
+        assert hasher.needs_rehash(generate_password_hash('x', 'pbkdf2:sha256:2000'))
+
+    def test_needs_rehash_applies_werkzeug_defaults(self):
+        hasher = PasswordHasher('scrypt', max_workers=1, queue_timeout=5)
+        assert not hasher.needs_rehash('scrypt:32768:8:1$salt$digest')
+        assert hasher.needs_rehash('scrypt:16384:8:1$salt$digest')
+        hasher = PasswordHasher('pbkdf2', max_workers=1, queue_timeout=5)
+        assert not hasher.needs_rehash(generate_password_hash('x', 'pbkdf2:sha256'))
+        assert hasher.needs_rehash(generate_password_hash('x', FAST_METHOD))
+        assert hasher.needs_rehash('plaintext-from-an-old-import')
+
+    def test_queue_timeout_when_pool_is_busy(self):
+        hasher = PasswordHasher(FAST_METHOD, max_workers=1, queue_timeout=0.05)
+        release = threading.Event()
+        blocker = threading.Thread(target=hasher._run, args=(release.wait, 2))
+        blocker.start()
+        time.sleep(0.02)
+        with pytest.raises(PasswordHashQueueTimeout):
+            hasher.hash('secret1')
+        release.set()
+        blocker.join()
+        stats = hasher.stats()
+        assert stats['timeouts'] == 1
+        assert stats['queued'] == 0
+
+
+@pytest.fixture
+def fast_hasher(app):
+    hasher = PasswordHasher(FAST_METHOD, max_workers=1, queue_timeout=5)
+    with patch.object(hashing, '_hasher', hasher):
+        yield hasher
+
+
+class TestLoginRehash:
+
+    def test_login_upgrades_outdated_hash(self, app, client, fast_hasher):
+        with app.app_context():
+            manager = get_user_manager()
+            user = manager.add_user('rehash_me', generate_password_hash('secret1', 'pbkdf2:sha256:2000'), is_approved=True)
+        try:
+            response = client.post('/auth/login', data={'username': 'rehash_me', 'password': 'secret1'})
+            assert response.status_code == 302
+            for _ in range(100):  # ההחלפה רצה ברקע על ה-pool
+                with app.app_context():
+                    stored = manager.get_user(user.id).password_hash
+                if stored.startswith(FAST_METHOD + '$'):
+                    break
+                time.sleep(0.01)
+            assert stored.startswith(FAST_METHOD + '$')
+            assert fast_hasher.stats()['rehashes'] == 1
+        finally:
+            client.get('/auth/logout')
+            with app.app_context():
+                manager.delete_user(user.id)
+
+    def test_login_is_shed_with_503_when_queue_times_out(self, app, client):
+        with patch('app.auth.hashing.PasswordHasher.verify', side_effect=PasswordHashQueueTimeout('busy')):
+            response = client.post('/auth/login', data={'username': 'admin', 'password': 'whatever'})
+        assert response.status_code == 503
+        assert 'Retry-After' in response.headers
@@ -0,0 +1,85 @@
+# tests/test_payload_cache.py
+import gzip
+import json
+import pandas as pd
+import pytest
+from unittest.mock import patch
+
+from modules import payload_cache
+from modules.payload_cache import CompressedPayload, get_or_build_payload
+
+CHARTS = {
+    'daily_chart_json': json.dumps({'data': [{'y': list(range(200))}], 'layout': {'title': 'daily'}}),
+    'weekly_chart_json': json.dumps({'data': [{'y': [1, 2]}], 'layout': {'title': 'weekly'}}),
+    'monthly_chart_json': None,
+}
+
+
+@pytest.fixture(autouse=True)
+def clear_payload_cache():
+    payload_cache.payload_cache.clear()
+    yield
+    payload_cache.payload_cache.clear()
+
+
+class TestCompressedPayload:
+
+    def test_variants_decode_to_the_same_body(self):
+        body = b'{"a": 1}' * 100
+        payload = CompressedPayload(body)
+        assert gzip.decompress(payload.bodies['gzip']) == body
+        assert len(payload.bodies['gzip']) < len(body)
+        assert payload.etag == CompressedPayload(body).etag
+
+    def test_builder_runs_once_and_none_is_not_cached(self):
+        calls = []
+
+        def _builder():
+            calls.append(1)
+            return CompressedPayload(b'{}')
+
+        first = get_or_build_payload('k', _builder)
+        assert get_or_build_payload('k', _builder) is first
+        assert len(calls) == 1
+        assert get_or_build_payload('missing', lambda: None) is None
+        assert 'missing' not in payload_cache.payload_cache
+
+
+class TestChartsEndpoint:
+
+    def _get(self, client, **headers):
+        with patch('modules.routes.home.is_price_data_cached', return_value=True), \
+             patch('modules.routes.home.get_company_name', return_value='Test Co'), \
+             patch('modules.routes.home.get_price_history', return_value=pd.DataFrame({'Close': [1.0]})), \
+             patch('modules.routes.home.create_all_candlestick_charts', return_value=CHARTS) as mock_charts:
+            response = client.get('/analyze/TEST/charts.json', headers=headers)
+        return response, mock_charts
+
+    def test_serves_precompressed_gzip_with_etag(self, logged_in_client):
+        response, _ = self._get(logged_in_client, **{'Accept-Encoding': 'gzip'})
+        assert response.status_code == 200
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        bundle = json.loads(gzip.decompress(response.data))
+        assert set(bundle) == {'daily_chart_json', 'weekly_chart_json'}
+        assert bundle['weekly_chart_json']['layout']['title'] == 'weekly'
+
+    def test_repeat_hit_is_cached_and_revalidates(self, logged_in_client):
+        first, mock_charts = self._get(logged_in_client)
+        etag = first.headers['ETag']
+        second, mock_charts = self._get(logged_in_client, **{'If-None-Match': etag})
+        assert second.status_code == 304
+        mock_charts.assert_not_called()
+
+    def test_identity_when_client_accepts_no_compression(self, logged_in_client):
+        response, _ = self._get(logged_in_client, **{'Accept-Encoding': 'identity'})
+        assert 'Content-Encoding' not in response.headers
+        assert json.loads(response.data)['daily_chart_json']['layout']['title'] == 'daily'
+
+
+class TestResponseCompression:
+
+    def test_html_pages_are_compressed(self, logged_in_client):
+        response = logged_in_client.get('/compare/', headers={'Accept-Encoding': 'gzip'})
+        assert response.status_code == 200
+        assert response.headers.get('Content-Encoding') == 'gzip'
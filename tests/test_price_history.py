@@ -0,0 +1,214 @@
+# tests/test_price_history.py
+import pytest
+import pandas as pd
+from unittest.mock import PropertyMock, patch
+
+from modules import price_history
+from modules.price_history import prefetch_price_histories, get_price_history, is_price_data_cached, start_price_prewarm
+
+
+def make_batch_frame(tickers, rows=3):
+    index = pd.date_range('2024-01-02', periods=rows, freq='B')
+    frames = {}
+    for i, ticker in enumerate(tickers):
+        base = 10.0 * (i + 1)
+        frames[ticker] = pd.DataFrame({
+            'Open': base, 'High': base + 1, 'Low': base - 1, 'Close': base, 'Volume': 1000,
+        }, index=index)
+    return pd.concat(frames, axis=1)
+
+
+@pytest.fixture(autouse=True)
+def clear_price_cache():
+    price_history.price_data_cache.clear()
+    yield
+    price_history.price_data_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def exchange_timezone():
+    # yf.download שומר את אזור הזמן של כל טיקר בקאש של yfinance; כאן ההורדה מדומה
+    with patch('modules.price_history.yf.cache.get_tz_cache') as mock_cache:
+        mock_cache.return_value.lookup.return_value = 'America/New_York'
+        yield mock_cache
+
+
+class TestBatchPrefetch:
+
+    def test_batch_download_fans_out_into_cache(self, app):
+        with app.app_context(), \
+             patch('modules.price_history.yf.download', side_effect=lambda group, **kw: make_batch_frame(group)) as mock_download, \
+             patch('modules.price_history.get_http_session', return_value=None):
+            fetched = prefetch_price_histories(['AAA', 'BBB', 'CCC'], period='1y', interval='1d', group_size=2)
+            assert set(fetched) == {'AAA', 'BBB', 'CCC'}
+            assert mock_download.call_count == 2  # שתי קבוצות: [AAA, BBB], [CCC]
+            assert is_price_data_cached('aaa', '1y', '1d')
+
+            with patch('modules.price_history.yf.Ticker') as mock_ticker:
+                hist = get_price_history('BBB', period='1y', interval='1d')
+                mock_ticker.assert_not_called()
+            assert hist['Close'].iloc[0] == 20.0
+
+    def test_cached_tickers_are_skipped(self, app):
+        with app.app_context(), \
+             patch('modules.price_history.yf.download', side_effect=lambda group, **kw: make_batch_frame(group)) as mock_download, \
+             patch('modules.price_history.get_http_session', return_value=None):
+            prefetch_price_histories(['AAA'], period='1y', interval='1d')
+            prefetch_price_histories(['AAA', 'BBB'], period='1y', interval='1d')
+        assert mock_download.call_args_list[1].args[0] == ['BBB']
+
+    @pytest.mark.parametrize('interval, batch_tz', [('1d', None), ('1h', 'UTC')])
+    def test_batch_and_single_fetch_share_index_timezone(self, app, interval, batch_tz):
+        batch = make_batch_frame(['AAA'])
+        batch.index = batch.index.tz_localize(batch_tz) if batch_tz else batch.index
+        single = make_batch_frame(['BBB'])['BBB']
+        single.index = single.index.tz_localize('America/New_York')  # כמו Ticker.history
+        with app.app_context(), \
+             patch('modules.price_history.yf.download', return_value=batch), \
+             patch('modules.price_history.yf.Ticker') as mock_ticker, \
+             patch('modules.price_history.get_http_session', return_value=None):
+            mock_ticker.return_value.history.return_value = single
+            prefetch_price_histories(['AAA'], period='1y', interval=interval)
+            from_batch = get_price_history('AAA', period='1y', interval=interval)
+            from_single = get_price_history('BBB', period='1y', interval=interval)
+        assert str(from_batch.index.tz) == str(from_single.index.tz) == 'America/New_York'
+        if batch_tz is None:
+            # יומי: אותו תאריך מקומי, לא הזזה של שעות
+            assert from_batch.index[0] == pd.Timestamp('2024-01-02', tz='America/New_York')
+
+    def test_ticker_without_known_timezone_is_not_cached(self, app, exchange_timezone):
+        exchange_timezone.return_value.lookup.return_value = None
+        with app.app_context(), \
+             patch('modules.price_history.yf.download', return_value=make_batch_frame(['AAA'])), \
+             patch('modules.price_history.get_http_session', return_value=None):
+            assert prefetch_price_histories(['AAA'], period='1y', interval='1d') == {}
+        assert not is_price_data_cached('AAA', '1y', '1d')
+
+    def test_missing_tickers_are_not_cached(self, app):
+        with app.app_context(), \
+             patch('modules.price_history.yf.download', return_value=make_batch_frame(['AAA'])), \
+             patch('modules.price_history.get_http_session', return_value=None):
+            fetched = prefetch_price_histories(['AAA', 'NOPE'], period='1y', interval='1d')
+        assert list(fetched) == ['AAA']
+        assert not is_price_data_cached('NOPE', '1y', '1d')
+
+
+class TestPooledHttpSession:
+
+    class FakeResponse:
+        def __init__(self, infos):
+            self.infos = infos
+
+    def test_pool_stats_track_reuse_per_host(self):
+        from curl_cffi import CurlInfo
+        from curl_cffi import requests as curl_requests
+        from modules.http_session import PooledSession, PoolStats
+
+        stats = PoolStats()
+        session = PooledSession(stats)
+        responses = [
+            self.FakeResponse({CurlInfo.NUM_CONNECTS: 1, CurlInfo.APPCONNECT_TIME: 0.05, CurlInfo.TOTAL_TIME: 0.2}),
+            self.FakeResponse({CurlInfo.NUM_CONNECTS: 0, CurlInfo.APPCONNECT_TIME: 0.0, CurlInfo.TOTAL_TIME: 0.1}),
+        ]
+        with patch.object(curl_requests.Session, 'request', side_effect=responses):
+            session.get('https://query1.finance.yahoo.com/v8/finance/chart/AAPL')
+            session.get('https://query1.finance.yahoo.com/v8/finance/chart/MSFT')
+
+        host_stats = stats.snapshot()['query1.finance.yahoo.com']
+        assert host_stats['requests'] == 2
+        assert host_stats['new_connections'] == 1
+        assert host_stats['reuse_ratio'] == pytest.approx(0.5)
+        assert host_stats['avg_handshake_ms'] == pytest.approx(25.0)
+
+    def test_errors_are_counted(self):
+        from curl_cffi import requests as curl_requests
+        from modules.http_session import PooledSession, PoolStats
+
+        stats = PoolStats()
+        session = PooledSession(stats)
+        with patch.object(curl_requests.Session, 'request', side_effect=RuntimeError('boom')):
+            with pytest.raises(RuntimeError):
+                session.get('https://translate.google.com/m')
+        assert stats.snapshot()['translate.google.com']['errors'] == 1
+
+    def test_translator_uses_shared_session(self):
+        from deep_translator import google as google_translator_module
+        from modules.http_session import install_translator_session
+
+        original = google_translator_module.requests
+        try:
+            with patch('modules.http_session.get_http_session') as mock_session:
+                install_translator_session()
+                google_translator_module.requests.get('https://translate.google.com/m', params={'q': 'x'})
+            mock_session.return_value.get.assert_called_once_with('https://translate.google.com/m', params={'q': 'x'})
+        finally:
+            google_translator_module.requests = original
+
+    def test_only_prewarm_is_limited_to_free_capacity(self, app):
+        with patch.dict(app.config, {'PRICE_DATA_CACHE_MAXSIZE': 3}):
+            price_history.configure_price_cache(app)
+        try:
+            with app.app_context(), \
+                 patch('modules.price_history.yf.download', side_effect=lambda group, **kw: make_batch_frame(group)) as mock_download, \
+                 patch('modules.price_history.get_http_session', return_value=None):
+                prefetch_price_histories(['AAA'], period='1y', interval='1d')
+                start_price_prewarm(app, ['BBB', 'CCC', 'DDD', 'EEE'], period='1y', interval='1d').join()
+                # נשארו שני מקומות: ה-prewarm לא דוחק את הטיקר שנטען בבקשה
+                assert mock_download.call_args_list[1].args[0] == ['BBB', 'CCC']
+                assert is_price_data_cached('AAA', '1y', '1d')
+                # מסלול ההשוואה של המשתמש לא מוגבל - הקאש דוחק כרגיל
+                fetched = prefetch_price_histories(['FFF', 'GGG'], period='1y', interval='1d')
+            assert list(fetched) == ['FFF', 'GGG']
+        finally:
+            price_history.configure_price_cache(app)
+
+    def test_cache_is_built_from_config(self, app):
+        original = price_history.price_data_cache
+        price_history.configure_price_cache(app)
+        assert price_history.price_data_cache is original  # אותה קונפיגורציה - הקאש נשמר
+        try:
+            with patch.dict(app.config, {'PRICE_DATA_CACHE_MAXSIZE': 7}):
+                price_history.configure_price_cache(app)
+            assert price_history.price_data_cache.maxsize == 7
+            with app.app_context(), patch('modules.price_history.yf.Ticker') as mock_ticker, \
+                 patch('modules.price_history.get_http_session', return_value=None):
+                mock_ticker.return_value.history.return_value = make_batch_frame(['AAA'])['AAA']
+                get_price_history('AAA', '1y', '1d')
+                get_price_history('AAA', '1y', '1d')
+            # get_price_history משתמש בקאש החדש
+            assert mock_ticker.call_count == 1
+            assert is_price_data_cached('AAA', '1y', '1d')
+        finally:
+            price_history.price_data_cache = original
+
+    def test_translator_throttling_is_not_cached(self, app):
+        from modules.rate_limiter import UpstreamRateLimitExceeded
+
+        def acquire(upstream):
+            if upstream == 'translator':
+                raise UpstreamRateLimitExceeded('translator busy')
+
+        price_history.company_info_cache.clear()
+        with app.app_context(), \
+             patch('modules.price_history.acquire_upstream', side_effect=acquire), \
+             patch('modules.price_history.get_http_session', return_value=None), \
+             patch('modules.price_history.yf.Ticker') as mock_ticker:
+            mock_ticker.return_value.info = {'longName': 'Busy Co', 'longBusinessSummary': 'Makes things.'}
+            with pytest.raises(UpstreamRateLimitExceeded):
+                price_history.get_company_info('BUSY')
+        assert len(price_history.company_info_cache) == 0
+
+    def test_failed_fundamentals_are_not_cached(self, app):
+        price_history.fundamentals_cache.clear()
+        info = {'currentPrice': 12.5, 'sector': 'Tech', 'longName': 'Flaky Co'}
+        with app.app_context(), \
+             patch('modules.price_history.acquire_upstream'), \
+             patch('modules.price_history.get_http_session', return_value=None), \
+             patch('modules.price_history.yf.Ticker') as mock_ticker:
+            type(mock_ticker.return_value).info = PropertyMock(side_effect=[ConnectionError('reset'), {}, info])
+            assert price_history.get_fundamentals('FLAKY') == {}
+            assert price_history.get_fundamentals('FLAKY') == {}  # info ריק הוא כישלון ולא "אין נתונים"
+            assert price_history.get_fundamentals('FLAKY')['currentPrice'] == 12.5
+            assert price_history.get_fundamentals('FLAKY')['name'] == 'Flaky Co'
+        assert mock_ticker.call_count == 3
+        price_history.fundamentals_cache.clear()
@@ -0,0 +1,99 @@
+# tests/test_profiling.py
+import time
+import pytest
+
+from app import profiling
+
+
+@pytest.fixture
+def profile_dir(app, tmp_path, monkeypatch):
+    directory = str(tmp_path / 'profiles')
+    monkeypatch.setitem(app.config, 'PROFILE_DIR', directory)
+    yield directory
+    for session in profiling.list_sessions(directory):
+        if session['active']:
+            profiling.stop_session(directory, session['id'])
+
+
+class TestProfilingSessions:
+
+    def test_requires_exactly_one_selection(self, profile_dir):
+        with pytest.raises(ValueError):
+            profiling.start_session(profile_dir, None)
+        with pytest.raises(ValueError):
+            profiling.start_session(profile_dir, None, requests=1, sample_rate=0.5)
+        with pytest.raises(ValueError):
+            profiling.start_session(profile_dir, None, mode='perf', requests=1)
+
+    def test_stop_removes_active_session(self, profile_dir):
+        session = profiling.start_session(profile_dir, None, requests=1)
+        assert [s['id'] for s in profiling.list_sessions(profile_dir)] == [session['id']]
+        assert profiling.stop_session(profile_dir, session['id'])
+        assert not profiling.stop_session(profile_dir, session['id'])
+        assert profiling.list_sessions(profile_dir) == []
+
+    def test_stack_sampler_collects_collapsed_stacks(self):
+        import threading
+        sampler = profiling._StackSampler(threading.get_ident(), 0.001)
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            sum(range(1000))
+        samples = sampler.stop()
+        assert samples
+        assert all('test_profiling.py:test_stack_sampler_collects_collapsed_stacks' in stack for stack in samples)
+
+
+class TestProfileAdminApi:
+
+    def test_profiles_next_n_requests_and_downloads(self, app, logged_in_client, profile_dir):
+        response = logged_in_client.post('/admin/api/profile', json={'endpoint': 'admin.performance_stats', 'requests': 2})
+        assert response.status_code == 201
+        session_id = response.get_json()['id']
+
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(profiling, '_poll_interval', 0)
+            for _ in range(3):
+                logged_in_client.get('/admin/api/performance')
+
+        download = logged_in_client.get(f'/admin/api/profile/{session_id}/download?format=text')
+        assert download.status_code == 200
+        assert b'performance_stats' in download.data
+        assert 'attachment' in download.headers['Content-Disposition']
+        assert profiling._taken[session_id] == 2
+
+    def test_rejects_unknown_endpoint(self, logged_in_client, profile_dir):
+        response = logged_in_client.post('/admin/api/profile', json={'endpoint': 'nope.view', 'requests': 1})
+        assert response.status_code == 400
+
+    @pytest.mark.parametrize('duration', [-5, 0, 'nan', 'inf'])
+    def test_rejects_duration_that_is_not_positive_and_finite(self, logged_in_client, profile_dir, duration):
+        response = logged_in_client.post('/admin/api/profile', json={'requests': 1, 'duration': duration})
+        assert response.status_code == 400
+        assert logged_in_client.get('/admin/api/profile').get_json()['sessions'] == []
+
+    def test_download_without_data_is_404(self, logged_in_client, profile_dir):
+        assert logged_in_client.get('/admin/api/profile/abc123/download').status_code == 404
+
+    def test_busy_slot_does_not_use_up_budget(self, app, logged_in_client, profile_dir):
+        session_id = logged_in_client.post('/admin/api/profile', json={'endpoint': 'admin.performance_stats',
+                                                                       'requests': 1}).get_json()['id']
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(profiling, '_poll_interval', 0)
+            # בקשה אחרת כבר מפרופלת - הבקשה הזו לא מפרופלת ולכן לא נספרת
+            with profiling._profile_slot:
+                logged_in_client.get('/admin/api/performance')
+            assert profiling._taken[session_id] == 0
+            logged_in_client.get('/admin/api/performance')
+        assert profiling._taken[session_id] == 1
+
+    def test_stopped_session_state_is_pruned(self, app, logged_in_client, profile_dir):
+        session_id = logged_in_client.post('/admin/api/profile', json={'endpoint': 'admin.performance_stats',
+                                                                       'requests': 1}).get_json()['id']
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(profiling, '_poll_interval', 0)
+            logged_in_client.get('/admin/api/performance')
+        assert session_id in profiling._aggregates
+        assert logged_in_client.delete(f'/admin/api/profile/{session_id}').status_code == 200
+        assert session_id not in profiling._taken and session_id not in profiling._aggregates
+        # התוצאות שנאספו נשארות להורדה
+        assert logged_in_client.get(f'/admin/api/profile/{session_id}/download?format=text').status_code == 200
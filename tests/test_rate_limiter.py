@@ -0,0 +1,81 @@
+# tests/test_rate_limiter.py
+import threading
+import time
+import pytest
+
+from modules.rate_limiter import (
+    FairTokenBucket, UpstreamRateLimitExceeded, PRIORITY_INTERACTIVE, PRIORITY_PREFETCH,
+    current_upstream_identity, upstream_identity,
+)
+
+
+def drain(bucket):
+    while bucket._tokens >= 1.0:
+        bucket.acquire('drain')
+
+
+class TestFairTokenBucket:
+
+    def test_burst_is_granted_without_waiting(self):
+        bucket = FairTokenBucket(rate=1.0, burst=3)
+        waits = [bucket.acquire('user:1') for _ in range(3)]
+        assert waits == [0.0, 0.0, 0.0]
+        assert bucket.stats()['priorities']['interactive']['granted'] == 3
+
+    def test_timeout_raises_and_is_counted(self):
+        bucket = FairTokenBucket(rate=0.5, burst=1)
+        drain(bucket)
+        with pytest.raises(UpstreamRateLimitExceeded):
+            bucket.acquire('user:1', timeout=0.05)
+        stats = bucket.stats()['priorities']['interactive']
+        assert stats['timeouts'] == 1
+        assert stats['queue_depth'] == 0
+
+    def _run_queued(self, bucket, callers):
+        """Queue callers (identity, priority) while the bucket is empty; return grant order."""
+        order = []
+        order_lock = threading.Lock()
+
+        def _call(identity, priority):
+            bucket.acquire(identity, priority, timeout=5)
+            with order_lock:
+                order.append(identity)
+
+        threads = []
+        for identity, priority in callers:
+            thread = threading.Thread(target=_call, args=(identity, priority))
+            thread.start()
+            threads.append(thread)
+            time.sleep(0.01)  # סדר כניסה לתור דטרמיניסטי
+        for thread in threads:
+            thread.join()
+        return order
+
+    def test_users_are_served_round_robin(self):
+        bucket = FairTokenBucket(rate=20.0, burst=1)
+        drain(bucket)
+        # משתמש א' מציף את התור לפני שמשתמש ב' מגיע
+        callers = [('user:a', PRIORITY_INTERACTIVE)] * 4 + [('user:b', PRIORITY_INTERACTIVE)]
+        order = self._run_queued(bucket, callers)
+        assert order.index('user:b') <= 2
+
+    def test_interactive_is_served_before_prefetch(self):
+        bucket = FairTokenBucket(rate=20.0, burst=1)
+        drain(bucket)
+        callers = [('system', PRIORITY_PREFETCH)] * 4 + [('user:1', PRIORITY_INTERACTIVE)]
+        order = self._run_queued(bucket, callers)
+        assert order.index('user:1') <= 1
+        stats = bucket.stats()['priorities']
+        assert stats['prefetch']['granted'] == 4
+        assert stats['prefetch']['max_wait_seconds'] > 0
+
+
+class TestUpstreamIdentity:
+
+    def test_identity_defaults_to_system_outside_requests(self):
+        assert current_upstream_identity() == 'system'
+
+    def test_identity_override(self):
+        with upstream_identity('user:7'):
+            assert current_upstream_identity() == 'user:7'
+        assert current_upstream_identity() == 'system'
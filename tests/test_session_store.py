@@ -0,0 +1,144 @@
+# tests/test_session_store.py
+import pytest
+from flask import Flask, session
+from werkzeug.security import generate_password_hash
+
+from app.models import get_user_manager
+from app.session_store import SqliteSessionInterface, regenerate_session
+
+
+@pytest.fixture
+def session_app(tmp_path):
+    """אפליקציה מינימלית עם ה-session interface, כדי לבדוק אותו בנפרד."""
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.session_interface = SqliteSessionInterface(str(tmp_path / 'sessions.sqlite3'))
+
+    @app.route('/set/<value>')
+    def set_value(value):
+        session['company_info'] = {'description': value * 2000, 'description_he': 'תיאור'}
+        return 'ok'
+
+    @app.route('/permanent')
+    def make_permanent():
+        session.permanent = True
+        session['company_info'] = {'description': 'x', 'description_he': 'תיאור'}
+        return 'ok'
+
+    @app.route('/get')
+    def get_value():
+        info = session.get('company_info')
+        return info['description_he'] if info else 'none'
+
+    @app.route('/rotate')
+    def rotate():
+        regenerate_session()
+        return 'ok'
+
+    @app.route('/clear')
+    def clear_value():
+        session.clear()
+        return 'ok'
+
+    return app
+
+
+def session_cookie(client, domain='localhost'):
+    cookie = client.get_cookie('session', domain=domain)
+    return cookie.value if cookie else None
+
+
+class TestSqliteSessionInterface:
+
+    def test_cookie_holds_only_the_id(self, session_app):
+        client = session_app.test_client()
+        client.get('/set/x')
+        sid = session_cookie(client)
+        assert sid and len(sid) < 64  # תיאור של 2000 תווים לא נכנס לעוגיה
+        assert client.get('/get').get_data(as_text=True) == 'תיאור'
+        assert session_app.session_interface.count() == 1
+
+    def test_unmodified_session_is_not_rewritten(self, session_app):
+        client = session_app.test_client()
+        client.get('/set/x')
+        response = client.get('/get')
+        assert 'Set-Cookie' not in response.headers
+
+    def test_refreshed_permanent_session_only_touches_expiry(self, session_app):
+        interface = session_app.session_interface
+        client = session_app.test_client()
+        client.get('/permanent')
+        statements = []
+        interface._connect().set_trace_callback(statements.append)
+        try:
+            response = client.get('/get')
+            assert 'Set-Cookie' in response.headers  # SESSION_REFRESH_EACH_REQUEST
+            assert not any(sql.startswith(('INSERT', 'UPDATE')) for sql in statements)
+
+            interface.touch_interval = 0
+            client.get('/get')
+            writes = [sql for sql in statements if sql.startswith(('INSERT', 'UPDATE'))]
+            assert len(writes) == 1 and writes[0].startswith('UPDATE sessions SET expires')
+        finally:
+            interface._connect().set_trace_callback(None)
+        assert client.get('/get').get_data(as_text=True) == 'תיאור'
+
+    def test_unknown_or_cleared_session_starts_empty(self, session_app):
+        client = session_app.test_client()
+        client.set_cookie('session', 'forged-id')
+        assert client.get('/get').get_data(as_text=True) == 'none'
+
+        client.get('/set/x')
+        client.get('/clear')
+        assert session_app.session_interface.count() == 0
+        assert client.get('/get').get_data(as_text=True) == 'none'
+
+    def test_expired_sessions_are_not_loaded(self, session_app):
+        session_app.permanent_session_lifetime = -1
+        client = session_app.test_client()
+        client.get('/set/x')
+        assert client.get('/get').get_data(as_text=True) == 'none'
+
+
+    def test_regenerate_moves_contents_to_new_id(self, session_app):
+        client = session_app.test_client()
+        client.get('/set/x')
+        old_sid = session_cookie(client)
+        client.get('/rotate')
+        assert session_cookie(client) != old_sid
+        assert client.get('/get').get_data(as_text=True) == 'תיאור'
+        assert session_app.session_interface.count() == 1
+
+        # המזהה הישן כבר לא תקף
+        client.set_cookie('session', old_sid)
+        assert client.get('/get').get_data(as_text=True) == 'none'
+
+
+class TestAppSessionStore:
+
+    def test_logged_in_client_uses_server_side_session(self, app, logged_in_client):
+        assert isinstance(app.session_interface, SqliteSessionInterface)
+        assert logged_in_client.get('/compare/').status_code == 200
+
+    def test_login_and_logout_rotate_session_id(self, app, client):
+        with app.app_context():
+            manager = get_user_manager()
+            user = manager.add_user('fixation_check', generate_password_hash('secret1', 'pbkdf2:sha256:1000'), is_approved=True)
+        try:
+            # session שנוצר לפני ההתחברות - המזהה "המושתל"
+            with client.session_transaction() as sess:
+                sess['planted'] = True
+            planted = session_cookie(client, app.config['SERVER_NAME'])
+            assert planted
+
+            assert client.post('/auth/login', data={'username': 'fixation_check', 'password': 'secret1'}).status_code == 302
+            logged_in = session_cookie(client, app.config['SERVER_NAME'])
+            assert logged_in != planted
+
+            client.get('/auth/logout')
+            assert session_cookie(client, app.config['SERVER_NAME']) != logged_in
+            client.set_cookie('session', logged_in, domain=app.config['SERVER_NAME'])
+            assert client.get('/compare/').status_code == 302  # המזהה של לפני היציאה לא מחובר
+        finally:
+            with app.app_context():
+                manager.delete_user(user.id)
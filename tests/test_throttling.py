@@ -0,0 +1,110 @@
+# tests/test_throttling.py
+import threading
+import pytest
+from unittest.mock import patch
+from werkzeug.exceptions import ServiceUnavailable
+
+from app import limiter
+from app.throttling import ConcurrencyGate
+from modules.rate_limiter import UpstreamRateLimitExceeded
+
+
+@pytest.fixture
+def low_limits(app):
+    """מגבלות נמוכות לבדיקה; משוחזרות בסוף כדי לא להשפיע על בדיקות אחרות."""
+    saved = {key: app.config[key] for key in ('CHART_RATE_LIMIT', 'ANALYZE_RATE_LIMIT', 'HEAVY_GLOBAL_RATE_LIMIT')}
+    app.config.update(CHART_RATE_LIMIT='2 per minute', ANALYZE_RATE_LIMIT='2 per minute')
+    limiter.reset()
+    yield app
+    app.config.update(saved)
+    limiter.reset()
+
+
+class TestRateLimits:
+
+    def test_chart_endpoint_returns_429_with_retry_after(self, logged_in_client, low_limits):
+        for _ in range(2):
+            assert logged_in_client.get('/compare/').status_code == 200
+        response = logged_in_client.get('/compare/')
+        assert response.status_code == 429
+        assert 'Retry-After' in response.headers
+
+    def test_chart_bundle_is_throttled(self, logged_in_client, low_limits):
+        with patch('modules.routes.home.get_or_build_payload', return_value=None):
+            for _ in range(2):
+                assert logged_in_client.get('/analyze/TEST/charts.json').status_code == 404
+            assert logged_in_client.get('/analyze/TEST/charts.json').status_code == 429
+
+    def test_global_limit_is_shared_across_endpoints(self, logged_in_client, low_limits):
+        low_limits.config.update(CHART_RATE_LIMIT='100 per minute', HEAVY_GLOBAL_RATE_LIMIT='3 per minute')
+        assert logged_in_client.get('/compare/').status_code == 200
+        assert logged_in_client.get('/compare/correlation').status_code == 200
+        assert logged_in_client.get('/compare/').status_code == 200
+        assert logged_in_client.get('/compare/correlation').status_code == 429
+
+
+class TestColdAnalysisShedding:
+
+    def test_gate_rejects_when_full(self):
+        gate = ConcurrencyGate(1)
+        with gate.slot():
+            with pytest.raises(ServiceUnavailable) as excinfo:
+                with gate.slot(retry_after=7):
+                    pass
+        assert excinfo.value.retry_after == 7
+        assert gate.stats() == {'limit': 1, 'in_flight': 0, 'admitted': 1, 'rejected': 1}
+
+    def test_gate_waits_for_a_free_slot(self):
+        gate = ConcurrencyGate(1)
+        release = threading.Event()
+        holder_ready = threading.Event()
+
+        def _hold():
+            with gate.slot():
+                holder_ready.set()
+                release.wait(1)
+
+        holder = threading.Thread(target=_hold)
+        holder.start()
+        holder_ready.wait(1)
+        threading.Timer(0.05, release.set).start()
+        with gate.slot(wait=1):
+            pass
+        holder.join()
+        assert gate.stats()['admitted'] == 2
+
+    def test_cold_analyze_returns_503_with_retry_after(self, app, logged_in_client):
+        full_gate = ConcurrencyGate(1)
+        app.config['ANALYZE_COLD_WAIT'] = 0
+        try:
+            with patch('app.throttling.get_cold_analysis_gate', return_value=full_gate), \
+                 patch('modules.routes.home.get_price_history') as mock_prices, \
+                 full_gate.slot():
+                response = logged_in_client.get('/analyze/COLD')
+            assert response.status_code == 503
+            # Flask-Limiter משאיר את הערך המאוחר מבין שלנו לבין איפוס חלון המגבלה
+            assert int(response.headers['Retry-After']) >= app.config['ANALYZE_RETRY_AFTER']
+            mock_prices.assert_not_called()
+
+            with patch('app.throttling.get_cold_analysis_gate', return_value=full_gate), \
+                 patch('modules.routes.home.is_price_data_cached', return_value=False), \
+                 patch('modules.routes.home.get_price_history') as mock_prices, \
+                 full_gate.slot():
+                response = logged_in_client.get('/analyze/COLD/charts.json')
+            assert response.status_code == 503
+            mock_prices.assert_not_called()
+        finally:
+            app.config['ANALYZE_COLD_WAIT'] = 2
+
+    def test_upstream_throttling_returns_503_and_keeps_session(self, app, logged_in_client):
+        with logged_in_client.session_transaction() as sess:
+            sess['selected_ticker'] = 'KEEP'
+        with patch('modules.routes.home.is_price_data_cached', return_value=False), \
+             patch('modules.routes.home.get_price_history', side_effect=UpstreamRateLimitExceeded('yfinance')):
+            response = logged_in_client.get('/analyze/SLOW')
+            charts = logged_in_client.get('/analyze/SLOW/charts.json')
+        assert response.status_code == 503
+        assert int(response.headers['Retry-After']) >= app.config['ANALYZE_RETRY_AFTER']
+        assert charts.status_code == 503
+        with logged_in_client.session_transaction() as sess:
+            assert sess['selected_ticker'] == 'KEEP'
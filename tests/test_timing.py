@@ -0,0 +1,100 @@
+# tests/test_timing.py
+import logging
+import threading
+import time
+
+from modules import timing
+from modules.timing import get_spans, record_span, server_timing_header, timed
+from tests.test_home_routes import make_prices, mocked_analysis, clear_payload_cache  # noqa: F401
+
+
+class TestTimingSpans:
+
+    def test_noop_outside_request(self, app):
+        with timed('fetch'):
+            pass
+        record_span('fetch', 1.0)
+        with app.app_context():
+            assert get_spans() == []
+
+    def test_same_stage_is_summed(self, app):
+        with app.test_request_context():
+            with timed('resample'):
+                time.sleep(0.002)
+            record_span('resample', 0.5)
+            [(stage, ms, count)] = get_spans()
+            assert stage == 'resample' and count == 2 and ms >= 502
+
+    def test_header_format(self):
+        header = server_timing_header([('fetch', 12.345, 1), ('custom', 1.0, 1)], 20.0)
+        assert header == 'fetch;dur=12.3;desc="Upstream price fetch", custom;dur=1.0, total;dur=20.0'
+
+
+class TestServerTimingHeader:
+
+    def test_analyze_reports_stages(self, logged_in_client, mocked_analysis, caplog):  # noqa: F811
+        with caplog.at_level('INFO'):
+            response = logged_in_client.get('/analyze/TIMED')
+        assert response.status_code == 200
+        header = response.headers['Server-Timing']
+        for stage in ('meta', 'serialize', 'compress', 'render', 'total'):
+            assert f'{stage};dur=' in header
+        assert any('REQUEST_TIMING' in r.getMessage() and '"status": 200' in r.getMessage() for r in caplog.records)
+
+    def test_requests_without_spans_only_get_total(self, client):
+        response = client.get('/auth/login')
+        assert response.headers['Server-Timing'].startswith('total;dur=')
+
+
+def _slow_price_history(*args, **kwargs):
+    time.sleep(0.4)
+    return make_prices()
+
+
+class _Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestSlowRequestLog:
+
+    def test_watchdog_samples_running_request(self):
+        release = threading.Event()
+        worker = threading.Thread(target=release.wait)
+        worker.start()
+        try:
+            with timing._inflight_lock:
+                timing._inflight[worker.ident] = {'started': time.perf_counter() - 5, 'threshold_s': 1.0, 'stacks': []}
+            timing._sample_slow_requests(max_stacks=1)
+            timing._sample_slow_requests(max_stacks=1)
+            [sample] = timing._inflight[worker.ident]['stacks']
+            assert sample['at_ms'] >= 5000
+            assert any(' in wait' in line for line in sample['stack'])
+        finally:
+            release.set()
+            worker.join()
+            with timing._inflight_lock:
+                timing._inflight.pop(worker.ident, None)
+
+    def test_slow_analyze_is_logged_with_stack(self, app, logged_in_client, mocked_analysis):  # noqa: F811
+        mock_prices, _ = mocked_analysis
+        mock_prices.side_effect = _slow_price_history
+        capture = _Capture()
+        slow_logger = logging.getLogger(timing.SLOW_REQUEST_LOGGER)
+        slow_logger.addHandler(capture)
+        app.config['SLOW_REQUEST_THRESHOLD_MS'] = 100
+        try:
+            assert logged_in_client.get('/analyze/SLOWLOG').status_code == 200
+        finally:
+            app.config['SLOW_REQUEST_THRESHOLD_MS'] = 1000
+            slow_logger.removeHandler(capture)
+
+        [record] = [r for r in capture.records if r.args[0].fields['path'] == '/analyze/SLOWLOG']
+        fields = record.args[0].fields
+        assert fields['ticker'] == 'SLOWLOG' and fields['user']
+        assert 'meta' in fields['spans'] and fields['total_ms'] >= 400
+        assert any('_slow_price_history' in line for sample in fields['stacks'] for line in sample['stack'])
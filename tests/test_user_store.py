@@ -0,0 +1,148 @@
+# tests/test_user_store.py
+import json
+import pytest
+
+from app.models import SqliteUserStore, JsonUserStore, UserManager
+
+
+@pytest.fixture
+def users_json(tmp_path):
+    path = tmp_path / 'users.json'
+    path.write_text(json.dumps({
+        '1': {'username': 'admin', 'password_hash': 'h1', 'is_approved': True},
+        '5': {'username': 'dana', 'password_hash': 'h5', 'is_approved': False},
+    }), encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture(params=['sqlite', 'json'])
+def store(request, app, tmp_path):
+    with app.app_context():
+        if request.param == 'sqlite':
+            yield SqliteUserStore(str(tmp_path / 'users.sqlite3'))
+        else:
+            yield JsonUserStore(str(tmp_path / 'store.json'))
+
+
+class TestUserStores:
+
+    def test_add_get_and_unique_username(self, store, app):
+        with app.app_context():
+            user = store.add('alice', 'hash', False)
+            assert store.get(user.id).username == 'alice'
+            assert store.get_by_username('alice').id == user.id
+            assert store.get_by_username('nobody') is None
+            with pytest.raises(ValueError):
+                store.add('alice', 'other', True)
+
+    def test_update_and_delete_single_user(self, store, app):
+        with app.app_context():
+            alice = store.add('alice', 'hash', False)
+            bob = store.add('bob', 'hash', False)
+            assert store.update(alice.id, {'is_approved': True})
+            assert store.get(alice.id).is_approved is True
+            assert store.get(bob.id).is_approved is False
+            with pytest.raises(ValueError):
+                store.update(bob.id, {'username': 'alice'})
+            assert store.delete(bob.id)
+            assert not store.delete(bob.id)
+            assert list(store.all()) == [alice.id]
+
+
+class TestSqliteImport:
+
+    def test_import_keeps_ids_and_skips_existing(self, app, tmp_path, users_json):
+        with app.app_context():
+            store = SqliteUserStore(str(tmp_path / 'users.sqlite3'))
+            assert store.import_json(users_json) == 2
+            assert store.get(5).username == 'dana'
+            assert store.import_json(users_json) == 0
+            assert store.add('new', 'h', False).id == 6
+
+    def test_manager_seeds_new_database_from_json(self, app, tmp_path, users_json):
+        with app.app_context():
+            app.config['USERS_DB_FILE'] = str(tmp_path / 'seeded.sqlite3')
+            try:
+                manager = UserManager(users_file=users_json, backend='sqlite')
+            finally:
+                app.config['USERS_DB_FILE'] = 'test_data/users.sqlite3'
+            assert manager.get_user_by_username('dana').id == 5
+            assert manager.update_user(5, is_approved=True, bogus=1)
+            assert manager.get_user(5).is_approved is True
+
+
+class TestJsonStoreAcrossProcesses:
+    """שני מופעים על אותו קובץ מדמים שני workers של gunicorn."""
+
+    def test_change_in_one_worker_is_seen_by_the_other(self, app, users_json):
+        with app.app_context():
+            worker_a = JsonUserStore(users_json)
+            worker_b = JsonUserStore(users_json)
+            dana_in_b = worker_b.get(5)
+
+            worker_a.update(5, {'is_approved': True})
+            assert worker_b.get(5).is_approved is True
+            assert worker_b.get(5) is dana_in_b  # עדכון במקום, בלי לבנות את כל המטמון מחדש
+
+            reloads = worker_b.reloads
+            worker_b.get(1)
+            assert worker_b.reloads == reloads  # אין שינוי בקובץ - אין טעינה
+
+    def test_concurrent_writers_do_not_clobber(self, app, users_json):
+        with app.app_context():
+            worker_a = JsonUserStore(users_json)
+            worker_b = JsonUserStore(users_json)
+            alice = worker_a.add('alice', 'h', False)
+            bob = worker_b.add('bob', 'h', False)
+            assert alice.id != bob.id
+            with pytest.raises(ValueError):
+                worker_b.add('alice', 'h', False)
+
+            fresh = JsonUserStore(users_json)
+            assert {u.username for u in fresh.all().values()} == {'admin', 'dana', 'alice', 'bob'}
+            worker_a.delete(5)
+            assert worker_b.get(5) is None
+
+
+class TestSearchAndCounters:
+
+    def test_prefix_search_status_filter_and_paging(self, store, app):
+        with app.app_context():
+            for name in ('anna', 'andrew', 'annabel', 'bob', 'ann'):
+                store.add(name, 'h', name.startswith('anna'))
+            users, total = store.search('ann')
+            assert [u.username for u in users] == ['ann', 'anna', 'annabel']
+            assert total == 3
+            users, total = store.search('ann', is_approved=False)
+            assert [u.username for u in users] == ['ann']
+            users, total = store.search('', offset=1, limit=2)
+            assert [u.username for u in users] == ['ann', 'anna'] and total == 5
+
+    def test_counters_follow_every_change(self, store, app):
+        with app.app_context():
+            alice = store.add('alice', 'h', False)
+            store.add('bob', 'h', True)
+            assert store.counts() == {'total': 2, 'approved': 1, 'pending': 1}
+            store.update(alice.id, {'is_approved': True})
+            assert store.counts() == {'total': 2, 'approved': 2, 'pending': 0}
+            store.delete(alice.id)
+            assert store.counts() == {'total': 1, 'approved': 1, 'pending': 0}
+
+    def test_sqlite_counters_survive_reopen(self, app, tmp_path, users_json):
+        with app.app_context():
+            store = SqliteUserStore(str(tmp_path / 'users.sqlite3'))
+            store.import_json(users_json)
+            reopened = SqliteUserStore(str(tmp_path / 'users.sqlite3'))
+            assert reopened.counts() == {'total': 2, 'approved': 1, 'pending': 1}
+
+
+class TestAdminUsersPage:
+
+    def test_paginated_listing_with_search(self, app, logged_in_client):
+        response = logged_in_client.get('/admin/users?q=adm&status=approved')
+        assert response.status_code == 200
+        assert b'admin' in response.data
+        assert b'Users (1)' in response.data
+
+    def test_dashboard_uses_counters(self, logged_in_client):
+        assert logged_in_client.get('/admin/dashboard').status_code == 200
@@ -0,0 +1,203 @@
+# tests/test_valuations.py
+import click
+import pytest
+import numpy as np
+import pandas as pd
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from modules import dcf_engine
+from modules.dcf_engine import simulate_intrinsic_values, summarize_distribution, get_dcf_valuation
+from modules.multiples import (compute_multiples_table, refresh_multiples_snapshot, query_multiples,
+                               build_multiples_snapshot, start_multiples_refresher)
+from modules.rate_limiter import UpstreamRateLimitExceeded
+
+SAMPLE_FUNDAMENTALS = {
+    'freeCashflow': 100e9, 'sharesOutstanding': 15e9,
+    'totalDebt': 100e9, 'totalCash': 60e9, 'currentPrice': 180.0,
+}
+
+
+@pytest.fixture(autouse=True)
+def clear_dcf_cache():
+    dcf_engine.dcf_result_cache.clear()
+    yield
+    dcf_engine.dcf_result_cache.clear()
+
+
+class TestMonteCarloDCF:
+
+    def test_zero_volatility_matches_closed_form(self):
+        values = simulate_intrinsic_values(100.0, 10.0, 50.0, growth_mean=0.05, growth_std=0.0,
+                                           discount_mean=0.10, discount_std=0.0,
+                                           terminal_growth=0.02, years=5, scenarios=10)
+        cash_flows = [100.0 * 1.05 ** t for t in range(1, 6)]
+        pv = sum(cf / 1.10 ** t for t, cf in enumerate(cash_flows, start=1))
+        terminal = cash_flows[-1] * 1.02 / (0.10 - 0.02) / 1.10 ** 5
+        expected = (pv + terminal - 50.0) / 10.0
+        assert values.shape == (10,)
+        assert np.allclose(values, expected)
+
+    def test_invalid_discount_scenarios_are_dropped(self):
+        values = simulate_intrinsic_values(100.0, 10.0, 0.0, growth_mean=0.05, growth_std=0.0,
+                                           discount_mean=0.02, discount_std=0.0,
+                                           terminal_growth=0.03, years=5, scenarios=100)
+        assert values.size == 0
+
+    def test_summary_percentiles_are_ordered(self):
+        values = np.random.default_rng(0).normal(100, 20, 5000)
+        summary = summarize_distribution(values, current_price=100.0)
+        percentiles = list(summary['percentiles'].values())
+        assert percentiles == sorted(percentiles)
+        assert sum(summary['histogram']['counts']) > 0
+        assert 0.4 < summary['prob_undervalued'] < 0.6
+
+    def test_valuation_is_cached_per_ticker_and_params(self, app):
+        with app.app_context(), \
+             patch('modules.dcf_engine.get_fundamentals', return_value=SAMPLE_FUNDAMENTALS) as mock_fundamentals:
+            first = get_dcf_valuation('AAPL', scenarios=1000)
+            second = get_dcf_valuation('AAPL', scenarios=1000)
+            third = get_dcf_valuation('AAPL', scenarios=2000)
+        assert first is second
+        assert third is not first
+        assert mock_fundamentals.call_count == 2
+        assert first['scenarios'] <= 1000
+        assert first['histogram_json']
+
+    def test_missing_cash_flow_returns_error(self, app):
+        with app.app_context(), \
+             patch('modules.dcf_engine.get_fundamentals', return_value={'sharesOutstanding': 1e9}):
+            result = get_dcf_valuation('NOFCF')
+        assert 'error' in result
+
+
+class TestValuationsPage:
+
+    def test_page_renders_dcf_results(self, logged_in_client):
+        with patch('modules.dcf_engine.get_fundamentals', return_value=SAMPLE_FUNDAMENTALS):
+            response = logged_in_client.get('/valuations/?ticker=AAPL&growth_mean=6&scenarios=500')
+        assert response.status_code == 200
+        html = response.data.decode('utf-8')
+        assert 'dcfHistogramDiv' in html
+        assert 'P50' in html
+
+    def test_invalid_param_flashes_warning(self, logged_in_client):
+        with patch('modules.dcf_engine.get_fundamentals', return_value=SAMPLE_FUNDAMENTALS) as mock_fundamentals:
+            response = logged_in_client.get('/valuations/?ticker=AAPL&scenarios=abc')
+        assert response.status_code == 200
+        assert 'dcfHistogramDiv' not in response.data.decode('utf-8')
+        mock_fundamentals.assert_not_called()
+
+
+class TestMultiplesSnapshot:
+
+    RAW_FUNDAMENTALS = pd.DataFrame([
+        {'ticker': 'AAA', 'name': 'A', 'sector': 'Tech', 'currentPrice': 100.0, 'trailingEps': 5.0,
+         'marketCap': 1000.0, 'totalRevenue': 200.0, 'enterpriseValue': 1100.0, 'ebitda': 100.0, 'bookValue': 20.0},
+        {'ticker': 'BBB', 'name': 'B', 'sector': 'Tech', 'currentPrice': 50.0, 'trailingEps': 5.0,
+         'marketCap': 500.0, 'totalRevenue': 250.0, 'enterpriseValue': 600.0, 'ebitda': 100.0, 'bookValue': 25.0},
+        {'ticker': 'CCC', 'name': 'C', 'sector': 'Energy', 'currentPrice': 30.0, 'trailingEps': -1.0,
+         'marketCap': 300.0, 'totalRevenue': 600.0, 'enterpriseValue': 400.0, 'ebitda': 80.0, 'bookValue': 30.0},
+    ])
+
+    def test_multiples_and_sector_ranks(self):
+        table = compute_multiples_table(self.RAW_FUNDAMENTALS).set_index('ticker')
+        assert table.loc['AAA', 'pe'] == pytest.approx(20.0)
+        assert table.loc['BBB', 'pe'] == pytest.approx(10.0)
+        assert np.isnan(table.loc['CCC', 'pe'])  # רווח שלילי -> אין מכפיל
+        assert table.loc['AAA', 'pe_sector_median'] == pytest.approx(15.0)
+        assert table.loc['BBB', 'pe_sector_rank'] < table.loc['AAA', 'pe_sector_rank']
+
+    def test_refresh_persists_and_query_slices(self, app, tmp_path):
+        snapshot_path = str(tmp_path / 'multiples.pkl')
+        fundamentals = {row['ticker']: row for row in self.RAW_FUNDAMENTALS.to_dict('records')}
+        with app.app_context(), \
+             patch.dict(app.config, {'MULTIPLES_SNAPSHOT_FILE': snapshot_path}), \
+             patch('modules.multiples.get_fundamentals', side_effect=lambda t: fundamentals.get(t, {})) as mock_fundamentals:
+            refresh_multiples_snapshot(['AAA', 'BBB', 'CCC', 'MISSING'])
+            assert mock_fundamentals.call_count == 4
+
+            tech = query_multiples(sector='Tech', sort_by='pe')
+            assert list(tech['ticker']) == ['BBB', 'AAA']
+            by_ps = query_multiples(sort_by='ps', ascending=False, limit=1)
+            assert list(by_ps['ticker']) == ['AAA']
+            # שאילתות לא פונות שוב ל-yfinance
+            assert mock_fundamentals.call_count == 4
+
+    def test_throttled_ticker_is_skipped_not_fatal(self, app):
+        fundamentals = {row['ticker']: row for row in self.RAW_FUNDAMENTALS.to_dict('records')}
+
+        def _fetch(ticker):
+            if ticker == 'BBB':
+                raise UpstreamRateLimitExceeded('yfinance')
+            return fundamentals[ticker]
+
+        with app.app_context(), patch('modules.multiples.get_fundamentals', side_effect=_fetch):
+            table = build_multiples_snapshot(['AAA', 'BBB', 'CCC'])
+        assert list(table['ticker']) == ['AAA', 'CCC']
+        assert table.attrs['throttled'] == ['BBB']
+
+    def test_refresher_retries_throttled_build_after_backoff(self, app, tmp_path):
+        snapshot_path = tmp_path / 'multiples.pkl'
+        partial, complete = pd.DataFrame(), pd.DataFrame()
+        partial.attrs['throttled'], complete.attrs['throttled'] = ['BBB'], []
+        results = iter([partial, complete])
+        sleeps = []
+
+        def _refresh():
+            snapshot_path.touch()  # snapshot טרי - רק ה-retry אמור לגרום לבנייה מחדש
+            return next(results)
+
+        class _Stop(Exception):
+            pass
+
+        def _sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) == 2:
+                raise _Stop()
+
+        def _run_inline(target, **kwargs):
+            return SimpleNamespace(start=target)
+
+        with patch.dict(app.config, {'MULTIPLES_SNAPSHOT_FILE': str(snapshot_path),
+                                     'MULTIPLES_REFRESH_INTERVAL': 3600, 'MULTIPLES_RETRY_BACKOFF': 30}), \
+             patch('modules.multiples.refresh_multiples_snapshot', side_effect=_refresh) as mock_refresh, \
+             patch('modules.multiples.threading', SimpleNamespace(Thread=_run_inline)), \
+             patch('modules.multiples.time', SimpleNamespace(time=__import__('time').time, sleep=_sleep)):
+            with pytest.raises(_Stop):
+                start_multiples_refresher(app)
+        assert mock_refresh.call_count == 2
+        assert sleeps == [30, 3600]
+
+    def test_refresh_command_completes_in_process(self, app, runner, tmp_path):
+        snapshot_path = tmp_path / 'multiples.pkl'
+        fundamentals = {row['ticker']: row for row in self.RAW_FUNDAMENTALS.to_dict('records')}
+        with patch.dict(app.config, {'MULTIPLES_SNAPSHOT_FILE': str(snapshot_path)}), \
+             patch('modules.multiples.get_fundamentals', side_effect=lambda t: fundamentals[t]):
+            result = runner.invoke(args=['refresh-multiples', 'AAA', 'BBB'])
+        assert result.exit_code == 0, result.output
+        assert 'refreshed: 2 tickers' in result.output
+        assert snapshot_path.exists()
+
+    def test_background_jobs_only_start_in_serving_process(self, app, monkeypatch):
+        from app import _start_background_jobs
+        monkeypatch.setenv('FLASK_RUN_FROM_CLI', 'true')
+        with patch('modules.multiples.start_multiples_refresher') as mock_start:
+            with click.Context(click.Command('refresh-multiples'), info_name='refresh-multiples'):
+                _start_background_jobs(app)
+            mock_start.assert_not_called()
+            with click.Context(click.Command('run'), info_name='run'):
+                _start_background_jobs(app)
+            mock_start.assert_called_once_with(app)
+
+    def test_multiples_page_renders_sorted_table(self, app, logged_in_client, tmp_path):
+        fundamentals = {row['ticker']: row for row in self.RAW_FUNDAMENTALS.to_dict('records')}
+        with patch.dict(app.config, {'MULTIPLES_SNAPSHOT_FILE': str(tmp_path / 'multiples.pkl')}), \
+             patch('modules.multiples.get_fundamentals', side_effect=lambda t: fundamentals[t]):
+            with app.app_context():
+                refresh_multiples_snapshot(['AAA', 'BBB', 'CCC'])
+            response = logged_in_client.get('/valuations/multiples?sector=Tech&sort=pe&order=desc')
+        assert response.status_code == 200
+        html = response.data.decode('utf-8')
+        assert html.index('>AAA<') < html.index('>BBB<')
+        assert '>CCC<' not in html